@@ -0,0 +1,203 @@
+"""
+Measure the stages of the generation pipeline.
+
+Each case is run ``--repeat`` times in this process; the time of the
+first run, which pays for the imports and the caches, is kept apart from
+the best and median time of the following ones:
+
+- ``list_sorted_templates``: the template listing of ``templer --list``
+- ``check_vars:TEMPLATE``: the variables of a template, all defaults
+- ``copy_dir:templates/NAME``: copying one of the template directories
+- ``copy_dir:structure:NAME``: copying one of the structures (licenses)
+- ``generate:TEMPLATE``: creating a whole project on disk
+
+The cold start of ``templer.core.control_script:run`` is measured in new
+processes, by ``startup.py``.  The result is written as JSON, to standard
+output or to ``--output``::
+
+    python benchmarks/pipeline.py --repeat 10 --output pipeline.json
+
+With ``--baseline`` the median of each case, and of each cold start, is
+compared with the one of an earlier result, as a ``ratio`` (above 1 is
+slower)::
+
+    python benchmarks/pipeline.py --baseline pipeline.json
+"""
+import optparse
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+try:
+    import json
+except ImportError: # pragma: no cover
+    import simplejson as json
+
+import startup
+
+# the templates generated end to end, and the project each one creates
+PROJECTS = [
+    ('basic_namespace', 'my.package'),
+    ('nested_namespace', 'my.nested.package'),
+    ('package', 'my.package'),
+    ]
+
+# the variables the templates would otherwise ask for
+VARS = {'expert_mode': 'all', 'author': 'Joe', 'license_name': 'GPL'}
+
+COLD_START_SUBCOMMANDS = ['import', 'usage', 'create']
+
+
+def time_case(function, repeat, setup=None):
+    """
+    Returns the time of the first call of ``function`` and the list of the
+    times of the ``repeat - 1`` following ones.  ``setup`` is called,
+    untimed, before each of them and its result passed to ``function``.
+    """
+    times = []
+    for i in range(max(repeat, 2)):
+        args = ()
+        if setup is not None:
+            args = (setup(), )
+        start = time.time()
+        function(*args)
+        times.append(time.time() - start)
+    return times[0], times[1:]
+
+
+def case_result(name, first, times):
+    return {'case': name,
+            'repeat': len(times) + 1,
+            'first': first,
+            'min': min(times),
+            'median': startup.median(times)}
+
+
+def run_benchmark(repeat, cases=None):
+    from templer.core import copydir
+    from templer.core.api import Generator
+    from templer.core.base import BaseTemplate
+    from templer.core.ui import list_sorted_templates
+
+    results = []
+    workdir = tempfile.mkdtemp()
+    old_home = os.environ.get('HOME')
+    # no .zopeskel changes the defaults
+    os.environ['HOME'] = workdir
+    generator = Generator()
+
+    def new_dir():
+        return tempfile.mkdtemp(dir=workdir)
+
+    def run(name, function, setup=None):
+        if cases and not [case for case in cases if name.startswith(case)]:
+            return
+        first, times = time_case(function, repeat, setup)
+        results.append(case_result(name, first, times))
+
+    try:
+        run('list_sorted_templates', list_sorted_templates)
+
+        # the variables of every project, as the templates checked them,
+        # are those used to copy the template directories
+        all_vars = {}
+        for tmpl_name, project in PROJECTS:
+            def check_vars():
+                command = generator.make_command([tmpl_name], workdir)
+                templates = []
+                command.extend_templates(templates, tmpl_name)
+                output_dir, vars = command.project_vars(project, VARS)
+                return command.check_template_vars(
+                    [tmpl for name, tmpl in templates], vars)
+            run('check_vars:%s' % tmpl_name, check_vars)
+            all_vars.update(generator.generate(
+                [tmpl_name], project, VARS, output=new_dir()).vars)
+
+        templates_dir = os.path.join(
+            os.path.dirname(copydir.__file__), 'templates')
+        for name in sorted(os.listdir(templates_dir)):
+            source = os.path.join(templates_dir, name)
+            run('copy_dir:templates/%s' % name,
+                lambda dest: copydir.copy_dir(source, dest, all_vars, 0,
+                                              False, use_cheetah=True),
+                new_dir)
+
+        template = BaseTemplate('benchmark')
+        for entry in sorted(template.all_structure_entry_points(),
+                            key=lambda entry: entry.name):
+            structure = template.load_structure(entry.name)()
+
+            def copy_structure(dest):
+                for source in structure.structure_dir():
+                    copydir.copy_dir(source, dest, all_vars, 0, False,
+                                     use_cheetah=structure.use_cheetah)
+            run('copy_dir:structure:%s' % entry.name, copy_structure,
+                new_dir)
+
+        for tmpl_name, project in PROJECTS:
+            run('generate:%s' % tmpl_name,
+                lambda output: generator.generate([tmpl_name], project, VARS,
+                                                  output=output),
+                new_dir)
+    finally:
+        if old_home is None:
+            del os.environ['HOME']
+        else:
+            os.environ['HOME'] = old_home
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    cold_start = []
+    if not cases or 'cold_start' in cases:
+        cold_start = startup.run_benchmark(
+            repeat, COLD_START_SUBCOMMANDS)['results']
+    return {'benchmark': 'pipeline',
+            'python': sys.version.split()[0],
+            'platform': sys.platform,
+            'results': results,
+            'cold_start': cold_start}
+
+
+def compare(result, baseline):
+    """
+    Adds the median of the same case in ``baseline`` to each result, and
+    the same for the cold start of each subcommand.
+    """
+    medians = dict([(item['case'], item['median'])
+                    for item in baseline.get('results', [])])
+    for item in result['results']:
+        if medians.get(item['case']):
+            item['baseline_median'] = medians[item['case']]
+            item['ratio'] = item['median'] / medians[item['case']]
+    startup.compare(result['cold_start'], baseline.get('cold_start', []))
+
+
+def main(argv=None):
+    parser = optparse.OptionParser(usage='%prog [options] [case...]')
+    parser.add_option('-n', '--repeat', type='int', default=5,
+                      help='Number of runs of each case (default: 5)')
+    parser.add_option('-o', '--output', metavar='FILE',
+                      help='Write the JSON result to FILE')
+    parser.add_option('-b', '--baseline', metavar='FILE',
+                      help='Compare with the JSON result in FILE')
+    options, cases = parser.parse_args(argv)
+    result = run_benchmark(options.repeat, cases)
+    if options.baseline:
+        f = open(options.baseline)
+        try:
+            compare(result, json.load(f))
+        finally:
+            f.close()
+    content = json.dumps(result, indent=2, sort_keys=True)
+    if options.output:
+        f = open(options.output, 'w')
+        f.write(content + '\n')
+        f.close()
+    else:
+        print content
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,198 @@
+"""
+Measure the cold start time of the templer command.
+
+Every measure runs ``templer.core.control_script:run`` for one subcommand
+in a new Python process, so that nothing is already imported, and keeps
+the best and median wall clock time of ``--repeat`` runs.  The heavy
+modules that each subcommand ended up importing are listed as well.
+
+The result is written as JSON, to standard output or to ``--output``::
+
+    python benchmarks/startup.py --repeat 10 --output startup.json
+
+With ``--baseline`` the median time in templer of each subcommand is
+compared with the one of an earlier result, as a ``ratio`` (above 1 is
+slower).  ``--max-ratio`` turns it into a regression test: the exit
+status is 1 if a subcommand got slower than that, or if merely importing
+``control_script`` imports one of the heavy modules::
+
+    python benchmarks/startup.py --baseline startup.json --max-ratio 1.5 import
+"""
+import optparse
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+try:
+    import json
+except ImportError: # pragma: no cover
+    import simplejson as json
+
+# modules whose import is worth knowing about
+HEAVY_MODULES = ['pkg_resources', 'Cheetah.Template', 'cgi', 'urllib',
+                 'multiprocessing']
+
+SUBCOMMANDS = [
+    ('import', None),
+    ('usage', []),
+    ('help', ['--help']),
+    ('version', ['--version']),
+    ('list', ['--list']),
+    ('make-config-file', ['--make-config-file']),
+    ('create', ['basic_namespace', 'my.package', '--no-interactive']),
+    ]
+
+SCRIPT = """\
+import sys
+import time
+start = time.time()
+import templer.core.control_script
+args = %(args)r
+if args is not None:
+    try:
+        templer.core.control_script.run(*args, **{'exit': False})
+    except SystemExit:
+        pass
+elapsed = time.time() - start
+sys.stderr.write('\\n%%r\\n' %% ((elapsed, [name for name in %(heavy)r
+                                         if name in sys.modules]), ))
+"""
+
+
+def measure(args, cwd, env):
+    """
+    Runs the subcommand ``args`` in a new process, in the directory
+    ``cwd`` and with the environment ``env``.  Returns the wall clock
+    time of the whole process, the time spent in templer and the heavy
+    modules it imported.
+    """
+    script = SCRIPT % {'args': args, 'heavy': HEAVY_MODULES}
+    start = time.time()
+    process = subprocess.Popen([sys.executable, '-c', script], cwd=cwd,
+                               stdout=open(os.devnull, 'w'),
+                               stderr=subprocess.PIPE, env=env)
+    output = process.communicate()[1]
+    wall = time.time() - start
+    if process.returncode:
+        raise RuntimeError('%r failed:\n%s' % (args, output))
+    templer_time, imported = eval(output.strip().splitlines()[-1])
+    return wall, templer_time, imported
+
+
+def median(values):
+    values = sorted(values)
+    middle = len(values) // 2
+    if len(values) % 2:
+        return values[middle]
+    return (values[middle - 1] + values[middle]) / 2.0
+
+
+def run_benchmark(repeat, subcommands=None):
+    results = []
+    workdir = tempfile.mkdtemp()
+    environ = os.environ.copy()
+    # the template index survives between runs, as it does for users
+    environ.setdefault('TEMPLER_INDEX',
+                       os.path.join(workdir, 'entry_points.json'))
+    try:
+        for name, args in SUBCOMMANDS:
+            if subcommands and name not in subcommands:
+                continue
+            walls = []
+            times = []
+            for i in range(repeat):
+                # a fresh directory and HOME, so that create always starts
+                # from scratch and no .zopeskel is read
+                cwd = tempfile.mkdtemp(dir=workdir)
+                environ['HOME'] = cwd
+                wall, templer_time, imported = measure(args, cwd, environ)
+                walls.append(wall)
+                times.append(templer_time)
+            results.append({'subcommand': name,
+                            'args': args,
+                            'repeat': repeat,
+                            'wall_min': min(walls),
+                            'wall_median': median(walls),
+                            'templer_min': min(times),
+                            'templer_median': median(times),
+                            'imported': imported})
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+    return {'benchmark': 'startup',
+            'python': sys.version.split()[0],
+            'platform': sys.platform,
+            'results': results}
+
+
+def compare(results, baseline):
+    """
+    Adds the median time in templer of the same subcommand in the
+    ``baseline`` results to each of ``results``.
+    """
+    medians = dict([(item['subcommand'], item['templer_median'])
+                    for item in baseline])
+    for item in results:
+        if medians.get(item['subcommand']):
+            item['baseline_median'] = medians[item['subcommand']]
+            item['ratio'] = (item['templer_median']
+                             / medians[item['subcommand']])
+
+
+def regressions(results, max_ratio=None):
+    """
+    Returns the messages describing the subcommands of ``results`` slower
+    than ``max_ratio`` times their baseline, and an import of the
+    control script pulling in heavy modules.
+    """
+    messages = []
+    for item in results:
+        if (max_ratio is not None and
+            item.get('ratio', 0) > max_ratio):
+            messages.append('%s: %.3fs, %.2f times the baseline' % (
+                item['subcommand'], item['templer_median'], item['ratio']))
+        if item['subcommand'] == 'import' and item['imported']:
+            messages.append('import: imports %s' %
+                            ', '.join(item['imported']))
+    return messages
+
+
+def main(argv=None):
+    parser = optparse.OptionParser(usage='%prog [options] [subcommand...]')
+    parser.add_option('-n', '--repeat', type='int', default=5,
+                      help='Number of runs of each subcommand (default: 5)')
+    parser.add_option('-o', '--output', metavar='FILE',
+                      help='Write the JSON result to FILE')
+    parser.add_option('-b', '--baseline', metavar='FILE',
+                      help='Compare with the JSON result in FILE')
+    parser.add_option('--max-ratio', type='float', metavar='RATIO',
+                      help='Exit with 1 if a subcommand is slower than '
+                           'RATIO times the baseline')
+    options, subcommands = parser.parse_args(argv)
+    result = run_benchmark(options.repeat, subcommands)
+    if options.baseline:
+        f = open(options.baseline)
+        try:
+            compare(result['results'], json.load(f)['results'])
+        finally:
+            f.close()
+    content = json.dumps(result, indent=2, sort_keys=True)
+    if options.output:
+        f = open(options.output, 'w')
+        f.write(content + '\n')
+        f.close()
+    else:
+        print content
+    if options.max_ratio is not None:
+        messages = regressions(result['results'], options.max_ratio)
+        for message in messages:
+            sys.stderr.write('Regression: %s\n' % message)
+        if messages:
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
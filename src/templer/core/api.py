@@ -0,0 +1,191 @@
+"""
+Generation of projects from Python, without the command line.
+
+``generate`` creates a project the way ``templer create`` would with
+``--no-interactive``, but without parsing arguments, asking questions or
+printing anything, and returns what it did as a ``GenerationResult``::
+
+    from templer.core.api import generate
+
+    result = generate(['basic_namespace'], 'my.package',
+                      {'expert_mode': 'all', 'author': 'Joe'},
+                      output='/tmp/projects')
+    print result.output_dir, result.files
+
+A ``Generator`` keeps the templates it has looked up, and its Cheetah
+template cache, from one project to the next: an application generating
+many projects should keep one around rather than call ``generate`` each
+time.  Errors are raised as they are: ``LookupError`` for an unknown
+template, ``ValidationException`` for an invalid variable, ``BadCommand``
+for missing ones.
+"""
+import os
+import threading
+import time
+
+from templer.core import events
+from templer.core import sinks
+from templer.core import timing
+from templer.core.create import CreateDistroCommand
+
+
+class GenerationResult(object):
+    """
+    What ``Generator.generate`` did: the ``project`` name, the directory
+    it was created in, the names of the ``templates`` used (including the
+    implied ones), the variables after the templates checked them, and
+    the ``/`` separated names of the ``files`` written, relative to the
+    output.  ``timings`` is the ``timing.Timings`` of the generation, if
+    it was asked for.
+    """
+
+    def __init__(self, project, output_dir, templates, vars, files,
+                 seconds, timings=None):
+        self.project = project
+        self.output_dir = output_dir
+        self.templates = templates
+        self.vars = vars
+        self.files = files
+        self.seconds = seconds
+        self.timings = timings
+
+    def __repr__(self):
+        return '<%s %s in %s>' % (
+            self.__class__.__name__, self.project, self.output_dir)
+
+
+class RecordingFileSystemSink(sinks.FileSystemSink):
+    """A ``FileSystemSink`` keeping the names of the files it writes."""
+
+    def __init__(self, root):
+        self.root = os.path.abspath(root)
+        self._written = {}
+        self._lock = threading.Lock()
+
+    def write(self, path, content, mode=None):
+        super(RecordingFileSystemSink, self).write(path, content, mode)
+        path = os.path.abspath(path)
+        if path.startswith(self.root.rstrip(os.sep) + os.sep):
+            self._lock.acquire()
+            try:
+                self._written[path] = None
+            finally:
+                self._lock.release()
+
+    def filenames(self):
+        """Returns the sorted names of the files written below the root."""
+        start = len(self.root.rstrip(os.sep)) + 1
+        return sorted([path[start:].replace(os.sep, '/')
+                       for path in self._written])
+
+
+class Generator(object):
+    """
+    Creates projects without the command line.  The template classes are
+    looked up once and the compiled Cheetah templates kept in
+    ``template_cache`` (a ``cheetah_cache.CompiledTemplateCache``, the
+    process wide one by default); files are rendered with ``jobs``
+    threads.
+    """
+
+    def __init__(self, jobs=1, template_cache=None):
+        self.jobs = jobs
+        self.template_cache = template_cache
+        self._template_classes = {}
+
+    def make_command(self, template_names, output_dir, overwrite=True):
+        """
+        Returns a ``CreateDistroCommand`` set up as ``run`` would set it
+        up for a quiet, non interactive creation.
+        """
+        command = CreateDistroCommand()
+        command.options = CreateDistroCommand.parser.get_default_values()
+        command.options.templates = list(template_names)
+        command.options.output_dir = output_dir
+        command.options.overwrite = overwrite
+        command.options.no_interactive = 1
+        command.options.jobs = self.jobs
+        command.args = []
+        command.interactive = False
+        command.verbose = -1
+        command.simulate = False
+        command.template_cache = self.template_cache
+        command._template_classes = self._template_classes
+        return command
+
+    def load_templates(self):
+        """
+        Looks up all the installed templates, so that no project pays for
+        it, and returns their sorted names.  Templates that cannot be
+        loaded are left out.
+        """
+        command = self.make_command([], os.curdir)
+        names = set()
+        for entry in command.all_entry_points():
+            try:
+                command.load_template(None, entry.name)
+            except Exception:
+                continue
+            names.add(entry.name)
+        return sorted(names)
+
+    def generate(self, template_names, project, vars=None, output='.',
+                 overwrite=True, timings=False, observer=None):
+        """
+        Creates ``project`` from the templates ``template_names`` with the
+        variables ``vars``, and returns a ``GenerationResult``.
+
+        ``output`` is either the directory the project is created in, or
+        a sink (see ``templer.core.sinks``) receiving the files: a
+        ``MemorySink``, or an archive sink that the caller closes.  The
+        files written are only listed for directories and the sinks
+        having a ``filenames`` method, they are None otherwise.
+
+        With ``timings`` the time of each phase of the generation is
+        recorded in the ``timings`` of the result.  ``observer`` is the
+        ``events.Observer`` told about each directory and file, none by
+        default.
+        """
+        start = time.time()
+        if isinstance(template_names, basestring):
+            template_names = [template_names]
+        if isinstance(output, basestring):
+            sink = RecordingFileSystemSink(output)
+            output_dir = output
+        else:
+            sink = output
+            output_dir = sink.root
+        command = self.make_command(template_names, output_dir, overwrite)
+        command.sink = sink
+        command.observer = observer or events.Observer()
+        if timings:
+            command.timings = timing.Timings()
+        templates = []
+        for tmpl_name in template_names:
+            timing.timed(command.timings, 'load_templates', tmpl_name,
+                         command.extend_templates, templates, tmpl_name)
+        command.create_project(project, [tmpl for name, tmpl in templates],
+                               dict(vars or {}))
+        if hasattr(sink, 'filenames'):
+            files = sink.filenames()
+        else:
+            files = None
+        return GenerationResult(
+            project, os.path.join(output_dir, project),
+            [name for name, tmpl in templates], command.checked_vars,
+            files, time.time() - start, command.timings)
+
+
+_default_generator = None
+
+
+def generate(template_names, project, vars=None, output='.', **kw):
+    """
+    Creates ``project`` with a process wide ``Generator``; see
+    ``Generator.generate``.
+    """
+    global _default_generator
+    if _default_generator is None:
+        _default_generator = Generator()
+    return _default_generator.generate(template_names, project, vars,
+                                       output, **kw)
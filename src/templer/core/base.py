@@ -1,16 +1,19 @@
 import os
 import sys
-import pkg_resources
 from copy import copy
+from cStringIO import StringIO
 
 from textwrap import TextWrapper
 import ConfigParser
-from ConfigParser import SafeConfigParser
 
 from templer.core import pluginlib
 from templer.core import copydir
+from templer.core import events
+from templer.core import timing
 from templer.core.create import NoDefault
 from templer.core.create import BadCommand
+from templer.core.prefs import get_preferences
+from templer.core.sinks import FileSystemSink
 from templer.core.vars import StringChoiceVar
 from templer.core.vars import ALL
 from templer.core.vars import ValidationException
@@ -44,20 +47,11 @@ def wrap_help_paras(wrapper, text):
 
 
 def get_zopeskel_prefs():
-    # http://snipplr.com/view/7354/get-home-directory-path--in-python-win-lin-other/
-    try:
-        from win32com.shell import shellcon, shell
-        homedir = shell.SHGetFolderPath(0, shellcon.CSIDL_APPDATA, 0, 0)
-    except ImportError:
-        # quick semi-nasty fallback for non-windows/win32com case
-        homedir = os.path.expanduser("~")
-
-    # Get defaults from .zopeskel
-    config = SafeConfigParser()
-
-    ## TODO: consider how to replace .zopeskel with .templer
-    config.read('%s/.zopeskel' % homedir)
-    return config
+    """
+    Returns the ``SafeConfigParser`` of ``~/.zopeskel``, parsed once and
+    shared: see ``templer.core.prefs``.
+    """
+    return get_preferences().get_config()
 
 
 def get_var(vars, name):
@@ -68,17 +62,25 @@ def get_var(vars, name):
         raise ValueError("No such var: %r" % name)
 
 
-def update_setup_cfg(path, section, option, value):
+def update_setup_cfg(path, section, option, value, sink=None):
 
+    if sink is None:
+        sink = FileSystemSink()
     parser = ConfigParser.ConfigParser()
-    if os.path.exists(path):
-        parser.read(path)
+    if sink.exists(path):
+        parser.readfp(StringIO(sink.read(path)), path)
 
     if not parser.has_section(section):
         parser.add_section(section)
 
     parser.set(section, option, value)
-    parser.write(open(path, 'w'))
+    content = StringIO()
+    parser.write(content)
+    sink.write(path, content.getvalue())
+
+# Structure classes loaded so far, by entry point name; shared by all the
+# templates so that generating many projects only resolves them once:
+_structure_classes = {}
 
 _skip_variables = ['VFN', 'currentTime', 'self', 'VFFSL', 'dummyTrans',
                    'getmtime', 'trans']
@@ -129,9 +131,12 @@ class Template(object): # pragma: no cover
             return os.path.join(self.module_dir(), self._template_dir)
 
     def run(self, command, output_dir, vars):
-        self.pre(command, output_dir, vars)
+        timings = getattr(command, 'timings', None)
+        timing.timed(timings, 'pre', self.name,
+                     self.pre, command, output_dir, vars)
         self.write_files(command, output_dir, vars)
-        self.post(command, output_dir, vars)
+        timing.timed(timings, 'post', self.name,
+                     self.post, command, output_dir, vars)
 
     def check_vars(self, vars, cmd):
         expect_vars = self.read_vars(cmd)
@@ -175,12 +180,17 @@ class Template(object): # pragma: no cover
 
     def write_files(self, command, output_dir, vars):
         template_dir = self.template_dir()
-        if not os.path.exists(output_dir):
-            print "Creating directory %s" % output_dir
+        sink = getattr(command, 'sink', None) or FileSystemSink()
+        if not sink.exists(output_dir):
+            command.notify(events.DIR_CREATED, output_dir,
+                           "Creating directory %s" % output_dir, 0)
             if not command.simulate:
                 # Don't let copydir create this top-level directory,
                 # since copydir will svn add it sometimes:
-                os.makedirs(output_dir)
+                sink.makedirs(output_dir)
+        timings = getattr(command, 'timings', None)
+        if timings is not None:
+            started = timings.start()
         copydir.copy_dir(template_dir, output_dir,
                          vars,
                          verbosity=command.verbose,
@@ -189,7 +199,46 @@ class Template(object): # pragma: no cover
                          overwrite=command.options.overwrite,
                          indent=1,
                          use_cheetah=self.use_cheetah,
-                         template_renderer=self.template_renderer)
+                         template_renderer=self.template_renderer,
+                         template_cache=getattr(command, 'template_cache',
+                                                None),
+                         jobs=getattr(command.options, 'jobs', 1),
+                         manifest=getattr(command, 'manifest', None),
+                         sink=sink,
+                         context=getattr(command, 'copy_context', None),
+                         timings=timings,
+                         observer=getattr(command, 'observer', None))
+        if timings is not None:
+            timings.stop('copy_dir', self.name, started)
+
+    def plan_files(self, command, output_dir, vars):
+        """
+        Returns the ``copydir.PlannedFile`` list of what ``write_files``
+        would do.
+        """
+        return copydir.plan_copy(self.template_dir(), output_dir, vars,
+                                 overwrite=command.options.overwrite,
+                                 use_cheetah=self.use_cheetah,
+                                 template_renderer=self.template_renderer,
+                                 template_cache=getattr(
+                                     command, 'template_cache', None),
+                                 jobs=getattr(command.options, 'jobs', 1),
+                                 manifest=getattr(command, 'manifest', None))
+
+    def plan(self, command, output_dir, vars):
+        """
+        Returns the ``copydir.PlannedFile`` list of the files ``run``
+        would write, without writing anything.
+        """
+        return (self.plan_files(command, output_dir, vars)
+                + self.plan_extra_files(command, output_dir, vars))
+
+    def plan_extra_files(self, command, output_dir, vars):
+        """
+        Returns the ``copydir.PlannedFile`` list of the files ``run``
+        writes besides the files of the template, in its hooks.
+        """
+        return []
 
     def print_vars(self, indent=0):
         vars = self.read_vars()
@@ -262,7 +311,8 @@ $HOME/.zopeskel file.
         # whether the localcommands package is loaded?
         setup_cfg = os.path.join(output_dir, 'setup.cfg')
         if self.use_local_commands:
-            update_setup_cfg(setup_cfg, 'templer.local', 'template', self.name)
+            update_setup_cfg(setup_cfg, 'templer.local', 'template', self.name,
+                             sink=getattr(command, 'sink', None))
 
     def print_subtemplate_notice(self, output_dir=None):
             """Print a notice about local commands being available (if this is
@@ -328,14 +378,18 @@ For more information: paster help COMMAND""" % print_commands
 
     def all_structure_entry_points(self):
         if not hasattr(self, '_structure_entry_points'):
+            import pkg_resources
             self._structure_entry_points = list(
                 pkg_resources.iter_entry_points('templer.templer_structure'))
         return self._structure_entry_points
 
     def load_structure(self, name):
+        if name in _structure_classes:
+            return _structure_classes[name]
         for ep in self.all_structure_entry_points():
             if ep.name == name:
-                return ep.load()
+                _structure_classes[name] = ep.load()
+                return _structure_classes[name]
         raise LookupError('No entry point for structure %s available' % name)
 
     def get_structures(self, vars):
@@ -348,7 +402,15 @@ For more information: paster help COMMAND""" % print_commands
     def write_structures(self, command, output_dir, vars):
         structures = self.get_structures(vars)
         for structure in structures:
-            structure().write_files(command, output_dir, vars)
+            timing.timed(getattr(command, 'timings', None), 'structure',
+                         structure.__name__, structure().write_files,
+                         command, output_dir, vars)
+
+    def plan_structures(self, command, output_dir, vars):
+        plan = []
+        for structure in self.get_structures(vars):
+            plan.extend(structure().plan_files(command, output_dir, vars))
+        return plan
 
     def pre(self, *args, **kwargs):
         Template.pre(self, *args, **kwargs)
@@ -360,13 +422,30 @@ For more information: paster help COMMAND""" % print_commands
         self.write_structures(command, output_dir, vars)
         super(BaseTemplate, self).write_files(command, output_dir, vars)
 
+    def plan_files(self, command, output_dir, vars):
+        return (self.plan_structures(command, output_dir, vars)
+                + super(BaseTemplate, self).plan_files(command, output_dir,
+                                                       vars))
+
+    def plan_extra_files(self, command, output_dir, vars):
+        plan = super(BaseTemplate, self).plan_extra_files(command,
+                                                          output_dir, vars)
+        if self.use_local_commands:
+            # run adds the template to the setup.cfg written before
+            plan.append(copydir.PlannedFile(
+                os.path.join(output_dir, 'setup.cfg'), None, 'hook',
+                'update'))
+        return plan
+
     def post(self, command, output_dir, vars):
-        if self.should_print_subcommands(command):
+        quiet = getattr(command, 'verbose', 0) < 0
+        if not quiet and self.should_print_subcommands(command):
             self.print_subtemplate_notice()
         Template.post(self, command, output_dir, vars)
         # at the very end of it all, print the post_run_msg so we can
         # inform users of important information.
-        self.print_zopeskel_message('post_run_msg')
+        if not quiet:
+            self.print_zopeskel_message('post_run_msg')
 
     def get_template_stack(self, command):
         """ return a list of the template objects to be run in this command
@@ -458,7 +537,8 @@ For more information: paster help COMMAND""" % print_commands
     def check_vars(self, vars, cmd):
         # if we need to notify users of anything before they start this
         # whole process, we can do it here.
-        self.print_zopeskel_message('pre_run_msg')
+        if getattr(cmd, 'verbose', 0) >= 0:
+            self.print_zopeskel_message('pre_run_msg')
 
         # Copied and modified from PasteScript's check_vars--
         # the method there wasn't hookable for the things
@@ -476,29 +556,23 @@ For more information: paster help COMMAND""" % print_commands
                 subsequent_indent="|  ",
                 )
 
-        # now, mostly copied direct from paster
-        expect_vars = self.read_vars(cmd)
+        # now, mostly copied direct from paster; the defaults are changed
+        # below, so work on copies of the vars shared by the class
+        expect_vars = [copy(var) for var in self.read_vars(cmd)]
         if not expect_vars:
             # Assume that variables aren't defined
             return vars
         converted_vars = {}
         errors = []
 
-        config = get_zopeskel_prefs()
         # pastescript allows one to request more than one template (multiple
         # -t options at the command line) so we will get a list of templates
-        # from the cmd's options property
+        # from the cmd's options property; the preferences of the first one
+        # having a section win, then those of the DEFAULT section
         requested_templates = cmd.options.templates
+        defaults = get_preferences().layer(requested_templates)
         for var in expect_vars:
-            for template in requested_templates:
-                if config.has_option(template, var.name):
-                    var.default = config.get(template, var.name)
-                    break
-            else:
-                # Not found in template section, now look explicitly
-                # in DEFAULT section
-                if config.has_option('DEFAULT', var.name):
-                    var.default = config.get('DEFAULT', var.name)
+            var.default = defaults.get_default(var.name, var.default)
 
         self.override_package_names_defaults(vars, expect_vars)
         unused_vars = vars.copy()
@@ -0,0 +1,220 @@
+"""
+Creation of many projects in a single run, from a projects file.
+
+A projects file lists the projects to create, the templates to use for them
+and their variables.  It is either a JSON file::
+
+    {"templates": ["basic_namespace"],
+     "vars": {"expert_mode": "all", "author": "Joe", "license_name": "BSD"},
+     "projects": ["my.first",
+                  {"name": "my.second", "vars": {"version": "0.1"}},
+                  {"name": "third", "templates": ["package"]}]}
+
+or an INI file with one section per project, where the ``DEFAULT``
+section holds what the projects have in common::
+
+    [DEFAULT]
+    templates = basic_namespace
+    expert_mode = all
+    author = Joe
+
+    [my.first]
+
+    [my.second]
+    version = 0.1
+
+As on the command line, variables that are not asked in the chosen
+``expert_mode`` get their default value.
+"""
+import ConfigParser
+import os
+import sys
+import time
+from cStringIO import StringIO
+
+from templer.core.utils import to_str
+
+
+class BulkProject(object):
+    """A project to create: its name, templates and variables."""
+
+    def __init__(self, name, templates=None, vars=None):
+        self.name = name
+        self.templates = templates or []
+        self.vars = vars or {}
+
+    def __repr__(self):
+        return '<%s %s templates=%r>' % (
+            self.__class__.__name__, self.name, self.templates)
+
+
+class BulkResult(object):
+    """The outcome of the creation of one project."""
+
+    def __init__(self, name, status, seconds, error=None, output=''):
+        self.name = name
+        self.status = status
+        self.seconds = seconds
+        self.error = error
+        self.output = output
+
+
+def read_projects(filename):
+    """
+    Returns the list of ``BulkProject`` described by the JSON or INI
+    projects file ``filename``.  JSON files are recognized by their
+    ``.json`` extension or their leading ``{``.
+    """
+    f = open(filename, 'rb')
+    try:
+        content = f.read()
+    finally:
+        f.close()
+    if (os.path.splitext(filename)[1].lower() == '.json'
+            or content.lstrip().startswith('{')):
+        return _parse_json_projects(content)
+    return _parse_ini_projects(filename)
+
+
+def _split_templates(value):
+    if isinstance(value, basestring):
+        value = value.replace(',', ' ').split()
+    return [to_str(name) for name in value]
+
+
+def _parse_json_projects(content):
+    import json
+    data = json.loads(content)
+    if isinstance(data, list):
+        data = {'projects': data}
+    templates = _split_templates(data.get('templates', []))
+    shared_vars = data.get('vars', {})
+    projects = []
+    for item in data.get('projects', []):
+        if isinstance(item, basestring):
+            item = {'name': item}
+        vars = dict(shared_vars)
+        vars.update(item.get('vars', {}))
+        vars = dict([(to_str(k), to_str(v)) for k, v in vars.items()])
+        projects.append(BulkProject(
+            to_str(item['name']),
+            _split_templates(item.get('templates', templates)),
+            vars))
+    return projects
+
+
+def _parse_ini_projects(filename):
+    parser = ConfigParser.RawConfigParser()
+    parser.read([filename])
+    projects = []
+    for section in parser.sections():
+        vars = dict(parser.items(section))
+        templates = _split_templates(vars.pop('templates', ''))
+        projects.append(BulkProject(section, templates, vars))
+    return projects
+
+
+def run_project(command, project, capture=False):
+    """
+    Creates ``project`` with ``command`` (a ``CreateDistroCommand``) and
+    returns a ``BulkResult``.  Errors are reported in the result instead
+    of being raised, so that one bad project does not stop the others.
+
+    If ``capture`` is true, the output of the creation is kept in the
+    result instead of being printed.
+    """
+    start = time.time()
+    if capture:
+        old_stdout = sys.stdout
+        sys.stdout = StringIO()
+    try:
+        try:
+            # the templates read the requested templates from the options
+            command.options.templates = list(project.templates)
+            if hasattr(command, '_deleted_once'):
+                del command._deleted_once
+            templates = []
+            for tmpl_name in project.templates:
+                command.extend_templates(templates, tmpl_name)
+            command.create_project(project.name,
+                                   [tmpl for name, tmpl in templates],
+                                   dict(project.vars))
+            status, error = 'ok', None
+        except Exception, e:
+            status = 'error'
+            error = '%s: %s' % (e.__class__.__name__,
+                                ' '.join(str(e).split()))
+    finally:
+        output = ''
+        if capture:
+            output = sys.stdout.getvalue()
+            sys.stdout = old_stdout
+    return BulkResult(project.name, status, time.time() - start,
+                      error=error, output=output)
+
+
+# What the worker processes of run_projects work on; they inherit it when
+# they are forked.
+_bulk_state = None
+
+
+def _run_project_at(index):
+    command, projects = _bulk_state
+    return run_project(command, projects[index], capture=True)
+
+
+def run_projects(command, projects, concurrency=1):
+    """
+    Creates all ``projects`` and returns their ``BulkResult`` in the same
+    order.  With a ``concurrency`` above 1 the projects are created by that
+    many worker processes, forked once the templates have been loaded;
+    their output is printed in the order of the projects.
+    """
+    global _bulk_state
+    if concurrency <= 1 or len(projects) < 2 or not hasattr(os, 'fork'):
+        return [run_project(command, project) for project in projects]
+    import multiprocessing
+    # make sure all the templates are loaded before forking
+    for project in projects:
+        try:
+            for tmpl_name in project.templates:
+                command.extend_templates([], tmpl_name)
+        except Exception:
+            # run_project reports it, for this project only
+            pass
+    sys.stdout.flush()
+    _bulk_state = command, projects
+    pool = multiprocessing.Pool(min(concurrency, len(projects)))
+    try:
+        results = pool.map(_run_project_at, range(len(projects)))
+    finally:
+        pool.close()
+        pool.join()
+        _bulk_state = None
+    for result in results:
+        sys.stdout.write(result.output)
+    return results
+
+
+def format_results(results, seconds=None):
+    """
+    Returns a printable summary of the ``BulkResult`` list; ``seconds``
+    is the total time it took.
+    """
+    s = StringIO()
+    max_name = max([len(r.name) for r in results] + [len('Project')])
+    failed = 0
+    print >>s, 'Project%s  Status  Time' % (' ' * (max_name - len('Project')))
+    for result in results:
+        line = '%s%s  %-6s  %.3fs' % (
+            result.name, ' ' * (max_name - len(result.name)),
+            result.status, result.seconds)
+        if result.error:
+            failed += 1
+            line += '  %s' % result.error
+        print >>s, line
+    if seconds is None:
+        seconds = sum([r.seconds for r in results])
+    print >>s, '%d projects created, %d failed (%.3fs)' % (
+        len(results) - failed, failed, seconds)
+    return s.getvalue()
@@ -0,0 +1,238 @@
+"""
+Cache of compiled Cheetah template classes.
+
+Cheetah turns every template source into a Python module before it can
+render it.  When the same templates and structures are used over and over
+(as in a CI run generating many packages) that compilation dominates the
+run time, so the generated module code is cached here, keyed by a hash of
+the template source, both in memory and optionally on disk.
+"""
+import os
+import sys
+import threading
+
+from Cheetah.Version import Version as CHEETAH_VERSION
+
+from templer.core.utils import atomic_write
+from templer.core.utils import sha1
+
+# Name of the environment variable pointing to the directory used by the
+# default cache to store compiled templates between processes.
+CACHE_DIR_ENV = 'TEMPLER_CACHE_DIR'
+
+DEFAULT_MAX_ENTRIES = 256
+DEFAULT_MAX_DISK_BYTES = 32 * 1024 * 1024
+
+
+def source_key(source):
+    """Return the cache key for a template ``source``.
+
+    The Cheetah version is part of the key, since the generated code is
+    only valid for the compiler that produced it.
+    """
+    if isinstance(source, unicode):
+        source = source.encode('utf-8')
+    return sha1('%s\0%s' % (CHEETAH_VERSION, source)).hexdigest()
+
+
+class CompiledTemplateCache(object):
+    """Content-hash keyed store of compiled Cheetah template classes.
+
+    ``cache_dir``: directory in which the generated module code is kept
+    between processes.  If None, only the in-memory cache is used.
+
+    ``max_entries``: maximum number of classes kept in memory; the least
+    recently used ones are dropped first.
+
+    ``max_disk_bytes``: maximum size of ``cache_dir``; the least recently
+    used files are removed first when it grows larger than this.
+    """
+
+    def __init__(self, cache_dir=None, max_entries=DEFAULT_MAX_ENTRIES,
+                 max_disk_bytes=DEFAULT_MAX_DISK_BYTES):
+        self.cache_dir = cache_dir
+        self.max_entries = max_entries
+        self.max_disk_bytes = max_disk_bytes
+        self._classes = {}
+        self._last_used = {}
+        self._clock = 0
+        self._lock = threading.RLock()
+        self._key_locks = {}
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+    def get_class(self, source):
+        """Return the compiled template class for ``source``.
+
+        Templates are compiled outside of the cache wide lock, so that
+        threads compiling different templates do not wait for each other;
+        threads asking for the same one wait for a single compilation.
+        """
+        key = source_key(source)
+        self._lock.acquire()
+        try:
+            klass = self._classes.get(key)
+            if klass is not None:
+                self.hits += 1
+                self._touch(key)
+                return klass
+            key_lock = self._key_locks.setdefault(key, threading.Lock())
+        finally:
+            self._lock.release()
+
+        key_lock.acquire()
+        try:
+            # another thread may have compiled it while we were waiting
+            self._lock.acquire()
+            try:
+                klass = self._classes.get(key)
+                if klass is not None:
+                    self.hits += 1
+                    self._touch(key)
+                    return klass
+            finally:
+                self._lock.release()
+            code = self._read_code(key)
+            from_disk = code is not None
+            if not from_disk:
+                code = self._compile_code(source, key)
+                self._write_code(key, code)
+            klass = self._load_class(key, code)
+            self._lock.acquire()
+            try:
+                if from_disk:
+                    self.disk_hits += 1
+                else:
+                    self.misses += 1
+                self._classes[key] = klass
+                self._touch(key)
+                self._evict_memory()
+            finally:
+                self._lock.release()
+            return klass
+        finally:
+            key_lock.release()
+            self._lock.acquire()
+            try:
+                if self._key_locks.get(key) is key_lock:
+                    del self._key_locks[key]
+            finally:
+                self._lock.release()
+
+    def _touch(self, key):
+        self._clock += 1
+        self._last_used[key] = self._clock
+
+    def clear(self):
+        """Forget every class held in memory (the disk cache is kept)."""
+        self._lock.acquire()
+        try:
+            self._classes.clear()
+            self._last_used.clear()
+        finally:
+            self._lock.release()
+
+    def _class_name(self, key):
+        return 'templer_cheetah_%s' % key
+
+    def _compile_code(self, source, key):
+        # Cheetah.Template is slow to import, only the runs rendering
+        # Cheetah templates pay for it
+        import Cheetah.Template
+        name = self._class_name(key)
+        return Cheetah.Template.Template.compile(source=source,
+                                                 returnAClass=False,
+                                                 moduleName=name,
+                                                 className=name)
+
+    def _load_class(self, key, code):
+        # mirrors what Cheetah.Template.Template.compile does with the
+        # generated code when asked to return a class, except that the
+        # module is not registered in sys.modules: the class keeps it
+        # alive for as long as it is used, and no longer
+        name = self._class_name(key)
+        mod = type(sys)(name)
+        mod.__file__ = name + '.py'
+        exec compile(code, mod.__file__, 'exec') in mod.__dict__
+        klass = getattr(mod, name)
+        klass._CHEETAH_generatedModuleCode = code
+        # the globals of a module are cleared when it goes away
+        klass._templer_module = mod
+        return klass
+
+    def _evict_memory(self):
+        if self.max_entries is None:
+            return
+        while len(self._classes) > self.max_entries:
+            oldest = min(self._last_used, key=self._last_used.get)
+            del self._classes[oldest]
+            del self._last_used[oldest]
+
+    def _code_path(self, key):
+        return os.path.join(self.cache_dir, key + '.py')
+
+    def _read_code(self, key):
+        if not self.cache_dir:
+            return None
+        path = self._code_path(key)
+        try:
+            f = open(path, 'rb')
+        except IOError:
+            return None
+        try:
+            code = f.read()
+        finally:
+            f.close()
+        try:
+            # record the use, eviction removes the least recently used files
+            os.utime(path, None)
+        except OSError:
+            pass
+        return code
+
+    def _write_code(self, key, code):
+        if not self.cache_dir:
+            return
+        if atomic_write(self._code_path(key), code):
+            self._evict_disk()
+
+    def _evict_disk(self):
+        if self.max_disk_bytes is None:
+            return
+        entries = []
+        total = 0
+        for name in os.listdir(self.cache_dir):
+            if not name.endswith('.py'):
+                continue
+            path = os.path.join(self.cache_dir, name)
+            try:
+                st = os.stat(path)
+            except OSError:
+                continue
+            entries.append((st.st_mtime, st.st_size, path))
+            total += st.st_size
+        entries.sort()
+        while total > self.max_disk_bytes and entries:
+            mtime, size, path = entries.pop(0)
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            total -= size
+
+
+_default_cache = None
+
+
+def get_default_cache():
+    """Return the process wide cache.
+
+    It keeps compiled classes in memory, and on disk as well if the
+    ``TEMPLER_CACHE_DIR`` environment variable is set.
+    """
+    global _default_cache
+    if _default_cache is None:
+        _default_cache = CompiledTemplateCache(
+            cache_dir=os.environ.get(CACHE_DIR_ENV) or None)
+    return _default_cache
@@ -1,12 +1,13 @@
 import sys
 import os
 import ConfigParser
-import pkg_resources
 from cStringIO import StringIO
 from textwrap import TextWrapper
 
 from templer.core.base import wrap_help_paras
 from templer.core.create import CreateDistroCommand
+from templer.core.manifest import GeneratedFiles
+from templer.core.manifest import manifest_path
 from templer.core.ui import list_sorted_templates
 
 try:
@@ -18,12 +19,26 @@ except ImportError:
 
 def get_templer_packages():
     """return a list of the templer namespace packages currently installed"""
+    import pkg_resources
     templer_packages = [k for k in pkg_resources.working_set.by_key.keys()
                         if 'templer' in k.lower()]
 
     return templer_packages
 
 
+def _option_value(args, name):
+    """return the value given to the long option name in args, if any
+
+    Both ``--name VALUE`` and ``--name=VALUE`` are understood.
+    """
+    for index, arg in enumerate(args):
+        if arg == name and index + 1 < len(args):
+            return args[index + 1]
+        if arg.startswith(name + '='):
+            return arg[len(name) + 1:]
+    return None
+
+
 USAGE = """
 Usage:
 
@@ -33,6 +48,8 @@ Usage:
     %(script_name)s --list                List template verbosely, with details
     %(script_name)s --force               Ignore whether we are in a project
     %(script_name)s --make-config-file    Output %(dotfile_name)s prefs file
+    %(script_name)s --projects FILE       Create all the projects listed in FILE
+    %(script_name)s serve [--port N]      Serve generation requests over HTTP
     %(script_name)s --version             Print versions of installed templer
                                           packages
 
@@ -270,11 +287,16 @@ class Runner(object):
     }
     name = 'templer'
     dotfile = '.zopeskel'
-    allowed_packages = 'all'
+    context_aware = True
 
     def __init__(self, name=None, versions=None, dotfile=None, texts={},
                  context_aware=True):
-        """initialize a runner with the given name"""
+        """initialize a runner with the given name
+
+        Nothing is looked up here: the installed templer packages and the
+        context are only found out when a command needs them (see the
+        versions and allowed_packages properties).
+        """
         if name is not None:
             self.name = name
         # if versions is not passed, default to getting all installed
@@ -282,9 +304,7 @@ class Runner(object):
         if versions is not None:
             if not isinstance(versions, (list, tuple)):
                 versions = [versions, ]
-        else:
-            versions = self._get_templer_packages()
-        self.versions = versions
+        self._versions = versions
 
         if dotfile is not None:
             self.dotfile = dotfile
@@ -293,36 +313,72 @@ class Runner(object):
             raise ValueError("If passed, texts argument must be a dict")
         self.texts.update(texts)
 
-        if context_aware:
-            self.allowed_packages = self._context_awareness()
+        self.context_aware = context_aware
+        self._allowed_packages = None
+
+    def _get_versions(self):
+        if self._versions is None:
+            self._versions = self._get_templer_packages()
+        return self._versions
+
+    def _set_versions(self, versions):
+        self._versions = versions
+
+    versions = property(_get_versions, _set_versions,
+        doc="the packages shown by --version, all installed templer "
+            "packages by default")
+
+    def _get_allowed_packages(self):
+        if self._allowed_packages is None:
+            if self.context_aware:
+                self._allowed_packages = self._context_awareness()
+            else:
+                self._allowed_packages = 'all'
+        return self._allowed_packages
+
+    def _set_allowed_packages(self, allowed_packages):
+        self._allowed_packages = allowed_packages
+
+    allowed_packages = property(_get_allowed_packages, _set_allowed_packages,
+        doc="the scope of the templates offered (see _context_awareness), "
+            "found out from the current directory when first needed")
 
     def __call__(self, argv):
         """command-line interaction and template execution
 
         argv should be passed in as sys.argv[1:]
         """
+        # with --events json or --plan -, the standard output is left to the
+        # events or the plan of the create command: what the runner says
+        # goes to standard error
+        out = sys.stdout
+        if (_option_value(argv, '--events') == 'json'
+                or _option_value(argv, '--plan') == '-'):
+            out = sys.stderr
+
         try:
             template_name, output_name, args = self._process_args(argv)
         except SyntaxError, e:
-            self.usage()
+            self._usage_to(out)
             msg = "ERROR: There was a problem with your arguments: %s\n"
-            print msg % str(e)
+            print >>out, msg % str(e)
             raise
 
+        import pkg_resources
         rez = pkg_resources.iter_entry_points(
                 'paste.paster_create_template',
                 template_name)
         rez = list(rez)
         if not rez:
-            self.usage()
-            print "ERROR: No such template: %s\n" % template_name
+            self._usage_to(out)
+            print >>out, "ERROR: No such template: %s\n" % template_name
             return 1
 
         template = rez[0].load()
-        print "\n%s: %s" % (template_name, template.summary)
+        print >>out, "\n%s: %s" % (template_name, template.summary)
         help = getattr(template, 'help', None)
         if help:
-            print template.help
+            print >>out, template.help
 
         command = CreateDistroCommand()
 
@@ -340,36 +396,36 @@ class Runner(object):
                 try:
                     self._checkdots(template, output_name)
                 except ValueError, e:
-                    print "ERROR: %s\n" % str(e)
+                    print >>out, "ERROR: %s\n" % str(e)
                     raise
             else:
                 ndots = getattr(template, 'ndots', None)
                 help = DOT_HELP.get(ndots)
                 while True:
                     if help:
-                        print help
+                        print >>out, help
                     try:
                         challenge = "Enter project name (or q to quit)"
                         output_name = command.challenge(challenge)
                         if output_name == 'q':
-                            print "\n\nExiting...\n"
+                            print >>out, "\n\nExiting...\n"
                             return 0
                         self._checkdots(template, output_name)
                     except ValueError, e:
-                        print "\nERROR: %s" % e
+                        print >>out, "\nERROR: %s" % e
                         raise
                     else:
                         break
 
-            print self.texts['help_prompt']
+            print >>out, self.texts['help_prompt']
 
         try:
             command.run(['-q', '-t', template_name] + args + special_args)
         except KeyboardInterrupt:
-            print "\n\nExiting...\n"
+            print >>out, "\n\nExiting...\n"
             return 0
         except Exception, e:
-            print "\nERROR: %s\n" % str(e)
+            print >>out, "\nERROR: %s\n" % str(e)
             raise
         return 0
 
@@ -387,11 +443,10 @@ class Runner(object):
         print self.texts['dotfile_header'] % {'script_name': self.name}
         for temp in sum(cats.values(), []):
             print "\n[%(name)s]\n" % temp
-            tempc = temp['entry'].load()
-            for var in tempc.vars:
-                if hasattr(var, 'pretty_description'):
-                    print "# %s" % var.pretty_description()
-                print "# %s = %s\n" % (var.name, var.default)
+            for var in temp['vars']:
+                if var['pretty_description'] is not None:
+                    print "# %s" % var['pretty_description']
+                print "# %(name)s = %(default)s\n" % var
         return 0
 
     def list_verbose(self):
@@ -443,11 +498,41 @@ class Runner(object):
                                      'dotfile_name': self.dotfile}
         return 0
 
+    def run_projects(self, args):
+        """create all the projects of a projects file in a single run
+
+        args are the command line arguments, they are passed on to the
+        create command (e.g. ``--projects projects.json --concurrency 4``)
+        """
+        command = CreateDistroCommand()
+        try:
+            return command.run(['-q', '--no-interactive'] + args)
+        except Exception, e:
+            print "\nERROR: %s\n" % str(e)
+            raise
+
+    def serve(self, args):
+        """run the generation server until it is interrupted
+
+        args are the command line arguments following ``serve``
+        """
+        from templer.core.server import serve
+        return serve(args)
+
     def no_locals(self):
         print self.texts['no_localcommands_warning']
 
     # Private API supporting command-line flags
     # should not need to be changed by templer-based applications
+    def _usage_to(self, out):
+        # usage prints to the standard output
+        stdout = sys.stdout
+        sys.stdout = out
+        try:
+            self.usage()
+        finally:
+            sys.stdout = stdout
+
     def _run_localcommand(self, args):
         # a local command is being invoked, if local command support is not 
         # installed, fail and report to the user.  Otherwise, delegate
@@ -467,6 +552,7 @@ class Runner(object):
     def _get_templer_packages(self):
         """return a list of the templer namespace packages currently installed
         """
+        import pkg_resources
         templer_packages = [k for k in pkg_resources.working_set.by_key.keys()\
             if 'templer' in k.lower()]
         return templer_packages
@@ -474,6 +560,7 @@ class Runner(object):
     def _get_version_info(self):
         """provided a list of distribution names, return version info for them
         """
+        import pkg_resources
         version_info = []
         for package_name in self.versions:
             try:
@@ -581,37 +668,17 @@ class Runner(object):
         templer_home = os.path.dirname(templer_home) # strips the trailing
                                     # separator, unless it's already the root.
 
-        parent_template = None
         made_by_templer = False
 
         # walk back up the path to find out if we are in a templer-generated
         # distribution, and if it has local commands
         while cwd != templer_home:
-            changes_txt = os.path.join(cwd, 'CHANGES.txt')
-            setup_cfg = os.path.join(cwd, 'setup.cfg')
-
-            if os.path.exists(setup_cfg):
-                parser = ConfigParser.ConfigParser()
-                parser.read(setup_cfg)
-                try:
-                    parent_template =\
-                        parser.get('templer.local', 'template') or None
-                except:
-                    pass
+            parent_template, made_here = _directory_context(cwd)
 
             if parent_template and HAS_LOCAL_COMMANDS:
                 return 'local'
 
-            # XXX: This bothers me a lot.  It's completely dependent on an 
-            # implementation feature of how templer writes the changelog.  If
-            # a user removes this, or if we change the phrasing, this will 
-            # break.
-            if os.path.exists(changes_txt):
-                f = open(changes_txt, 'rb')
-                content = f.read()
-                f.close()
-                if 'Package created using templer' in content:
-                    made_by_templer = True
+            made_by_templer = made_by_templer or made_here
 
             (cwd, tail) = os.path.split(cwd)
 
@@ -621,6 +688,94 @@ class Runner(object):
         return 'global'
 
 
+# What _directory_context found out about each directory, with the stat
+# signature of the files it looked at:
+_directory_contexts = {}
+
+# The number of bytes read at each end of a CHANGES.txt looking for
+# CHANGES_MARKER: templer writes it as the first entry, at the top of a
+# new changelog and at the bottom of an old one.
+CHANGES_READ_SIZE = 8192
+
+CHANGES_MARKER = 'Package created using templer'
+
+
+def _stat_signature(path):
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return stat.st_mtime, stat.st_size
+
+
+def _read_ends(path, size):
+    """return the first and last size bytes of the file at path"""
+    f = open(path, 'rb')
+    try:
+        head = f.read(size)
+        f.seek(0, 2)
+        end = f.tell()
+        if end <= len(head):
+            return head
+        f.seek(max(len(head), end - size))
+        return head + '\n' + f.read()
+    finally:
+        f.close()
+
+
+def _directory_context(path):
+    """return the (template, made_by_templer) of the directory at path
+
+    template is the name of the template in the [templer.local] section
+    of its setup.cfg, if any, and made_by_templer tells whether templer
+    generated a distribution there: it has a manifest of the generated
+    files, one of which at least is still there as templer wrote it, or
+    the changelog has the marker templer writes in it.
+
+    The result is kept until one of these files changes, so that going
+    up the same directories again only costs a few stats.
+    """
+    setup_cfg = os.path.join(path, 'setup.cfg')
+    changes_txt = os.path.join(path, 'CHANGES.txt')
+    manifest = manifest_path(path)
+    signature = (_stat_signature(setup_cfg), _stat_signature(changes_txt),
+                 manifest and _stat_signature(manifest))
+    cached = _directory_contexts.get(path)
+    if cached is not None and cached[0] == signature:
+        return cached[1]
+
+    template = None
+    if signature[0] is not None:
+        f = open(setup_cfg, 'rb')
+        try:
+            content = f.read()
+        finally:
+            f.close()
+        # most setup.cfg files have nothing to do with templer, they are
+        # not worth parsing
+        if 'templer.local' in content:
+            parser = ConfigParser.ConfigParser()
+            try:
+                parser.readfp(StringIO(content), setup_cfg)
+                template = parser.get('templer.local', 'template') or None
+            except:
+                pass
+
+    # XXX: The changelog is completely dependent on an implementation
+    # feature of how templer writes it.  If a user removes the marker, or
+    # if we change the phrasing, this will break; the manifest does not
+    # have that problem, but older distributions have none.
+    made_by_templer = (signature[2] is not None
+                       and GeneratedFiles(path).has_generated_files())
+    if not made_by_templer and signature[1] is not None:
+        made_by_templer = CHANGES_MARKER in _read_ends(changes_txt,
+                                                       CHANGES_READ_SIZE)
+
+    result = template, made_by_templer
+    _directory_contexts[path] = signature, result
+    return result
+
+
 templer_runner = Runner()
 
 
@@ -646,8 +801,12 @@ def run(*args, **kw):
 
     if args[0] == 'add':
         exit_code = runner._run_localcommand(args)
+    elif args[0] == 'serve':
+        exit_code = runner.serve(args[1:])
     elif "--help" in args:
         exit_code = runner.show_help()
+    elif _option_value(args, '--projects') is not None:
+        exit_code = runner.run_projects(args)
     elif "--make-config-file" in args:
         exit_code = runner.generate_dotfile()
     elif "--list" in args:
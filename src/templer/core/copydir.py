@@ -1,14 +1,26 @@
 # (c) 2005 Ian Bicking and contributors; written for Paste (http://pythonpaste.org)
 # Licensed under the MIT license: http://www.opensource.org/licenses/mit-license.php
 
-import cgi
 import inspect
+import itertools
 import os
-import pkg_resources
+import re
 import string
-import urllib
+import sys
+import time
 
-import Cheetah.Template
+from templer.core import cheetah_cache
+from templer.core import events
+from templer.core import timing
+from templer.core.manifest import content_hash
+from templer.core.resources import get_resource_tree
+from templer.core.sinks import FileSystemSink
+from templer.core.utils import sha1
+
+try:
+    import fcntl
+except ImportError: # pragma: no cover
+    fcntl = None
 
 
 class SkipTemplate(Exception):
@@ -28,7 +40,14 @@ def copy_dir(source,
              sub_vars=True,
              interactive=False,
              overwrite=True,
-             template_renderer=None):
+             template_renderer=None,
+             template_cache=None,
+             jobs=1,
+             manifest=None,
+             sink=None,
+             context=None,
+             timings=None,
+             observer=None):
     """
     Copies the ``source`` directory to the ``dest`` directory.
 
@@ -56,27 +75,330 @@ def copy_dir(source,
     (if you don't want to use Cheetah or string.Template).  It should
     have the signature ``template_renderer(content_as_string,
     vars_as_dict, filename=filename)``.
+
+    ``template_cache``: A ``CompiledTemplateCache`` used to look up the
+    compiled Cheetah templates.  Defaults to the process wide cache.
+
+    ``jobs``: The number of threads used to render and write the files.
+    Messages and questions, including what a template says when it is
+    skipped or fails, still come out in the same order as with a single
+    thread; an error is raised when the file's turn comes.
+
+    ``manifest``: A ``manifest.GeneratedFiles`` recording the written
+    files; existing files it knows are compared without being read, and
+    not even rendered if the variables they use did not change.
+
+    ``sink``: Where the files are written, a ``sinks.FileSystemSink`` by
+    default.  The ``manifest`` and ``interactive`` only apply to files
+    written to the file system.
+
+    ``context``: The ``CopyContext`` of the run, shared by its copies so
+    that an answer given for all files applies to the following copies.
+    It takes precedence over ``interactive`` and ``overwrite``.
+
+    ``timings``: A ``timing.Timings`` recording the time each file takes
+    to be rendered and written.
+
+    ``observer``: The ``events.Observer`` notified of each directory and
+    file, and flushed before questions and at the end.  By default the
+    messages up to ``verbosity`` are printed; the events above it are
+    sent without a message.
     """
+    if observer is None:
+        observer = events.HumanRenderer(verbosity)
+
+    def notify(kind, path=None, message=None, level=1, seconds=None):
+        if level > verbosity:
+            message = None
+        observer.notify(events.Event(kind, path, message, level, seconds))
+    if context is None:
+        context = _ModuleContext(interactive=interactive,
+                                 overwrite=overwrite)
+    interactive = context.interactive
+    if sink is None:
+        sink = FileSystemSink()
+    elif not isinstance(sink, FileSystemSink):
+        manifest = None
+        interactive = False
 
     # This allows you to use a leading +dot+ in filenames which would
     # otherwise be skipped because leading dots make the file hidden:
     vars.setdefault('dot', '.')
     vars.setdefault('plus', '+')
 
+    # First build the full plan of the copy, then render the files (maybe
+    # in parallel) and finally go through the plan in order to report,
+    # ask questions and write.
+    steps = []
+    _plan_dir(steps, source, dest, FilenameSubstituter(vars), indent,
+              sub_vars, context.overwrite)
+    files = [step for step in steps if isinstance(step, FileStep)]
+
+    def render(step):
+        # what goes wrong is reported when the file's turn comes
+        start = time.time()
+        messages = []
+        try:
+            rendered = timing.timed(timings, 'render', step.dest,
+                                    _render_file, step, vars,
+                                    use_cheetah=use_cheetah,
+                                    template_renderer=template_renderer,
+                                    template_cache=template_cache,
+                                    manifest=manifest,
+                                    read_changed=interactive, sink=sink,
+                                    messages=messages)
+        except Exception:
+            return (None, None, None, time.time() - start, messages,
+                    sys.exc_info())
+        return rendered + (time.time() - start, messages, None)
+
+    def write(step, content):
+        timing.timed(timings, 'write', step.dest,
+                     sink.write, step.dest, content)
+        if manifest is not None:
+            manifest.record_hash(step.dest, _content_sha1(content),
+                                 step.inputs)
+
+    pool = None
+    if jobs > 1 and len(files) > 1:
+        from multiprocessing.pool import ThreadPool
+        pool = ThreadPool(min(jobs, len(files)))
+        rendered = pool.imap(render, files)
+    else:
+        rendered = itertools.imap(render, files)
+    writes = []
+    try:
+        for step in steps:
+            if isinstance(step, MessageStep):
+                notify(events.MESSAGE, message=step.message,
+                       level=step.level)
+                continue
+            pad = step.pad
+            if isinstance(step, DirStep):
+                if not sink.exists(step.dest):
+                    notify(events.DIR_CREATED, step.dest,
+                           '%sCreating %s/' % (pad, step.dest))
+                    if not simulate:
+                        sink.makedirs(step.dest)
+                else:
+                    notify(events.DIR_EXISTS, step.dest,
+                           '%sDirectory %s exists' % (pad, step.dest), 2)
+                continue
+            (content, state, old_content, seconds, messages,
+             error) = rendered.next()
+            for message in messages:
+                notify(error and events.WARNING or events.MESSAGE,
+                       step.dest, message, 0)
+            if error is not None:
+                raise error[0], error[1], error[2]
+            if state == 'same':
+                notify(events.FILE_UNCHANGED, step.dest,
+                       '%s%s already exists (same content)' % (pad, step.dest),
+                       seconds=seconds)
+                continue
+            if content is None:
+                notify(events.FILE_SKIPPED, step.dest, seconds=seconds)
+                continue
+            if state != 'missing':
+                if interactive:
+                    if isinstance(content, SourceFile):
+                        content = content.read()
+                    observer.flush()
+                    if not query_interactive(
+                        step.full, step.dest, content, old_content,
+                        simulate=simulate, context=context):
+                        notify(events.FILE_SKIPPED, step.dest,
+                               seconds=seconds)
+                        continue
+                elif not step.overwrite:
+                    notify(events.FILE_SKIPPED, step.dest, seconds=seconds)
+                    continue
+            if state == 'missing':
+                kind = events.FILE_CREATED
+            else:
+                kind = events.FILE_OVERWRITTEN
+            notify(kind, step.dest,
+                   '%sCopying %s to %s' % (pad, step.label, step.dest),
+                   seconds=seconds)
+            if not simulate:
+                if pool is None or not sink.threadsafe:
+                    write(step, content)
+                else:
+                    writes.append(pool.apply_async(write, (step, content)))
+        for result in writes:
+            result.get()
+    finally:
+        if pool is not None:
+            pool.close()
+            pool.join()
+        observer.flush()
+
+
+def plan_copy(source,
+              dest,
+              vars,
+              use_cheetah=False,
+              sub_vars=True,
+              overwrite=True,
+              template_renderer=None,
+              template_cache=None,
+              jobs=1,
+              manifest=None):
+    """
+    Returns the list of ``PlannedFile`` describing what ``copy_dir`` would
+    do with the same arguments, without writing anything.  Every file is
+    rendered (with ``jobs`` threads) to know its size and whether it
+    differs from the destination.  An interactive ``copy_dir`` asks before
+    the files planned as ``overwrite`` are written.
+    """
+    vars.setdefault('dot', '.')
+    vars.setdefault('plus', '+')
+    steps = []
+    _plan_dir(steps, source, dest, FilenameSubstituter(vars), 0,
+              sub_vars, overwrite)
+    files = [step for step in steps if isinstance(step, FileStep)]
+
+    def plan(step):
+        start = time.time()
+        # a skipped file is planned as skipped, without saying why
+        content, state, old_content = _render_file(
+            step, vars, use_cheetah=use_cheetah,
+            template_renderer=template_renderer,
+            template_cache=template_cache, manifest=manifest,
+            read_changed=False, messages=[])
+        render_time = time.time() - start
+        renderer = _renderer_name(step, use_cheetah, template_renderer)
+        size = None
+        if state == 'same':
+            action = 'unchanged'
+            if content is None:
+                # its inputs did not change, it was not even rendered
+                size = os.path.getsize(step.dest)
+            else:
+                size = len(content)
+        elif content is None:
+            action = 'skip'
+        else:
+            size = len(content)
+            if state == 'missing':
+                action = 'create'
+            elif step.overwrite:
+                action = 'overwrite'
+            else:
+                action = 'skip'
+        return PlannedFile(step.dest, step.full, renderer, action,
+                           size=size, render_time=render_time)
+
+    if jobs > 1 and len(files) > 1:
+        from multiprocessing.pool import ThreadPool
+        pool = ThreadPool(min(jobs, len(files)))
+        try:
+            return pool.map(plan, files)
+        finally:
+            pool.close()
+            pool.join()
+    return map(plan, files)
+
+
+class PlannedFile(object):
+    """
+    What copying a file would do, as returned by ``plan_copy``.
+
+    ``dest``: the path of the destination file.
+
+    ``source``: the path (or package resource name) of the source file.
+
+    ``renderer``: ``copy`` for files copied as they are, else ``cheetah``,
+    ``string.Template`` or ``custom`` (a ``template_renderer``); ``hook``
+    for the files the hooks of a template write, which have no source.
+
+    ``action``: ``create``, ``overwrite``, ``unchanged`` (the destination
+    already has the rendered content), ``skip`` (the template raised
+    ``SkipTemplate``, or the destination differs and may not be
+    overwritten) or ``update`` (a hook changes the file in place).
+
+    ``size``: the size of the rendered content in bytes, None if skipped
+    or updated.
+
+    ``render_time``: the seconds spent reading and rendering the file.
+    """
+
+    def __init__(self, dest, source, renderer, action, size=None,
+                 render_time=0.0):
+        self.dest = dest
+        self.source = source
+        self.renderer = renderer
+        self.action = action
+        self.size = size
+        self.render_time = render_time
+
+    def __repr__(self):
+        return '<%s %s %s>' % (self.__class__.__name__, self.action,
+                               self.dest)
+
+    def as_dict(self):
+        return {'dest': self.dest,
+                'source': self.source,
+                'renderer': self.renderer,
+                'action': self.action,
+                'size': self.size,
+                'render_time': self.render_time}
+
+
+class MessageStep(object):
+    """A message shown in a copy_dir plan at the given verbosity level."""
+
+    def __init__(self, level, message):
+        self.level = level
+        self.message = message
+
+
+class DirStep(object):
+    """A destination directory that must exist."""
+
+    def __init__(self, dest, pad):
+        self.dest = dest
+        self.pad = pad
+
+
+class FileStep(object):
+    """A file to be rendered from ``full`` and written to ``dest``."""
+
+    def __init__(self, source, full, dest, sub_file, overwrite, pad):
+        self.source = source
+        self.full = full
+        self.dest = dest
+        self.sub_file = sub_file
+        self.overwrite = overwrite
+        self.pad = pad
+        # what the content depends on, recorded in the manifest
+        self.inputs = None
+
+    @property
+    def use_pkg_resources(self):
+        return isinstance(self.source, tuple)
+
+    @property
+    def label(self):
+        if self.use_pkg_resources:
+            return self.full
+        return os.path.basename(self.full)
+
+
+def _plan_dir(steps, source, dest, filenames, indent, sub_vars, overwrite):
+    """
+    Appends the steps needed to copy ``source`` to ``dest`` to ``steps``.
+    ``filenames`` is the ``FilenameSubstituter`` used for ``+var+`` names.
+    """
     use_pkg_resources = isinstance(source, tuple)
     if use_pkg_resources:
-        names = pkg_resources.resource_listdir(source[0], source[1])
+        tree = get_resource_tree(source[0])
+        names = tree.listdir(source[1])
     else:
         names = os.listdir(source)
-    names.sort()
+        names.sort()
     pad = ' ' * (indent * 2)
-    if not os.path.exists(dest):
-        if verbosity >= 1:
-            print '%sCreating %s/' % (pad, dest)
-        if not simulate:
-            makedirs(dest, verbosity=verbosity, pad=pad)
-    elif verbosity >= 2:
-        print '%sDirectory %s exists' % (pad, dest)
+    steps.append(DirStep(dest, pad))
 
     for name in names:
         if use_pkg_resources:
@@ -85,71 +407,346 @@ def copy_dir(source,
             full = os.path.join(source, name)
         reason = should_skip_file(name)
         if reason:
-            if verbosity >= 2:
-                reason = pad + reason % {'filename': full}
-                print reason
+            reason = pad + reason % {'filename': full}
+            steps.append(MessageStep(2, reason))
             continue
         if sub_vars:
-            dest_full = os.path.join(dest, substitute_filename(name, vars))
+            dest_full = os.path.join(dest, filenames(name))
+        else:
+            dest_full = os.path.join(dest, name)
         sub_file = False
         if dest_full.endswith('_tmpl'):
             dest_full = dest_full[:-5]
             sub_file = sub_vars
-        if use_pkg_resources and pkg_resources.resource_isdir(source[0], full):
-            if verbosity:
-                print '%sRecursing into %s' % (pad, os.path.basename(full))
-            copy_dir((source[0], full), dest_full, vars, verbosity, simulate,
-                     indent=indent + 1, use_cheetah=use_cheetah,
-                     sub_vars=sub_vars, interactive=interactive,
-                     template_renderer=template_renderer)
+        if use_pkg_resources and tree.isdir(full):
+            steps.append(MessageStep(
+                1, '%sRecursing into %s' % (pad, os.path.basename(full))))
+            # nested directories have always been copied with the
+            # default of overwrite=True
+            _plan_dir(steps, (source[0], full), dest_full, filenames,
+                      indent + 1, sub_vars, True)
             continue
         elif not use_pkg_resources and os.path.isdir(full):
-            if verbosity:
-                print '%sRecursing into %s' % (pad, os.path.basename(full))
-            copy_dir(full, dest_full, vars, verbosity, simulate,
-                     indent=indent + 1, use_cheetah=use_cheetah,
-                     sub_vars=sub_vars, interactive=interactive,
-                     template_renderer=template_renderer)
+            steps.append(MessageStep(
+                1, '%sRecursing into %s' % (pad, os.path.basename(full))))
+            _plan_dir(steps, full, dest_full, filenames,
+                      indent + 1, sub_vars, True)
             continue
-        elif use_pkg_resources:
-            content = pkg_resources.resource_string(source[0], full)
-        else:
-            f = open(full, 'rb')
-            content = f.read()
-            f.close()
-        if sub_file:
+        steps.append(FileStep(source, full, dest_full, sub_file, overwrite,
+                              pad))
+
+
+def _renderer_name(step, use_cheetah, template_renderer):
+    if not step.sub_file:
+        return 'copy'
+    elif template_renderer is not None:
+        return 'custom'
+    elif use_cheetah:
+        return 'cheetah'
+    return 'string.Template'
+
+
+def _render_file(step, vars, use_cheetah=False, template_renderer=None,
+                 template_cache=None, manifest=None, read_changed=True,
+                 sink=None, messages=None):
+    """
+    Returns the new content of the file of ``step`` (None if it is
+    skipped), the state of its destination compared to it (``missing``,
+    ``same`` or ``changed``) and the current content of the destination.
+
+    Files that are not templates are not read in memory: their content is
+    a ``SourceFile`` streamed from the source when it is written.
+
+    The destination is not read when ``manifest`` knows its content or
+    when its size differs, in which case the current content is None for
+    a ``changed`` file unless ``read_changed`` is true.  If the source and
+    the variables it uses did not change since the destination was
+    written, the file is not even rendered and its state is ``same`` with
+    a new content of None.
+
+    What a template says when it is skipped or fails is added to the list
+    ``messages`` if it is given, else printed.
+    """
+    if step.sub_file:
+        source = _read_source(step)
+        if manifest is not None:
+            source_hash = content_hash(source)
+    else:
+        content = SourceFile(step)
+        if manifest is not None:
+            source_hash = content.sha1
+    if manifest is not None:
+        renderer = _renderer_name(step, use_cheetah, template_renderer)
+        recorded = manifest.recorded_inputs(step.dest)
+        if (recorded is not None and recorded['source'] == source_hash
+                and recorded['deps'] is not None):
+            inputs_hash = _inputs_hash(source_hash, renderer,
+                                       recorded['deps'], vars)
+            if (inputs_hash == recorded['hash']
+                    and manifest.known_hash(step.dest) is not None):
+                return None, 'same', None
+    if step.sub_file:
+        try:
+            content = substitute_content(source, vars, filename=step.full,
+                                         use_cheetah=use_cheetah,
+                                         template_renderer=template_renderer,
+                                         template_cache=template_cache,
+                                         messages=messages)
+        except SkipTemplate:
+            return None, None, None
+        if content is None:
+            return None, None, None
+    if manifest is not None:
+        deps = []
+        if step.sub_file:
+            deps = template_dependencies(source, use_cheetah=use_cheetah,
+                                         template_renderer=template_renderer,
+                                         template_cache=template_cache)
+        inputs_hash = None
+        if deps is not None:
+            inputs_hash = _inputs_hash(source_hash, renderer, deps, vars)
+        step.inputs = {'source': source_hash,
+                       'deps': deps,
+                       'hash': inputs_hash}
+        known = manifest.known_hash(step.dest)
+        if known is not None:
+            if known == _content_sha1(content):
+                manifest.record_hash(step.dest, known, step.inputs)
+                return content, 'same', None
+            if not read_changed:
+                return content, 'changed', None
+    if sink is None:
+        sink = FileSystemSink()
+    size = sink.getsize(step.dest)
+    if size is None:
+        return content, 'missing', None
+    if size == len(content):
+        if sink.same_content(step.dest, content):
+            if manifest is not None:
+                manifest.record_hash(step.dest, _content_sha1(content),
+                                     step.inputs)
+            return content, 'same', None
+    if not read_changed:
+        return content, 'changed', None
+    return content, 'changed', sink.read(step.dest)
+
+
+# Files copied as they are go through memory in blocks of this size:
+CHUNK_SIZE = 64 * 1024
+
+
+class SourceFile(object):
+    """
+    The content of a file copied as it is, read in chunks of
+    ``CHUNK_SIZE`` only when it is hashed or written.  ``len()`` gives
+    its size in bytes.
+    """
+
+    def __init__(self, step):
+        self.step = step
+        self._sha1 = None
+        self._size = None
+
+    def open(self):
+        if self.step.use_pkg_resources:
+            return get_resource_tree(self.step.source[0]).open(
+                self.step.full)
+        return open(self.step.full, 'rb')
+
+    def read(self):
+        """Returns the whole content, only needed to show a diff."""
+        return _read_file(self.step.full, self.open())
+
+    @property
+    def sha1(self):
+        if self._sha1 is None:
+            self.copy_to(None)
+        return self._sha1
+
+    def __len__(self):
+        if self._size is None:
+            if self.step.use_pkg_resources:
+                self.copy_to(None)
+            else:
+                self._size = os.path.getsize(self.step.full)
+        return self._size
+
+    def same_as(self, filename):
+        """
+        Returns True if the file ``filename`` has the same content.  Its
+        hash is compared if the hash of the source is already known, else
+        both files are compared chunk by chunk up to the first difference.
+        """
+        if self._sha1 is not None:
+            return _file_sha1(filename) == self._sha1
+        f = self.open()
+        try:
+            other = open(filename, 'rb')
             try:
-                content = substitute_content(content, vars, filename=full,
-                                             use_cheetah=use_cheetah,
-                                             template_renderer=template_renderer)
-            except SkipTemplate:
-                continue
-            if content is None:
-                continue
-        already_exists = os.path.exists(dest_full)
-        if already_exists:
-            f = open(dest_full, 'rb')
-            old_content = f.read()
+                while 1:
+                    chunk = f.read(CHUNK_SIZE)
+                    if chunk != other.read(CHUNK_SIZE):
+                        return False
+                    if not chunk:
+                        return True
+            finally:
+                other.close()
+        finally:
             f.close()
-            if old_content == content:
-                if verbosity:
-                    print '%s%s already exists (same content)' % (pad, dest_full)
-                continue
-            if interactive:
-                if not query_interactive(
-                    full, dest_full, content, old_content,
-                    simulate=simulate):
-                    continue
-            elif not overwrite:
-                continue
-        if verbosity and use_pkg_resources:
-            print '%sCopying %s to %s' % (pad, full, dest_full)
-        elif verbosity:
-            print '%sCopying %s to %s' % (pad, os.path.basename(full), dest_full)
-        if not simulate:
-            f = open(dest_full, 'wb')
-            f.write(content)
+
+    def write_to(self, fileobj):
+        """
+        Writes the content to the new, empty file ``fileobj``.  Where the
+        file system supports it the source is cloned (copy-on-write) into
+        it, without going through memory at all.
+        """
+        if (not self.step.use_pkg_resources
+                and _clone_file(self.step.full, fileobj)):
+            return
+        self.copy_to(fileobj)
+
+    def copy_to(self, fileobj):
+        """
+        Writes the content to ``fileobj`` (or nowhere if None), hashing it
+        on the way.
+        """
+        digest = sha1()
+        size = 0
+        f = self.open()
+        try:
+            while 1:
+                chunk = f.read(CHUNK_SIZE)
+                if not chunk:
+                    break
+                digest.update(chunk)
+                size += len(chunk)
+                if fileobj is not None:
+                    fileobj.write(chunk)
+        finally:
             f.close()
+        self._sha1 = digest.hexdigest()
+        self._size = size
+
+
+# ioctl cloning a file on Linux file systems with copy-on-write (btrfs,
+# xfs, ...); it fails on the others and across file systems.  Hard links
+# are never used: editing the generated file would change the template.
+FICLONE = 0x40049409
+
+
+def _clone_file(filename, fileobj):
+    """
+    Clones ``filename`` into the empty file ``fileobj``, returns False if
+    that is not possible.
+    """
+    if fcntl is None or not sys.platform.startswith('linux'):
+        return False
+    fd = os.open(filename, os.O_RDONLY)
+    try:
+        try:
+            fcntl.ioctl(fileobj.fileno(), FICLONE, fd)
+        except (IOError, OSError):
+            return False
+    finally:
+        os.close(fd)
+    return True
+
+
+def _read_source(step):
+    if step.use_pkg_resources:
+        return get_resource_tree(step.source[0]).read(step.full)
+    return _read_file(step.full)
+
+
+def _read_file(filename, f=None):
+    if f is None:
+        f = open(filename, 'rb')
+    try:
+        return f.read()
+    finally:
+        f.close()
+
+
+def _file_sha1(filename):
+    digest = sha1()
+    f = open(filename, 'rb')
+    try:
+        while 1:
+            chunk = f.read(CHUNK_SIZE)
+            if not chunk:
+                break
+            digest.update(chunk)
+    finally:
+        f.close()
+    return digest.hexdigest()
+
+
+def _content_sha1(content):
+    if isinstance(content, SourceFile):
+        return content.sha1
+    return content_hash(content)
+
+
+def _inputs_hash(source_hash, renderer, deps, vars):
+    parts = [source_hash, renderer]
+    for name in deps:
+        if name in vars:
+            parts.append('%s=%r' % (name, vars[name]))
+        else:
+            parts.append(name)
+    return content_hash('\0'.join(parts))
+
+
+# Cheetah placeholders and expressions look their names up with these
+# calls in the code Cheetah generates:
+_cheetah_lookup_re = re.compile(r'VFF?SL\([^"]*"([^"]+)"')
+# Template sources doing any of this may depend on more than the
+# variables they name:
+_cheetah_dynamic_re = re.compile(
+    r'#(?:import|from|include|extends)\b|getVar|hasVar|varExists|'
+    r'searchList|locals\(|globals\(')
+
+
+def _code_names(code):
+    names = set(code.co_names)
+    for const in code.co_consts:
+        if hasattr(const, 'co_names'):
+            names.update(_code_names(const))
+    return names
+
+
+def template_dependencies(content, use_cheetah=False, template_renderer=None,
+                          template_cache=None):
+    """
+    Returns the sorted names of the variables the template ``content``
+    uses, or None if they cannot be known (custom renderers, Cheetah
+    templates importing modules or looking variables up dynamically).
+    """
+    if template_renderer is not None:
+        return None
+    names = set()
+    if use_cheetah:
+        if _cheetah_dynamic_re.search(content):
+            return None
+        if template_cache is None:
+            template_cache = cheetah_cache.get_default_cache()
+        code = getattr(template_cache.get_class(content),
+                       '_CHEETAH_generatedModuleCode', None)
+        if code is None:
+            return None
+        for name in _cheetah_lookup_re.findall(code):
+            names.add(name.split('.')[0])
+    else:
+        for match in LaxTemplate.pattern.finditer(content):
+            if match.group('named'):
+                names.add(match.group('named'))
+            elif match.group('braced'):
+                for expr in match.group('braced').split('|'):
+                    try:
+                        names.update(_code_names(compile_expression(expr)))
+                    except SyntaxError:
+                        return None
+    return sorted(names)
 
 
 def should_skip_file(name):
@@ -172,13 +769,53 @@ def should_skip_file(name):
     return None
 
 
-# Overridden on user's request:
+class CopyContext(object):
+    """
+    The state shared by the copies of one run.
+
+    ``interactive``: ask before overwriting a file with a new content.
+
+    ``overwrite``: overwrite files with a new content when not asking.
+
+    ``all_answer``: the answer given (``y``, ``n`` or ``b``) for all the
+    files still to ask about, None to ask for each one.
+    """
+
+    def __init__(self, interactive=False, overwrite=True, all_answer=None):
+        self.interactive = interactive
+        self.overwrite = overwrite
+        self.all_answer = all_answer
+
+
+# Deprecated: the answer given for all files by the copies run without a
+# ``CopyContext``, as they used to share it; pass a context instead.
 all_answer = None
 
 
+class _ModuleContext(CopyContext):
+    """
+    The context of the copies run without one: its ``all_answer`` is the
+    ``all_answer`` module attribute.
+    """
+
+    def __init__(self, interactive=False, overwrite=True):
+        self.interactive = interactive
+        self.overwrite = overwrite
+
+    def _get_all_answer(self):
+        return all_answer
+
+    def _set_all_answer(self, value):
+        global all_answer
+        all_answer = value
+
+    all_answer = property(_get_all_answer, _set_all_answer)
+
+
 def query_interactive(src_fn, dest_fn, src_content, dest_content,
-                      simulate):
-    global all_answer
+                      simulate, context=None):
+    if context is None:
+        context = _ModuleContext(interactive=True)
     from difflib import unified_diff, context_diff
     u_diff = list(unified_diff(
         dest_content.splitlines(),
@@ -203,10 +840,10 @@ def query_interactive(src_fn, dest_fn, src_content, dest_content,
         removed, len(dest_content.splitlines()), msg)
     prompt = 'Overwrite %s [y/n/d/B/?] ' % dest_fn
     while 1:
-        if all_answer is None:
+        if context.all_answer is None:
             response = raw_input(prompt).strip().lower()
         else:
-            response = all_answer
+            response = context.all_answer
         if not response or response[0] == 'b':
             import shutil
             new_dest_fn = dest_fn + '.bak'
@@ -223,7 +860,7 @@ def query_interactive(src_fn, dest_fn, src_content, dest_content,
             if not rest or rest[0] not in ('y', 'n', 'b'):
                 print query_usage
                 continue
-            response = all_answer = rest[0]
+            response = context.all_answer = rest[0]
         if response[0] == 'y':
             return True
         elif response[0] == 'n':
@@ -254,13 +891,55 @@ def makedirs(dir, verbosity, pad):
 
 
 def substitute_filename(fn, vars):
-    for var, value in vars.items():
-        fn = fn.replace('+%s+' % var, str(value))
-    return fn
+    return FilenameSubstituter(vars)(fn)
+
+
+class FilenameSubstituter(object):
+    """
+    Replaces the ``+var+`` tokens of file names with the values of
+    ``vars``, in a single pass over the name.
+
+    Build one per vars dictionary and reuse it for all the names of a
+    copy: the regular expression is compiled once and the result for
+    each name (path component) is remembered.
+    """
+
+    def __init__(self, vars):
+        self.vars = vars
+        names = vars.keys()
+        # longest names first, so that the alternation prefers them
+        names.sort(key=len, reverse=True)
+        if names:
+            self.regex = re.compile(
+                r'\+(%s)\+' % '|'.join([re.escape(n) for n in names]))
+        else:
+            self.regex = None
+        self._cache = {}
+
+    def _replace(self, match):
+        return str(self.vars[match.group(1)])
+
+    def __call__(self, name):
+        try:
+            return self._cache[name]
+        except KeyError:
+            pass
+        result = name
+        if self.regex is not None and '+' in name:
+            result = self.regex.sub(self._replace, name)
+        self._cache[name] = result
+        return result
+
+    def substitute_path(self, path):
+        """
+        Substitutes each component of the relative ``path``.
+        """
+        return os.sep.join([self(part) for part in path.split(os.sep)])
 
 
 def substitute_content(content, vars, filename='<string>',
-                       use_cheetah=False, template_renderer=None):
+                       use_cheetah=False, template_renderer=None,
+                       template_cache=None, messages=None):
     v = standard_vars.copy()
     v.update(vars)
     vars = v
@@ -269,30 +948,31 @@ def substitute_content(content, vars, filename='<string>',
     if not use_cheetah:
         tmpl = LaxTemplate(content)
         try:
-            return tmpl.substitute(TypeMapper(v))
+            return tmpl.substitute(TypeMapper.for_namespace(v))
         except Exception, e:
             _add_except(e, ' in file %s' % filename)
             raise
-    tmpl = Cheetah.Template.Template(source=content,
-                                     searchList=[vars])
-    return careful_sub(tmpl, vars, filename)
+    if template_cache is None:
+        template_cache = cheetah_cache.get_default_cache()
+    tmpl = template_cache.get_class(content)(searchList=[vars])
+    return careful_sub(tmpl, vars, filename, messages)
 
 
-def careful_sub(cheetah_template, vars, filename):
+def careful_sub(cheetah_template, vars, filename, messages=None):
     """
     Substitutes the template with the variables, using the
     .body() method if it exists.  It assumes that the variables
     were also passed in via the searchList.
     """
     if not hasattr(cheetah_template, 'body'):
-        return sub_catcher(filename, vars, str, cheetah_template)
+        return _sub_catcher(filename, vars, messages, str, cheetah_template)
     body = cheetah_template.body
     args, varargs, varkw, defaults = inspect.getargspec(body)
     call_vars = {}
     for arg in args:
         if arg in vars:
             call_vars[arg] = vars[arg]
-    return sub_catcher(filename, vars, body, **call_vars)
+    return _sub_catcher(filename, vars, messages, body, **call_vars)
 
 
 def sub_catcher(filename, vars, func, *args, **kw):
@@ -300,32 +980,48 @@ def sub_catcher(filename, vars, func, *args, **kw):
     Run a substitution, returning the value.  If an error occurs, show
     the filename.  If the error is a NameError, show the variables.
     """
+    return _sub_catcher(filename, vars, None, func, *args, **kw)
+
+
+def _sub_catcher(filename, vars, messages, func, *args, **kw):
+    # what is shown is added to the list messages, if it is not None
     try:
         return func(*args, **kw)
     except SkipTemplate, e:
-        print 'Skipping file %s' % filename
+        lines = ['Skipping file %s' % filename]
         if str(e):
-            print str(e)
+            lines.append(str(e))
+        _show(messages, lines)
         raise
     except Exception, e:
-        print 'Error in file %s:' % filename
+        lines = ['Error in file %s:' % filename]
         if isinstance(e, NameError):
             items = vars.items()
             items.sort()
             for name, value in items:
-                print '%s = %r' % (name, value)
+                lines.append('%s = %r' % (name, value))
+        _show(messages, lines)
         raise
 
 
+def _show(messages, lines):
+    if messages is None:
+        print '\n'.join(lines)
+    else:
+        messages.append('\n'.join(lines))
+
+
 def html_quote(s):
     if s is None:
         return ''
+    import cgi
     return cgi.escape(str(s), 1)
 
 
 def url_quote(s):
     if s is None:
         return ''
+    import urllib
     return urllib.quote(str(s))
 
 
@@ -378,25 +1074,81 @@ def _add_except(exc, info):
 
 
 class TypeMapper(dict):
+    """
+    Mapping used to fill in ``LaxTemplate`` placeholders.  Each key is a
+    Python expression evaluated against the variables; ``a|b|c`` uses the
+    first alternative that does not raise a NameError or KeyError.
+
+    The namespace the expressions are evaluated in is built once, on
+    first use, and shared by all the placeholders of a render.
+    """
+    _namespace = None
+
+    @classmethod
+    def for_namespace(cls, namespace):
+        """
+        Returns a mapper evaluating the expressions in the dictionary
+        ``namespace`` itself, without copying it.
+        """
+        mapper = cls()
+        mapper._namespace = namespace
+        return mapper
+
+    def namespace(self):
+        if self._namespace is None:
+            self._namespace = dict(self.items())
+        return self._namespace
+
     def __getitem__(self, item):
+        namespace = self.namespace()
         options = item.split('|')
         for op in options[:-1]:
             try:
-                value = eval_with_catch(op, dict(self.items()))
+                value = eval_with_catch(op, namespace)
                 break
             except (NameError, KeyError):
                 pass
         else:
-            value = eval(options[-1], dict(self.items()))
+            value = _evaluate(options[-1], namespace)
         if value is None:
             return ''
         else:
             return str(value)
 
 
+# Compiled code of the expressions seen by TypeMapper, keyed by their text:
+_compiled_expressions = {}
+_max_compiled_expressions = 1000
+
+
+def compile_expression(expr):
+    """
+    Returns the code object for the expression ``expr``, compiling it
+    only the first time it is seen.
+    """
+    try:
+        return _compiled_expressions[expr]
+    except KeyError:
+        pass
+    code = compile(expr, '<string>', 'eval')
+    if len(_compiled_expressions) >= _max_compiled_expressions:
+        _compiled_expressions.clear()
+    _compiled_expressions[expr] = code
+    return code
+
+
+def _evaluate(expr, namespace):
+    # plain variable names are by far the most common expressions, look
+    # them up directly
+    try:
+        return namespace[expr]
+    except KeyError:
+        return eval(compile_expression(expr), namespace)
+
+
 def eval_with_catch(expr, vars):
     try:
-        return eval(expr, vars)
+        return _evaluate(expr, vars)
     except Exception, e:
         _add_except(e, 'in expression %r' % expr)
         raise
@@ -6,15 +6,23 @@ import difflib
 import fnmatch
 import getpass
 import os
-import pkg_resources
 import re
 import subprocess
 import sys
 import textwrap
+import time
+from cStringIO import StringIO
 
 from templer.core import bool_optparse
+from templer.core import cheetah_cache
 from templer.core import copydir
+from templer.core import events
 from templer.core import pluginlib
+from templer.core import sinks
+from templer.core import timing
+from templer.core.index import get_index
+from templer.core.manifest import GeneratedFiles
+from templer.core.manifest import content_hash
 
 
 class BadCommand(Exception):
@@ -68,6 +76,22 @@ class Command(object):
     # This is the default interactive state:
     default_interactive = 0
     return_code = 0
+    # The manifest.GeneratedFiles of the files written by this command,
+    # if any:
+    manifest = None
+    # The sinks.FileSystemSink (or other sink) templates write to, the file
+    # system if None:
+    sink = None
+    # The copydir.CopyContext of the project being created, if any:
+    copy_context = None
+    # The timing.Timings recording the time of each phase, if any:
+    timings = None
+    # The events.Observer notified of what the command does; if None the
+    # messages the verbosity asks for are printed as they come:
+    observer = None
+    # How the events are reported: 'json' for a JSON object per line on
+    # the standard output and nothing else, as messages otherwise:
+    events_format = None
 
     def run(self, args):
         self.parse_args(args)
@@ -287,6 +311,21 @@ class Command(object):
         else:
             return fn
 
+    def notify(self, kind, path=None, message=None, level=1):
+        """
+        Sends an ``events.Event`` to the observer, or prints its
+        ``message`` if the verbosity is at least ``level``.
+        """
+        if self.observer is not None:
+            self.observer.notify(events.Event(kind, path, message, level))
+        elif message is not None and getattr(self, 'verbose', 0) >= level:
+            print message
+
+    def flush_events(self):
+        """Writes what the observer kept, before printing or asking."""
+        if self.observer is not None:
+            self.observer.flush()
+
     def ensure_dir(self, dir):
         """
         Ensure that the directory exists, creating it if necessary.
@@ -300,15 +339,16 @@ class Command(object):
             # first?  Though presumably the current directory always
             # exists.
             return
-        if not os.path.exists(dir):
+        if not self.get_sink().exists(dir):
             self.ensure_dir(os.path.dirname(dir))
-            if self.verbose:
-                print 'Creating %s' % self.shorten(dir)
+            self.notify(events.DIR_CREATED, dir,
+                        'Creating %s' % self.shorten(dir))
             if not self.simulate:
-                os.mkdir(dir)
+                self.get_sink().makedirs(dir)
         else:
-            if self.verbose > 1:
-                print "Directory already exists: %s" % self.shorten(dir)
+            self.notify(events.DIR_EXISTS, dir,
+                        "Directory already exists: %s" % self.shorten(dir),
+                        2)
 
     def ensure_file(self, filename, content):
         """
@@ -318,24 +358,33 @@ class Command(object):
         """
         assert content is not None, (
             "You cannot pass a content of None")
+        sink = self.get_sink()
         self.ensure_dir(os.path.dirname(filename))
-        if not os.path.exists(filename):
-            if self.verbose:
-                print 'Creating %s' % filename
+        if not sink.exists(filename):
+            self.notify(events.FILE_CREATED, filename,
+                        'Creating %s' % filename)
             if not self.simulate:
-                f = open(filename, 'wb')
-                f.write(content)
-                f.close()
+                self._write_generated(filename, content)
             return
-        f = open(filename, 'rb')
-        old_content = f.read()
-        f.close()
-        if content == old_content:
-            if self.verbose > 1:
-                print 'File %s matches expected content' % filename
+        known = None
+        if self.manifest is not None:
+            known = self.manifest.known_hash(filename)
+        if known is not None and self.options.overwrite:
+            # no need to read the file, it is only compared
+            old_content = None
+            same = known == content_hash(content)
+        else:
+            old_content = sink.read(filename)
+            same = content == old_content
+        if same:
+            self.notify(events.FILE_UNCHANGED, filename,
+                        'File %s matches expected content' % filename, 2)
             return
         if not self.options.overwrite:
-            print 'Warning: file %s does not match expected content' % filename
+            self.notify(events.WARNING, filename,
+                        'Warning: file %s does not match expected content'
+                        % filename, 0)
+            self.flush_events()
             diff = difflib.context_diff(
                 content.splitlines(),
                 old_content.splitlines(),
@@ -351,17 +400,29 @@ class Command(object):
                     if s.startswith('y'):
                         break
                     if s.startswith('n'):
+                        self.notify(events.FILE_SKIPPED, filename)
                         return
                     print 'Unknown response; Y or N please'
             else:
+                self.notify(events.FILE_SKIPPED, filename)
                 return
 
-        if self.verbose:
-            print 'Overwriting %s with new content' % filename
+        self.notify(events.FILE_OVERWRITTEN, filename,
+                    'Overwriting %s with new content' % filename)
         if not self.simulate:
-            f = open(filename, 'wb')
-            f.write(content)
-            f.close()
+            self._write_generated(filename, content)
+
+    def get_sink(self):
+        """
+        Returns the sink the files of the command are written to, the file
+        system unless ``sink`` is set.
+        """
+        return self.sink or sinks.FileSystemSink()
+
+    def _write_generated(self, filename, content):
+        self.get_sink().write(filename, content)
+        if self.manifest is not None:
+            self.manifest.record(filename, content)
 
     def insert_into_file(self, filename, marker_name, text,
                          indent=False):
@@ -378,17 +439,16 @@ class Command(object):
         if not text.endswith('\n'):
             raise ValueError(
                 "The text must end with a newline: %r" % text)
-        if not os.path.exists(filename) and self.simulate:
+        sink = self.get_sink()
+        if not sink.exists(filename) and self.simulate:
             # If we are doing a simulation, it's expected that some
             # files won't exist...
-            if self.verbose:
-                print 'Would (if not simulating) insert text into %s' % (
-                    self.shorten(filename))
+            self.notify(events.FILE_UPDATED, filename,
+                        'Would (if not simulating) insert text into %s'
+                        % self.shorten(filename))
             return
 
-        f = open(filename)
-        lines = f.readlines()
-        f.close()
+        lines = StringIO(sink.read(filename)).readlines()
         regex = re.compile(r'-\*-\s+%s:?\s+-\*-' % re.escape(marker_name),
                            re.I)
         for i in range(len(lines)):
@@ -397,8 +457,9 @@ class Command(object):
                 if (lines[i:] and len(lines[i:]) > 1 and
                     ''.join(lines[i + 1:]).strip().startswith(text.strip())):
                     # Already have it!
-                    print 'Warning: line already found in %s (not inserting' % filename
-                    print '  %s' % lines[i]
+                    self.notify(events.WARNING, filename,
+                                'Warning: line already found in %s (not '
+                                'inserting\n  %s' % (filename, lines[i]), 0)
                     return
 
                 if indent:
@@ -412,15 +473,14 @@ class Command(object):
                 "Marker '-*- %s -*-' not found in %s"
                 % (marker_name, filename))
             if 1 or self.simulate:  # @@: being permissive right now
-                print 'Warning: %s' % errstr
+                self.notify(events.WARNING, filename, 'Warning: %s' % errstr,
+                            0)
             else:
                 raise ValueError(errstr)
-        if self.verbose:
-            print 'Updating %s' % self.shorten(filename)
+        self.notify(events.FILE_UPDATED, filename,
+                    'Updating %s' % self.shorten(filename))
         if not self.simulate:
-            f = open(filename, 'w')
-            f.write(''.join(lines))
-            f.close()
+            self._write_generated(filename, ''.join(lines))
 
     def run_command(self, cmd, *args, **kw):
         """
@@ -525,6 +585,12 @@ class Command(object):
             "command.write_file has been replaced with "
             "command.ensure_file",
             DeprecationWarning, 2)
+        if self.manifest is not None and self.manifest.matches(filename,
+                                                               content):
+            if self.verbose:
+                print 'File %s exists with same content' % (
+                    self.shorten(filename))
+            return
         if os.path.exists(filename):
             if binary:
                 f = open(filename, 'rb')
@@ -546,13 +612,9 @@ class Command(object):
         elif self.verbose:
             print 'Writing %s' % self.shorten(filename)
         if not self.simulate:
-            already_existed = os.path.exists(filename)
-            if binary:
-                f = open(filename, 'wb')
-            else:
-                f = open(filename, 'w')
-            f.write(content)
-            f.close()
+            if not binary:
+                content = content.replace('\n', os.linesep)
+            self._write_generated(filename, content)
 
     def parse_vars(self, args):
         """
@@ -670,25 +732,134 @@ class CreateDistroCommand(Command):
                       action='store',
                       dest='config',
                       help="Template variables file")
+    parser.add_option('--plan',
+                      dest='plan',
+                      metavar='FILE',
+                      help="Write what would be done to each file as JSON to "
+                           "FILE (- for the standard output), without writing "
+                           "anything")
+    parser.add_option('--archive',
+                      dest='archive',
+                      metavar='FORMAT',
+                      type='choice',
+                      choices=list(sinks.ARCHIVE_FORMATS),
+                      help="Write the project into an archive (%s) in the "
+                           "output directory instead of a directory"
+                           % '|'.join(sinks.ARCHIVE_FORMATS))
+    parser.add_option('--template-cache',
+                      dest='template_cache',
+                      metavar='DIR',
+                      help="Keep compiled Cheetah templates in DIR between "
+                           "runs (default: $%s)"
+                           % cheetah_cache.CACHE_DIR_ENV)
+    parser.add_option('--projects',
+                      dest='projects_file',
+                      metavar='FILE',
+                      help="Create all the projects listed in FILE (JSON or "
+                           "INI), without asking questions")
+    parser.add_option('--concurrency',
+                      dest='concurrency',
+                      metavar='N',
+                      type='int',
+                      default=1,
+                      help="Create up to N projects of --projects at once "
+                           "(default 1)")
+    parser.add_option('-j', '--jobs',
+                      dest='jobs',
+                      metavar='N',
+                      type='int',
+                      default=1,
+                      help="Render and write files using N threads "
+                           "(default 1)")
+    parser.add_option('--events',
+                      dest='events',
+                      metavar='FORMAT',
+                      type='choice',
+                      choices=['human', 'json'],
+                      help="Report what is done as messages (human, the "
+                           "default) or as JSON lines on the standard output "
+                           "(json), which silences the other messages")
+    parser.add_option('--timings',
+                      dest='timings',
+                      action='store_true',
+                      help="Print the time spent in each phase, template, "
+                           "structure and file")
+    parser.add_option('--profile',
+                      dest='profile',
+                      metavar='FILE',
+                      help="Run under cProfile and write the statistics to "
+                           "FILE (- to print the most expensive calls)")
 
     _bad_chars_re = re.compile('[^a-zA-Z0-9_]')
 
     default_verbosity = 1
     default_interactive = 1
 
+    # The CompiledTemplateCache used for Cheetah templates; None means the
+    # process wide default cache:
+    template_cache = None
+
+    # The variables of the last project created, as the templates checked
+    # them:
+    checked_vars = None
+
+    # The standard output while it is left to the plan of --plan -, if so:
+    plan_stream = None
+
     def __init__(self):
         self.command_name = 'create'
 
     def command(self):
+        self.events_format = getattr(self.options, 'events', None)
+        if self.events_format == 'json':
+            self.verbose = min(self.verbose, -1)
+            self.observer = events.JSONLinesRenderer()
+        elif self.observer is None:
+            self.observer = events.HumanRenderer(self.verbose)
+        if getattr(self.options, 'timings', False):
+            self.timings = timing.Timings()
+        if getattr(self.options, 'plan', None) == '-':
+            # the standard output is left to the plan, what is said on the
+            # way goes to standard error
+            self.plan_stream = sys.stdout
+            sys.stdout = sys.stderr
+        try:
+            try:
+                if getattr(self.options, 'profile', None):
+                    return timing.profile(self.options.profile, self.create)
+                return self.create()
+            finally:
+                if (self.timings is not None
+                        and self.events_format == 'json'):
+                    self.observer.notify(events.Event(
+                        events.TIMINGS, data=self.timings.as_dict(),
+                        level=0))
+                self.flush_events()
+                if (self.timings is not None
+                        and self.events_format != 'json'):
+                    print self.timings.summary()
+        finally:
+            if self.plan_stream is not None:
+                sys.stdout = self.plan_stream
+                self.plan_stream = None
+
+    def create(self):
+        """Carries out the command, as given by the options."""
         if self.options.list_templates:
             return self.list_templates()
+        if self.options.template_cache:
+            self.template_cache = cheetah_cache.CompiledTemplateCache(
+                cache_dir=self.options.template_cache)
+        if self.options.projects_file:
+            return self.bulk_create(self.options.projects_file)
         asked_tmpls = self.options.templates or ['basic_package']
         templates = []
         for tmpl_name in asked_tmpls:
-            self.extend_templates(templates, tmpl_name)
+            timing.timed(self.timings, 'load_templates', tmpl_name,
+                         self.extend_templates, templates, tmpl_name)
         if self.options.list_variables:
             return self.list_variables(templates)
-        if self.verbose:
+        if self.verbose > 0:
             print 'Selected and implied templates:'
             max_tmpl_name = max([len(tmpl_name) for tmpl_name, tmpl in templates])
             for tmpl_name, tmpl in templates:
@@ -705,36 +876,125 @@ class CreateDistroCommand(Command):
             dist_name = self.args[0].lstrip(os.path.sep)
 
         templates = [tmpl for name, tmpl in templates]
-        output_dir = os.path.join(self.options.output_dir, dist_name)
- 
-        pkg_name = self._bad_chars_re.sub('', dist_name.lower())
-        vars = {'project': dist_name,
-                'package': pkg_name,
-                'egg': pluginlib.egg_name(dist_name),
-                }
-        vars.update(self.parse_vars(self.args[1:]))
-        if self.options.config and os.path.exists(self.options.config):
-            for key, value in self.read_vars(self.options.config).items():
-                vars.setdefault(key, value)
+        return self.create_project(dist_name, templates,
+                                   self.parse_vars(self.args[1:]))
+
+    def create_project(self, dist_name, templates, extra_vars):
+        """
+        Creates the project ``dist_name`` in the output directory from
+        the template objects ``templates``.  ``extra_vars`` are the
+        variables given by the user.
+        """
+        if self.options.plan:
+            return self.write_plan(self.options.plan, self.plan_project(
+                dist_name, templates, extra_vars))
+
+        output_dir, vars = self.project_vars(dist_name, extra_vars)
 
-        if self.verbose:  # @@: > 1?
+        if self.verbose > 0:  # @@: > 1?
             self.display_vars(vars)
 
         if self.options.inspect_files:
             self.inspect_files(
                 output_dir, templates, vars)
             return
+        self.copy_context = copydir.CopyContext(
+            interactive=self.interactive,
+            overwrite=self.options.overwrite)
         if not os.path.exists(output_dir):
             # We want to avoid asking questions in copydir if the path
             # doesn't exist yet
-            copydir.all_answer = 'y'
+            self.copy_context.all_answer = 'y'
+
+        vars = self.check_template_vars(templates, vars)
+        self.checked_vars = vars
+
+        try:
+            if self.options.archive:
+                self.create_archive(dist_name, templates, output_dir, vars)
+            else:
+                self.manifest = GeneratedFiles(output_dir)
+                try:
+                    for template in templates:
+                        self.create_template(
+                            template, output_dir, vars)
+                finally:
+                    if not self.simulate:
+                        self.manifest.save()
+        finally:
+            self.flush_events()
+
+        package_dir = vars.get('package_dir', None)
+        if package_dir:
+            output_dir = os.path.join(output_dir, package_dir)
+        
+        if self.options.config:
+            write_vars = vars.copy()
+            del write_vars['project']
+            del write_vars['package']
+            self.write_vars(self.options.config, write_vars)
 
+    def create_archive(self, dist_name, templates, output_dir, vars):
+        """
+        Creates the project ``dist_name`` as an archive of the --archive
+        format in the output directory: the files are streamed into it as
+        they are rendered, under their path in the output directory.
+        """
+        filename = os.path.join(self.options.output_dir, '%s.%s' % (
+            dist_name, self.options.archive))
+        if self.simulate:
+            fileobj = None
+            self.sink = sinks.MemorySink(self.options.output_dir)
+        else:
+            if not os.path.isdir(self.options.output_dir):
+                os.makedirs(self.options.output_dir)
+            fileobj = open(filename, 'wb')
+            self.sink = sinks.archive_sink(self.options.archive, fileobj,
+                                           self.options.output_dir)
+        try:
+            try:
+                for template in templates:
+                    self.create_template(
+                        template, output_dir, vars)
+                self.sink.close()
+            finally:
+                self.sink = None
+                if fileobj is not None:
+                    fileobj.close()
+        except:
+            if fileobj is not None:
+                os.remove(filename)
+            raise
+        if fileobj is not None:
+            self.notify(events.ARCHIVE_CREATED, filename,
+                        'Created archive %s' % filename)
+
+    def project_vars(self, dist_name, extra_vars):
+        """
+        Returns the output directory of the project ``dist_name`` and its
+        variables, before the templates check them.
+        """
+        output_dir = os.path.join(self.options.output_dir, dist_name)
+
+        pkg_name = self._bad_chars_re.sub('', dist_name.lower())
+        vars = {'project': dist_name,
+                'package': pkg_name,
+                'egg': pluginlib.egg_name(dist_name),
+                }
+        vars.update(extra_vars)
+        if self.options.config and os.path.exists(self.options.config):
+            for key, value in self.read_vars(self.options.config).items():
+                vars.setdefault(key, value)
+        return output_dir, vars
+
+    def check_template_vars(self, templates, vars):
         # First we want to make sure all the templates get a chance to
         # set their variables, all at once, with the most specialized
         # template going first (the last template is the most
         # specialized)...
         for template in templates[::-1]:
-            vars = template.check_vars(vars, self)
+            vars = timing.timed(self.timings, 'check_vars', template.name,
+                                template.check_vars, vars, self)
 
         # Gather all the templates egg_plugins into one var
         egg_plugins = set()
@@ -743,25 +1003,66 @@ class CreateDistroCommand(Command):
         egg_plugins = list(egg_plugins)
         egg_plugins.sort()
         vars['egg_plugins'] = egg_plugins
+        return vars
 
+    def plan_project(self, dist_name, templates, extra_vars):
+        """
+        Returns the ``copydir.PlannedFile`` list of the files that
+        ``create_project`` would write, in order, without writing
+        anything, including the files the hooks of the templates write.
+        """
+        output_dir, vars = self.project_vars(dist_name, extra_vars)
+        vars = self.check_template_vars(templates, vars)
+        self.manifest = GeneratedFiles(output_dir)
+        plan = []
         for template in templates:
-            self.create_template(
-                template, output_dir, vars)
+            plan.extend(template.plan(self, output_dir, vars))
+        return plan
+
+    def write_plan(self, filename, plan):
+        import json
+        content = json.dumps([planned.as_dict() for planned in plan],
+                             indent=2, sort_keys=True)
+        if filename == '-':
+            stream = self.plan_stream or sys.stdout
+            stream.write(content + '\n')
+            stream.flush()
+        else:
+            f = open(filename, 'w')
+            f.write(content + '\n')
+            f.close()
+
+    def bulk_create(self, filename):
+        """
+        Creates all the projects listed in the file ``filename``, in one
+        process, and reports the status and timing of each one.
+        """
+        from templer.core import bulk
+        projects = bulk.read_projects(filename)
+        if not projects:
+            raise BadCommand('No projects found in %s' % filename)
+        shared_vars = self.parse_vars(self.args)
+        default_templates = self.options.templates or ['basic_package']
+        for project in projects:
+            project.vars = dict(shared_vars, **project.vars)
+            if not project.templates:
+                project.templates = default_templates
+        # questions make no sense when generating many projects
+        self.interactive = False
+        start = time.time()
+        results = bulk.run_projects(self, projects,
+                                    concurrency=self.options.concurrency)
+        print bulk.format_results(results, time.time() - start)
+        for result in results:
+            if result.status != 'ok':
+                return 1
+        return 0
 
-        package_dir = vars.get('package_dir', None)
-        if package_dir:
-            output_dir = os.path.join(output_dir, package_dir)
-        
-        if self.options.config:
-            write_vars = vars.copy()
-            del write_vars['project']
-            del write_vars['package']
-            self.write_vars(self.options.config, write_vars)
-        
     def create_template(self, template, output_dir, vars):
-        if self.verbose:
-            print 'Creating template %s' % template.name
-        template.run(self, output_dir, vars)
+        self.notify(events.TEMPLATE, template.name,
+                    'Creating template %s' % template.name)
+        timing.timed(self.timings, 'template', template.name,
+                     template.run, self, output_dir, vars)
 
     ignore_egg_info_files = [
         'top_level.txt',
@@ -778,31 +1079,49 @@ class CreateDistroCommand(Command):
             dist_name, tmpl_name = tmpl_name.split('#', 1)
         else:
             dist_name, tmpl_name = None, tmpl_name
+        dist_name, tmpl_class = self.load_template(dist_name, tmpl_name)
+        tmpl = tmpl_class(tmpl_name)
+        full_name = '%s#%s' % (dist_name, tmpl_name)
+        for item_full_name, item_tmpl in templates:
+            if item_full_name == full_name:
+                # Already loaded
+                return
+        for req_name in tmpl.required_templates:
+            self.extend_templates(templates, req_name)
+        templates.append((full_name, tmpl))
+        
+    def load_template(self, dist_name, tmpl_name):
+        """
+        Returns the name of the distribution providing the template
+        ``tmpl_name`` and the template class.  Templates are only looked up
+        once per command.
+        """
+        if not hasattr(self, '_template_classes'):
+            self._template_classes = {}
+        key = (dist_name, tmpl_name)
+        if key in self._template_classes:
+            return self._template_classes[key]
         if dist_name is None:
             for entry in self.all_entry_points():
                 if entry.name == tmpl_name:
-                    tmpl = entry.load()(entry.name)
+                    tmpl_class = entry.load()
                     dist_name = entry.dist.project_name
                     break
             else:
                 raise LookupError(
                     'Template by name %r not found' % tmpl_name)
         else:
+            import pkg_resources
             dist = pkg_resources.get_distribution(dist_name)
             entry = dist.get_entry_info(
                 'paste.paster_create_template', tmpl_name)
-            tmpl = entry.load()(entry.name)
-        full_name = '%s#%s' % (dist_name, tmpl_name)
-        for item_full_name, item_tmpl in templates:
-            if item_full_name == full_name:
-                # Already loaded
-                return
-        for req_name in tmpl.required_templates:
-            self.extend_templates(templates, req_name)
-        templates.append((full_name, tmpl))
-        
+            tmpl_class = entry.load()
+        self._template_classes[key] = dist_name, tmpl_class
+        return self._template_classes[key]
+
     def all_entry_points(self):
         if not hasattr(self, '_entry_points'):
+            import pkg_resources
             self._entry_points = list(pkg_resources.iter_entry_points(
             'paste.paster_create_template'))
         return self._entry_points
@@ -818,27 +1137,30 @@ class CreateDistroCommand(Command):
         
     def list_templates(self):
         templates = []
+        index = get_index()
         for entry in self.all_entry_points():
             try:
-                templates.append(entry.load()(entry.name))
+                templates.append(index.template_info(entry))
             except Exception, e:
                 # We will not be stopped!
                 print 'Warning: could not load entry point %s (%s: %s)' % (
                     entry.name, e.__class__.__name__, e)
-        max_name = max([len(t.name) for t in templates])
-        templates.sort(lambda a, b: cmp(a.name, b.name))
+        index.save()
+        max_name = max([len(t['name']) for t in templates])
+        templates.sort(lambda a, b: cmp(a['name'], b['name']))
         print 'Available templates:'
         for template in templates:
             # @@: Wrap description
             print '  %s:%s  %s' % (
-                template.name,
-                ' '*(max_name-len(template.name)),
-                template.summary)
+                template['name'],
+                ' '*(max_name-len(template['name'])),
+                template['summary'])
         
     def inspect_files(self, output_dir, templates, vars):
         file_sources = {}
+        filenames = copydir.FilenameSubstituter(vars)
         for template in templates:
-            self._find_files(template, vars, file_sources)
+            self._find_files(template, filenames, file_sources)
         self._show_files(output_dir, file_sources)
         self._show_leftovers(output_dir, file_sources)
 
@@ -849,6 +1171,8 @@ class CreateDistroCommand(Command):
 
     def _find_template_files(self, template, tmpl_dir, vars,
                              file_sources, join=''):
+        if not isinstance(vars, copydir.FilenameSubstituter):
+            vars = copydir.FilenameSubstituter(vars)
         full_dir = os.path.join(tmpl_dir, join)
         for name in os.listdir(full_dir):
             if name.startswith('.'):
@@ -858,9 +1182,7 @@ class CreateDistroCommand(Command):
                     template, tmpl_dir, vars, file_sources,
                     join=os.path.join(join, name))
                 continue
-            partial = os.path.join(join, name)
-            for name, value in vars.items():
-                partial = partial.replace('+%s+' % name, value)
+            partial = vars.substitute_path(os.path.join(join, name))
             if partial.endswith('_tmpl'):
                 partial = partial[:-5]
             file_sources.setdefault(partial, []).append(template)
@@ -0,0 +1,140 @@
+"""
+What happens while a project is created, as a stream of events.
+
+``copy_dir`` and the commands report each directory and file they
+create, skip or overwrite as an ``Event`` sent to an observer, rather
+than printing it.  The ``observer`` of a command (or the one given to
+``copy_dir``) decides what to do with them:
+
+- ``Observer`` ignores them, to stay silent;
+- ``HumanRenderer`` prints the messages the verbosity asks for, as
+  ``templer`` always did, in blocks rather than a line at a time;
+- ``JSONLinesRenderer`` writes every event as a JSON object per line.
+
+The renderers keep what they write until they are flushed: the commands
+flush them before asking a question or printing anything else, and when
+they are done.
+"""
+import sys
+import threading
+import time
+
+DIR_CREATED = 'dir_created'
+DIR_EXISTS = 'dir_exists'
+FILE_CREATED = 'file_created'
+FILE_OVERWRITTEN = 'file_overwritten'
+FILE_UNCHANGED = 'file_unchanged'
+FILE_SKIPPED = 'file_skipped'
+FILE_UPDATED = 'file_updated'
+TEMPLATE = 'template'
+ARCHIVE_CREATED = 'archive_created'
+MESSAGE = 'message'
+WARNING = 'warning'
+TIMINGS = 'timings'
+
+# The number of lines the renderers keep before writing them:
+BUFFER_SIZE = 200
+
+
+class Event(object):
+    """
+    Something that happened to ``path``, of one of the kinds above.
+    ``message`` is what is printed for it (nothing if None) when the
+    verbosity is at least ``level``.  ``seconds`` is the time the file
+    took to render, if it is known, and ``data`` anything else worth
+    reporting (the ``timing.Timings`` of a run, as a dictionary).
+    """
+
+    def __init__(self, kind, path=None, message=None, level=1,
+                 seconds=None, data=None):
+        self.kind = kind
+        self.path = path
+        self.message = message
+        self.level = level
+        self.seconds = seconds
+        self.data = data
+        self.time = time.time()
+
+    def as_dict(self):
+        data = {'event': self.kind, 'time': self.time, 'level': self.level}
+        for name in ('path', 'message', 'seconds', 'data'):
+            value = getattr(self, name)
+            if value is not None:
+                data[name] = value
+        return data
+
+    def __repr__(self):
+        return '<%s %s %s>' % (self.__class__.__name__, self.kind,
+                               self.path)
+
+
+class Observer(object):
+    """Receives the events, and ignores them."""
+
+    def notify(self, event):
+        pass
+
+    def flush(self):
+        pass
+
+
+class BufferedRenderer(Observer):
+    """
+    Base class of the renderers writing lines to ``stream``, the standard
+    output by default (as it is when they are flushed).
+    """
+
+    def __init__(self, stream=None, buffer_size=BUFFER_SIZE):
+        self.stream = stream
+        self.buffer_size = buffer_size
+        self._lines = []
+        self._lock = threading.Lock()
+
+    def notify(self, event):
+        line = self.render(event)
+        if line is None:
+            return
+        self._lock.acquire()
+        try:
+            self._lines.append(line)
+            if len(self._lines) < self.buffer_size:
+                return
+        finally:
+            self._lock.release()
+        self.flush()
+
+    def render(self, event):
+        """Returns the line written for ``event``, None for nothing."""
+        raise NotImplementedError
+
+    def flush(self):
+        self._lock.acquire()
+        try:
+            lines, self._lines = self._lines, []
+        finally:
+            self._lock.release()
+        if lines:
+            stream = self.stream or sys.stdout
+            stream.write(''.join(lines))
+            stream.flush()
+
+
+class HumanRenderer(BufferedRenderer):
+    """Writes the messages of the events up to ``verbosity``."""
+
+    def __init__(self, verbosity=1, stream=None, buffer_size=BUFFER_SIZE):
+        super(HumanRenderer, self).__init__(stream, buffer_size)
+        self.verbosity = verbosity
+
+    def render(self, event):
+        if event.message is None or event.level > self.verbosity:
+            return None
+        return event.message + '\n'
+
+
+class JSONLinesRenderer(BufferedRenderer):
+    """Writes every event as a JSON object on its own line."""
+
+    def render(self, event):
+        import json
+        return json.dumps(event.as_dict(), sort_keys=True) + '\n'
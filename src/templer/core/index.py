@@ -0,0 +1,201 @@
+"""
+Persistent index of the metadata of the installed templates.
+
+Listing the templates (``templer``, ``templer --list``,
+``templer --make-config-file``) needs their summary, category, help and
+variables, which used to mean importing every templer plugin.  This index
+keeps that metadata in a JSON file.  An entry is keyed by the entry point
+and the version and location of its distribution, and stays valid as long
+as the modules defining the class (and its base classes) are not
+modified, which is checked with a ``stat`` of each of them.
+"""
+import os
+import sys
+import threading
+
+from templer.core.utils import atomic_write
+from templer.core.utils import cache_dir
+from templer.core.utils import to_str
+
+# Name of the environment variable pointing to the index file; set it to
+# an empty string to disable the persistent index.
+INDEX_FILE_ENV = 'TEMPLER_INDEX'
+
+INDEX_VERSION = 1
+
+
+def default_index_path():
+    """Returns the path of the index file, or None if it is disabled."""
+    path = os.environ.get(INDEX_FILE_ENV)
+    if path is not None:
+        return path or None
+    return os.path.join(cache_dir(), 'entry_points.json')
+
+
+def class_path(klass):
+    return '%s.%s' % (klass.__module__, klass.__name__)
+
+
+def _class_files(klass):
+    """
+    Returns the ``{filename: mtime}`` of the modules defining ``klass``
+    and its base classes.
+    """
+    files = {}
+    for base in getattr(klass, '__mro__', (klass, )):
+        module = sys.modules.get(base.__module__)
+        filename = getattr(module, '__file__', None)
+        if not filename:
+            continue
+        if filename[-4:] in ('.pyc', '.pyo'):
+            filename = filename[:-1]
+        try:
+            files[filename] = os.stat(filename).st_mtime
+        except OSError:
+            continue
+    return files
+
+
+def describe_template(klass):
+    """
+    Returns the metadata of the template class ``klass`` as a dictionary
+    that can be stored as JSON.
+    """
+    vars = []
+    for var in getattr(klass, 'vars', []):
+        pretty_description = None
+        if hasattr(var, 'pretty_description'):
+            pretty_description = var.pretty_description()
+        vars.append({'name': var.name,
+                     'default': '%s' % (var.default, ),
+                     'pretty_description': pretty_description})
+    return {'summary': klass.summary,
+            'category': getattr(klass, 'category', 'Local Commands'),
+            'help': getattr(klass, 'help', "").strip(),
+            'ndots': getattr(klass, 'ndots', None),
+            'vars': vars,
+            'mro': [class_path(base)
+                    for base in getattr(klass, '__mro__', (klass, ))]}
+
+
+class TemplateInfo(dict):
+    """
+    The description of a template as returned by ``list_sorted_templates``:
+    ``name``, ``summary``, ``category``, ``help``, ``ndots``, ``vars`` and
+    ``entry`` (the entry point).  The template class, ``class``, is only
+    imported when asked for.
+    """
+
+    def __missing__(self, key):
+        if key != 'class':
+            raise KeyError(key)
+        self['class'] = self['entry'].load()
+        return self['class']
+
+
+class EntryPointIndex(object):
+    """Metadata of template entry points, persisted in the file ``path``.
+    """
+
+    def __init__(self, path=None):
+        self.path = path
+        self._entries = None
+        self._dirty = False
+        self._lock = threading.RLock()
+
+    def entry_key(self, entry):
+        dist = entry.dist
+        if dist is None:
+            return str(entry)
+        return '%s [%s %s %s]' % (entry, dist.project_name, dist.version,
+                                  dist.location)
+
+    def _load(self):
+        if self._entries is not None:
+            return self._entries
+        self._entries = {}
+        if self.path and os.path.exists(self.path):
+            import json
+            try:
+                f = open(self.path, 'rb')
+                try:
+                    data = json.load(f)
+                finally:
+                    f.close()
+            except (IOError, ValueError):
+                data = {}
+            if data.get('version') == INDEX_VERSION:
+                self._entries = data.get('entries', {})
+        return self._entries
+
+    def _is_fresh(self, record):
+        for filename, mtime in record['files'].items():
+            try:
+                if os.stat(filename).st_mtime != mtime:
+                    return False
+            except OSError:
+                return False
+        return True
+
+    def describe(self, entry):
+        """
+        Returns the metadata of the template of ``entry``, from the index
+        if it is up to date, else by loading the entry point.
+        """
+        self._lock.acquire()
+        try:
+            entries = self._load()
+            key = self.entry_key(entry)
+            record = entries.get(key)
+            if record is not None and self._is_fresh(record):
+                return to_str(record['meta'])
+            klass = entry.load()
+            meta = describe_template(klass)
+            entries[key] = {'files': _class_files(klass), 'meta': meta}
+            self._dirty = True
+            return meta
+        finally:
+            self._lock.release()
+
+    def template_info(self, entry):
+        """Returns the ``TemplateInfo`` of ``entry``."""
+        info = TemplateInfo(self.describe(entry))
+        info['name'] = entry.name
+        info['entry'] = entry
+        return info
+
+    def save(self):
+        """
+        Writes the index if it changed, dropping the entries whose modules
+        have changed or disappeared since they were indexed.
+        """
+        self._lock.acquire()
+        try:
+            if not self._dirty or not self.path:
+                return
+            for key, record in self._entries.items():
+                if not self._is_fresh(record):
+                    del self._entries[key]
+            import json
+            try:
+                content = json.dumps({'version': INDEX_VERSION,
+                                      'entries': self._entries})
+            except UnicodeDecodeError:
+                # metadata that is not utf-8 cannot be indexed
+                return
+            if atomic_write(self.path, content):
+                self._dirty = False
+        finally:
+            self._lock.release()
+
+
+_default_index = None
+
+
+def get_index():
+    """Return the process wide index, stored in ``default_index_path()``.
+    """
+    global _default_index
+    if _default_index is None:
+        _default_index = EntryPointIndex(default_index_path())
+    return _default_index
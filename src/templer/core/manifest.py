@@ -0,0 +1,286 @@
+"""
+Manifest of the files generated in a project.
+
+To know whether a destination file already has the content about to be
+written, templer used to read it in full.  The manifest records the hash,
+size, inode, modification and change times of every file templer wrote.
+As long as ``os.stat`` still reports all of them, the recorded hash is
+trusted and the file is not read again.
+
+The manifests are kept out of the generated projects, in the user's cache
+directory (``~/.cache/templer/manifests``), under a name made from the
+path of the project.  The ``TEMPLER_MANIFESTS`` environment variable sets
+another directory, or disables the manifests when it is empty.  Saving a
+manifest removes, at most once a day, the manifests of the directories
+that no longer exist.
+
+The manifest also records what the content of each file was made from:
+the hash of its source, the names of the variables it uses and a hash of
+both with the values of the variables.  When none of them changed, the
+file does not even need to be rendered again.
+"""
+import os
+import threading
+import time
+
+from templer.core.utils import atomic_write
+from templer.core.utils import cache_dir
+from templer.core.utils import sha1
+
+MANIFEST_DIR_ENV = 'TEMPLER_MANIFESTS'
+
+MANIFEST_VERSION = 1
+
+# The manifests of removed directories are looked for at most this often,
+# in seconds; the last time is the modification time of PRUNE_STAMP:
+PRUNE_INTERVAL = 24 * 60 * 60
+PRUNE_STAMP = '.pruned'
+
+
+def content_hash(content):
+    """Returns the hash recorded for ``content``."""
+    if isinstance(content, unicode):
+        content = content.encode('utf-8')
+    return sha1(content).hexdigest()
+
+
+def manifest_dir():
+    """Returns the directory of the manifests, or None if disabled."""
+    path = os.environ.get(MANIFEST_DIR_ENV)
+    if path is not None:
+        return path or None
+    return os.path.join(cache_dir(), 'manifests')
+
+
+def manifest_path(root):
+    """
+    Returns the path of the manifest of the project in the directory
+    ``root``, or None if the manifests are disabled.
+    """
+    directory = manifest_dir()
+    if directory is None:
+        return None
+    root = os.path.abspath(root)
+    if isinstance(root, unicode):
+        root = root.encode('utf-8')
+    return os.path.join(directory, sha1(root).hexdigest() + '.json')
+
+
+def prune_manifests(directory=None):
+    """
+    Removes the manifests in ``directory`` (``manifest_dir()`` by default)
+    of the directories that no longer exist, and those that cannot be
+    read.
+    """
+    import json
+    if directory is None:
+        directory = manifest_dir()
+        if directory is None:
+            return
+    try:
+        names = os.listdir(directory)
+    except OSError:
+        return
+    for name in names:
+        if not name.endswith('.json'):
+            continue
+        path = os.path.join(directory, name)
+        try:
+            f = open(path, 'rb')
+            try:
+                root = json.load(f).get('root')
+            finally:
+                f.close()
+        except (IOError, ValueError, AttributeError):
+            root = None
+        if not root or not os.path.isdir(root):
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+
+def _prune_due(directory):
+    """Returns True, once per PRUNE_INTERVAL, if it is time to prune."""
+    stamp = os.path.join(directory, PRUNE_STAMP)
+    try:
+        if time.time() - os.stat(stamp).st_mtime < PRUNE_INTERVAL:
+            return False
+    except OSError:
+        pass
+    try:
+        open(stamp, 'wb').close()
+    except IOError:
+        return False
+    return True
+
+
+class GeneratedFiles(object):
+    """The files generated below the directory ``root``.
+
+    Paths outside of ``root`` can be passed to every method, they are
+    simply never known.  The manifest is read from and saved to ``path``,
+    by default the ``manifest_path`` of ``root``; if it is None nothing
+    is read or saved, the files are only known during the run.
+    """
+
+    def __init__(self, root, path=None):
+        self.root = os.path.abspath(root)
+        if path is None:
+            path = manifest_path(self.root)
+        self.path = path
+        self._files = None
+        self._dirty = False
+        self._lock = threading.RLock()
+
+    def _key(self, path):
+        path = os.path.abspath(path)
+        if not path.startswith(self.root + os.sep):
+            return None
+        return path[len(self.root) + 1:].replace(os.sep, '/')
+
+    def _load(self):
+        if self._files is not None:
+            return self._files
+        self._files = {}
+        if self.path is not None and os.path.exists(self.path):
+            import json
+            try:
+                f = open(self.path, 'rb')
+                try:
+                    data = json.load(f)
+                finally:
+                    f.close()
+            except (IOError, ValueError):
+                data = {}
+            if (data.get('version') == MANIFEST_VERSION
+                    and data.get('root') == self.root):
+                for key, record in data.get('files', {}).items():
+                    self._files[key.encode('utf-8')] = record
+        return self._files
+
+    def known_hash(self, path):
+        """
+        Returns the hash of the content of ``path`` if it was recorded and
+        the file has not changed on disk since, else None.
+        """
+        key = self._key(path)
+        if key is None:
+            return None
+        self._lock.acquire()
+        try:
+            record = self._load().get(key)
+        finally:
+            self._lock.release()
+        if record is None:
+            return None
+        try:
+            st = os.stat(path)
+        except OSError:
+            return None
+        # a file replaced, or written again within the resolution of its
+        # modification time, is told apart by its inode or change time
+        if (st.st_size != record['size'] or st.st_mtime != record['mtime']
+                or st.st_ino != record.get('ino')
+                or st.st_ctime != record.get('ctime')):
+            return None
+        return record['sha1']
+
+    def has_generated_files(self):
+        """
+        Returns True if one of the recorded files is still on disk as it
+        was written: the manifest is not that of another directory since
+        created at the same path.
+        """
+        self._lock.acquire()
+        try:
+            keys = self._load().keys()
+        finally:
+            self._lock.release()
+        for key in keys:
+            path = os.path.join(self.root, *key.split('/'))
+            if self.known_hash(path) is not None:
+                return True
+        return False
+
+    def matches(self, path, content):
+        """
+        Returns True if ``path`` is known to have the content ``content``
+        without reading it.
+        """
+        known = self.known_hash(path)
+        return known is not None and known == content_hash(content)
+
+    def recorded_inputs(self, path):
+        """
+        Returns the inputs recorded for ``path``: a dictionary with the
+        ``source`` hash, the ``deps`` (the names of the variables used, or
+        None if unknown) and their ``hash``; None if nothing is recorded.
+        """
+        key = self._key(path)
+        if key is None:
+            return None
+        self._lock.acquire()
+        try:
+            record = self._load().get(key)
+        finally:
+            self._lock.release()
+        if record is None:
+            return None
+        return record.get('inputs')
+
+    def record(self, path, content, inputs=None):
+        """
+        Records that ``path`` has just been written with ``content``, made
+        from ``inputs`` (see ``recorded_inputs``).
+        """
+        self.record_hash(path, content_hash(content), inputs)
+
+    def record_hash(self, path, digest, inputs=None):
+        """
+        Same as ``record`` for a content known by its hash ``digest``.
+        """
+        key = self._key(path)
+        if key is None:
+            return
+        try:
+            st = os.stat(path)
+        except OSError:
+            return
+        record = {'sha1': digest,
+                  'size': st.st_size,
+                  'mtime': st.st_mtime,
+                  'ino': st.st_ino,
+                  'ctime': st.st_ctime}
+        if inputs is not None:
+            record['inputs'] = inputs
+        self._lock.acquire()
+        try:
+            files = self._load()
+            if files.get(key) != record:
+                files[key] = record
+                self._dirty = True
+        finally:
+            self._lock.release()
+
+    def save(self):
+        """Writes the manifest if anything new was recorded."""
+        self._lock.acquire()
+        try:
+            if (not self._dirty or self.path is None
+                    or not os.path.isdir(self.root)):
+                return
+            import json
+            content = json.dumps({'version': MANIFEST_VERSION,
+                                  'root': self.root,
+                                  'files': self._files},
+                                 indent=1, sort_keys=True)
+            # without a manifest the next run reads the files again
+            if not atomic_write(self.path, content + '\n'):
+                return
+            self._dirty = False
+        finally:
+            self._lock.release()
+        directory = os.path.dirname(self.path)
+        if _prune_due(directory):
+            prune_manifests(directory)
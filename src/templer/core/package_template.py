@@ -1,10 +1,12 @@
 import os
 import copy
 
-from templer.core.base import Template
 from templer.core.base import BaseTemplate
 from templer.core.base import get_var
 from templer.core.base import LICENSE_CATEGORIES
+from templer.core import copydir
+from templer.core import timing
+from templer.core.sinks import FileSystemSink
 from templer.core.vars import DottedVar
 from templer.core.vars import StringVar
 from templer.core.vars import StringChoiceVar
@@ -16,6 +18,9 @@ from templer.core.vars import EXPERT
 lower_licenses = map(lambda x: x.lower(), LICENSE_CATEGORIES.keys())
 LICENSE_DICT = dict(zip(lower_licenses, lower_licenses))
 
+# The content of the __init__.py of the namespace packages:
+NAMESPACE_INIT = "__import__('pkg_resources').declare_namespace(__name__)"
+
 
 class PackageTemplate(BaseTemplate):
     _outer_template_dir = 'templates/outer'
@@ -198,37 +203,93 @@ the safest answer is False.
         super(PackageTemplate, self).pre(command, output_dir, vars)
 
     def post(self, command, output_dir, vars):
-        cwd = os.getcwd()
-        os.chdir(vars['egg'])
-        os.chdir('src')
-        for i in range(len(vars['egg'].split('.'))):
-            segs = vars['egg'].split('.')[0:i+1]
-            try:
-                os.mkdir(os.path.join(*vars['egg'].split('.')[0:i+1]))
-            except OSError:
-                pass
-            segs.append("__init__.py")
-            init = None
-            if i != len(vars['egg'].split('.'))-1:
-                init = open(os.path.join(*segs), "w")
-                bit = "__import__('pkg_resources').declare_namespace(__name__)"
-                init.write(bit)
-            if not init is None:
-                init.close()
-        os.chdir(cwd)
+        # the namespace packages of the egg need an __init__.py declaring
+        # them, written through the sink of the command (to disk, or into
+        # an archive)
+        sink = getattr(command, 'sink', None) or FileSystemSink()
+        src_dir = os.path.join(output_dir, 'src')
+        segs = vars['egg'].split('.')
+        for i in range(len(segs)):
+            if command.simulate:
+                break
+            package_dir = os.path.join(src_dir, *segs[0:i+1])
+            if not sink.exists(package_dir):
+                sink.makedirs(package_dir)
+            if i != len(segs)-1:
+                init = os.path.join(package_dir, "__init__.py")
+                if (sink.getsize(init) != len(NAMESPACE_INIT)
+                        or not sink.same_content(init, NAMESPACE_INIT)):
+                    sink.write(init, NAMESPACE_INIT)
         super(PackageTemplate, self).post(command, output_dir, vars)
 
+    def package_dir(self, output_dir, vars):
+        """Returns the directory of the egg's package in ``output_dir``."""
+        return os.path.join(*([output_dir, 'src'] + vars['egg'].split('.')))
+
     def run(self, command, output_dir, vars):
+        """
+        Writes the outer template to the project directory ``output_dir``
+        and the inner one to the package directory below it.  ``pre`` and
+        ``post`` run once, before and after both, with the project
+        directory (``Template.run`` is not used for each of them).
+        """
+        # only absolute paths, the working directory is shared by all the
+        # threads of the process
+        output_dir = os.path.abspath(output_dir)
+        timings = getattr(command, 'timings', None)
+        timing.timed(timings, 'pre', self.name,
+                     self.pre, command, output_dir, vars)
         self._template_dir = self._outer_template_dir
-        Template.run(self, command, output_dir, vars)
-        output_dir = os.path.join(
-            *([vars['egg'], 'src'] + vars['egg'].split('.')))
+        self.write_files(command, output_dir, vars)
 
         self._template_dir = self._inner_template_dir
         _old_required_structures=self.required_structures
         self.required_structures=[]
-        Template.run(self, command, output_dir, vars)
-        self.required_structures = _old_required_structures
+        try:
+            self.write_files(command, self.package_dir(output_dir, vars),
+                             vars)
+        finally:
+            self.required_structures = _old_required_structures
+        timing.timed(timings, 'post', self.name,
+                     self.post, command, output_dir, vars)
+
+    def plan(self, command, output_dir, vars):
+        output_dir = os.path.abspath(output_dir)
+        # pre only computes the namespace var setup.py_tmpl needs
+        self.pre(command, output_dir, vars)
+        self._template_dir = self._outer_template_dir
+        plan = self.plan_files(command, output_dir, vars)
+
+        self._template_dir = self._inner_template_dir
+        _old_required_structures=self.required_structures
+        self.required_structures=[]
+        try:
+            plan.extend(self.plan_files(
+                command, self.package_dir(output_dir, vars), vars))
+        finally:
+            self.required_structures = _old_required_structures
+        plan.extend(self.plan_extra_files(command, output_dir, vars))
+        return plan
+
+    def plan_extra_files(self, command, output_dir, vars):
+        # the __init__.py of the namespace packages written by post (run
+        # does not update setup.cfg as BaseTemplate.run does)
+        sink = FileSystemSink()
+        plan = []
+        package_dir = os.path.join(output_dir, 'src')
+        for seg in vars['egg'].split('.')[:-1]:
+            package_dir = os.path.join(package_dir, seg)
+            init = os.path.join(package_dir, '__init__.py')
+            if not sink.exists(init):
+                action = 'create'
+            elif (sink.getsize(init) == len(NAMESPACE_INIT)
+                    and sink.same_content(init, NAMESPACE_INIT)):
+                action = 'unchanged'
+            else:
+                action = 'overwrite'
+            plan.append(copydir.PlannedFile(init, None, 'hook', action,
+                                            size=len(NAMESPACE_INIT)))
+        return plan
 
     def check_vars(self, vars, command):
         if not command.options.no_interactive and \
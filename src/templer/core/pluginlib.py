@@ -1,10 +1,10 @@
 # (c) 2005 Ian Bicking and contributors; written for Paste (http://pythonpaste.org)
 # Licensed under the MIT license: http://www.opensource.org/licenses/mit-license.php
 import os
-import pkg_resources
 
 
 def resolve_plugins(plugin_list):
+    import pkg_resources
     found = []
     while plugin_list:
         plugin = plugin_list.pop()
@@ -27,9 +27,11 @@ def resolve_plugins(plugin_list):
     return map(get_distro, found)
 
 def get_distro(spec):
+    import pkg_resources
     return pkg_resources.get_distribution(spec)
 
 def load_commands_from_plugins(plugins):
+    import pkg_resources
     commands = {}
     for plugin in plugins:
         commands.update(pkg_resources.get_entry_map(
@@ -45,6 +47,7 @@ def parse_lines(data):
     return result
 
 def egg_name(dist_name):
+    import pkg_resources
     return pkg_resources.to_filename(pkg_resources.safe_name(dist_name))
 
 def egg_info_dir(base_dir, dist_name):
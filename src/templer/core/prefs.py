@@ -0,0 +1,158 @@
+"""
+The user's preferences: the defaults of the variables set in
+``~/.zopeskel``.
+
+The file is parsed once per process, and again only when its
+modification time or size changes.  What ``check_vars`` needs is
+resolved at the same time: for each section (template), the default of
+each variable with the ``DEFAULT`` section and the interpolations applied,
+so that looking up the defaults of the templates of a project costs a
+``stat`` and a few dictionary lookups::
+
+    from templer.core.prefs import get_preferences
+
+    defaults = get_preferences().layer(['basic_namespace'])
+    author = defaults.get_default('author', 'nobody')
+"""
+import os
+import threading
+from ConfigParser import DEFAULTSECT
+from ConfigParser import Error
+from ConfigParser import SafeConfigParser
+
+## TODO: consider how to replace .zopeskel with .templer
+PREFS_FILENAME = '.zopeskel'
+
+
+_homedir_lookup = None
+
+# The signature of a file that was never read:
+_UNREAD = object()
+
+
+def get_homedir():
+    """Returns the directory of the preferences file."""
+    global _homedir_lookup
+    if _homedir_lookup is None:
+        # http://snipplr.com/view/7354/get-home-directory-path--in-python-win-lin-other/
+        try:
+            from win32com.shell import shellcon, shell
+            _homedir_lookup = lambda: shell.SHGetFolderPath(
+                0, shellcon.CSIDL_APPDATA, 0, 0)
+        except ImportError:
+            # quick semi-nasty fallback for non-windows/win32com case
+            _homedir_lookup = lambda: os.path.expanduser("~")
+    return _homedir_lookup()
+
+
+class Defaults(dict):
+    """The ``{var: default}`` resolved for the templates of a project."""
+
+    def __init__(self, defaults=(), optionxform=str.lower):
+        dict.__init__(self, defaults)
+        self.optionxform = optionxform
+
+    def get_default(self, name, default=None):
+        """
+        Returns the default of the variable ``name``, ``default`` if it is
+        not set.
+        """
+        value = self.get(self.optionxform(name), default)
+        if isinstance(value, Error):
+            raise value
+        return value
+
+
+class Preferences(object):
+    """The preferences read from the file at ``path``, if it exists."""
+
+    def __init__(self, path):
+        self.path = path
+        self._signature = _UNREAD
+        self._config = SafeConfigParser()
+        self._sections = {}
+        self._layers = {}
+        self._lock = threading.Lock()
+
+    def _refresh(self):
+        """Parses the file again if it changed since it was last read."""
+        try:
+            stat = os.stat(self.path)
+            signature = stat.st_mtime, stat.st_size
+        except OSError:
+            signature = None
+        if signature == self._signature:
+            return
+        self._lock.acquire()
+        try:
+            if signature == self._signature:
+                return
+            config = SafeConfigParser()
+            if signature is not None:
+                config.read(self.path)
+            sections = {}
+            for section in [DEFAULTSECT] + config.sections():
+                sections[section] = resolved = {}
+                if section == DEFAULTSECT:
+                    options = config.defaults().keys()
+                else:
+                    options = config.options(section)
+                for option in options:
+                    # a value that cannot be interpolated only fails the
+                    # templates using it, as it did when they read it
+                    try:
+                        resolved[option] = config.get(section, option)
+                    except Error, e:
+                        resolved[option] = e
+            self._config = config
+            self._sections = sections
+            self._layers = {}
+            self._signature = signature
+        finally:
+            self._lock.release()
+
+    def get_config(self):
+        """Returns the ``SafeConfigParser`` of the file, shared by all."""
+        self._refresh()
+        return self._config
+
+    def layer(self, templates):
+        """
+        Returns the ``Defaults`` of the templates ``templates``: the
+        defaults of the first of them having a section, or the ``DEFAULT``
+        section for the variables none of them sets.
+        """
+        self._refresh()
+        key = tuple(templates)
+        layer = self._layers.get(key)
+        if layer is None:
+            layer = Defaults(self._sections.get(DEFAULTSECT, {}),
+                             self._config.optionxform)
+            for template in reversed(key):
+                if template != DEFAULTSECT:
+                    layer.update(self._sections.get(template, {}))
+            self._layers[key] = layer
+        return layer
+
+    def default(self, templates, name, default=None):
+        """
+        Returns the default of the variable ``name`` for the templates
+        ``templates``, ``default`` if they do not set it.
+        """
+        return self.layer(templates).get_default(name, default)
+
+
+_preferences = {}
+
+
+def get_preferences(path=None):
+    """
+    Returns the process wide ``Preferences`` of the file at ``path``,
+    ``~/.zopeskel`` by default.
+    """
+    if path is None:
+        path = os.path.join(get_homedir(), PREFS_FILENAME)
+    prefs = _preferences.get(path)
+    if prefs is None:
+        prefs = _preferences.setdefault(path, Preferences(path))
+    return prefs
@@ -0,0 +1,97 @@
+"""
+Snapshots of the package resource trees used as template directories.
+
+A template or structure directory given as a ``(package, path)`` tuple
+is read through ``pkg_resources``, and for a zipped egg every call goes
+back through the zip metadata.  The first time a package is used its
+resource tree is enumerated once: the listing and directory flags of
+every entry, and the contents of the files read, are kept for the
+lifetime of the process.
+"""
+import threading
+
+from cStringIO import StringIO
+
+# Contents larger than this are streamed from pkg_resources every time
+# rather than kept in memory:
+MAX_CACHED_SIZE = 1024 * 1024
+
+
+class ResourceTree(object):
+    """The resources of ``package`` (a module name or a requirement)."""
+
+    def __init__(self, package):
+        self.package = package
+        self._listings = {}
+        self._isdir = {}
+        self._contents = {}
+        self._lock = threading.RLock()
+
+    def _snapshot(self, path):
+        import pkg_resources
+        names = pkg_resources.resource_listdir(self.package, path)
+        names.sort()
+        self._listings[path] = names
+        for name in names:
+            full = '/'.join([path, name])
+            isdir = pkg_resources.resource_isdir(self.package, full)
+            self._isdir[full] = isdir
+            if isdir:
+                self._snapshot(full)
+
+    def listdir(self, path):
+        """Returns the sorted names in the resource directory ``path``."""
+        self._lock.acquire()
+        try:
+            if path not in self._listings:
+                self._snapshot(path)
+            return list(self._listings[path])
+        finally:
+            self._lock.release()
+
+    def isdir(self, path):
+        """Returns True if the resource ``path`` is a directory."""
+        self._lock.acquire()
+        try:
+            if path not in self._isdir and '/' in path:
+                self.listdir(path.rsplit('/', 1)[0])
+            if path in self._isdir:
+                return self._isdir[path]
+        finally:
+            self._lock.release()
+        import pkg_resources
+        return pkg_resources.resource_isdir(self.package, path)
+
+    def read(self, path):
+        """Returns the content of the resource ``path``."""
+        content = self._contents.get(path)
+        if content is None:
+            import pkg_resources
+            content = pkg_resources.resource_string(self.package, path)
+            if len(content) <= MAX_CACHED_SIZE:
+                self._contents[path] = content
+        return content
+
+    def open(self, path):
+        """Returns a file object reading the resource ``path``."""
+        content = self._contents.get(path)
+        if content is not None:
+            return StringIO(content)
+        import pkg_resources
+        return pkg_resources.resource_stream(self.package, path)
+
+
+_trees = {}
+_trees_lock = threading.Lock()
+
+
+def get_resource_tree(package):
+    """Returns the process wide ``ResourceTree`` of ``package``."""
+    _trees_lock.acquire()
+    try:
+        tree = _trees.get(package)
+        if tree is None:
+            tree = _trees[package] = ResourceTree(package)
+        return tree
+    finally:
+        _trees_lock.release()
@@ -0,0 +1,314 @@
+"""
+A long running generation server: ``templer serve``.
+
+Every ``templer`` run imports Cheetah and pkg_resources, scans the entry
+points, loads the template classes and compiles the templates again.
+The server does it once and then creates projects on request, several
+at once, with an ``api.Generator``.  It listens on the local interface
+by default and speaks JSON over HTTP:
+
+``POST /generate``
+    The body is a JSON object::
+
+        {"templates": ["basic_namespace"], "project": "my.package",
+         "vars": {"author": "Joe"}, "archive": "zip"}
+
+    The project is returned as an archive, ``tar.gz`` unless ``archive``
+    says otherwise.  With ``"output_dir": "DIR"`` instead, the project is
+    written below ``DIR``, which must be inside the output root of the
+    server, and a JSON description of it is returned.
+
+``GET /templates``
+    The JSON list of the names of the templates installed.
+
+``GET /stats``
+    The number of requests served, failed, and their latency.
+
+Every response to ``/generate`` tells how long the generation took in its
+``X-Templer-Seconds`` header.  Errors are returned as ``{"error": ...}``
+with a 400 status (404 for an unknown template).
+"""
+import BaseHTTPServer
+import SocketServer
+import optparse
+import os
+import threading
+import time
+from cStringIO import StringIO
+
+from templer.core import sinks
+from templer.core.api import Generator
+from templer.core.create import BadCommand
+from templer.core.utils import to_str
+
+DEFAULT_HOST = '127.0.0.1'
+DEFAULT_PORT = 8765
+
+# Requests with a larger body are refused:
+MAX_REQUEST_SIZE = 1024 * 1024
+
+# The number of recent requests whose latency /stats returns:
+RECENT_REQUESTS = 100
+
+CONTENT_TYPES = {'tar.gz': 'application/x-gzip',
+                 'zip': 'application/zip'}
+
+
+class RequestError(Exception):
+    """A request that cannot be served, and its HTTP status."""
+
+    def __init__(self, message, status=400):
+        Exception.__init__(self, message)
+        self.status = status
+
+
+class GenerationStats(object):
+    """The number and latency of the generation requests served."""
+
+    def __init__(self):
+        self.requests = 0
+        self.errors = 0
+        self.seconds = 0.0
+        self.recent = []
+        self._lock = threading.Lock()
+
+    def add(self, project, status, seconds):
+        self._lock.acquire()
+        try:
+            self.requests += 1
+            if status != 200:
+                self.errors += 1
+            self.seconds += seconds
+            self.recent.append({'project': project, 'status': status,
+                                'seconds': round(seconds, 6)})
+            del self.recent[:-RECENT_REQUESTS]
+        finally:
+            self._lock.release()
+
+    def as_dict(self):
+        self._lock.acquire()
+        try:
+            average = self.requests and self.seconds / self.requests or 0.0
+            return {'requests': self.requests,
+                    'errors': self.errors,
+                    'average_seconds': round(average, 6),
+                    'recent': list(self.recent)}
+        finally:
+            self._lock.release()
+
+
+class GenerationServer(SocketServer.ThreadingMixIn,
+                       BaseHTTPServer.HTTPServer):
+    """
+    Serves generation requests, each in its own thread, with a shared
+    ``Generator``.  Projects are only written below ``output_root``.
+    """
+
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, address, generator=None, output_root=None,
+                 quiet=False):
+        BaseHTTPServer.HTTPServer.__init__(self, address,
+                                           GenerationHandler)
+        self.generator = generator or Generator()
+        self.output_root = os.path.abspath(output_root or os.curdir)
+        self.quiet = quiet
+        self.stats = GenerationStats()
+        self.template_names = self.generator.load_templates()
+
+    def output_dir(self, path):
+        """
+        Returns the absolute output directory ``path`` of a request, or
+        raises a ``RequestError`` if it is not below the output root.
+        """
+        path = os.path.abspath(os.path.join(self.output_root, path))
+        root = self.output_root.rstrip(os.sep)
+        if path != root and not path.startswith(root + os.sep):
+            raise RequestError('%s is not below %s' % (path, root), 403)
+        return path
+
+    def project_name(self, project, output_dir):
+        """
+        Returns the ``project`` name of a request, or raises a
+        ``RequestError`` if it is not a plain name, or if the project
+        would not be created below the output root.
+        """
+        project = to_str(project)
+        separators = [sep for sep in (os.sep, os.altsep, '/') if sep]
+        if ([sep for sep in separators if sep in project]
+                or '..' in project or project == os.curdir):
+            raise RequestError('Invalid project name %r' % project)
+        path = os.path.realpath(os.path.join(output_dir, project))
+        root = os.path.realpath(self.output_root).rstrip(os.sep)
+        if not path.startswith(root + os.sep):
+            raise RequestError('%s is not below %s' % (path, root))
+        return project
+
+    def generate(self, request):
+        """
+        Creates the project described by the ``request`` dictionary and
+        returns the body, content type and headers of the response.
+        """
+        templates = request.get('templates') or ['basic_package']
+        if isinstance(templates, basestring):
+            templates = [templates]
+        templates = [to_str(name) for name in templates]
+        project = request.get('project')
+        if not project or not isinstance(project, basestring):
+            raise RequestError('The request must give a "project" name')
+        vars = dict([(to_str(k), to_str(v))
+                     for k, v in (request.get('vars') or {}).items()])
+
+        if request.get('output_dir'):
+            output_dir = self.output_dir(to_str(request['output_dir']))
+            project = self.project_name(project, output_dir)
+            result = self.generator.generate(templates, project, vars,
+                                             output=output_dir)
+            body = dumps({'project': result.project,
+                          'output_dir': result.output_dir,
+                          'templates': result.templates,
+                          'files': result.files,
+                          'seconds': round(result.seconds, 6)})
+            return body, 'application/json', {
+                'X-Templer-Files': str(len(result.files))}
+
+        format = request.get('archive') or 'tar.gz'
+        if format not in sinks.ARCHIVE_FORMATS:
+            raise RequestError('Unknown archive format %r (use one of %s)'
+                               % (format, ', '.join(sinks.ARCHIVE_FORMATS)))
+        project = self.project_name(project, self.output_root)
+        fileobj = StringIO()
+        # nothing is written below the root, it only prefixes the names
+        sink = sinks.archive_sink(format, fileobj, self.output_root)
+        result = self.generator.generate(templates, project, vars,
+                                         output=sink)
+        sink.close()
+        return fileobj.getvalue(), CONTENT_TYPES[format], {
+            'Content-Disposition':
+                'attachment; filename="%s.%s"' % (project, format),
+            'X-Templer-Files': str(len(result.files))}
+
+
+class GenerationHandler(BaseHTTPServer.BaseHTTPRequestHandler):
+
+    server_version = 'templer'
+
+    def do_GET(self):
+        if self.path == '/templates':
+            self.respond(200, dumps(self.server.template_names))
+        elif self.path == '/stats':
+            self.respond(200, dumps(self.server.stats.as_dict()))
+        else:
+            self.respond(404, dumps({'error': 'Not found: %s' % self.path}))
+
+    def do_POST(self):
+        if self.path != '/generate':
+            self.respond(404, dumps({'error': 'Not found: %s' % self.path}))
+            return
+        start = time.time()
+        project = None
+        try:
+            request = self.read_request()
+            project = request.get('project')
+            body, content_type, headers = self.server.generate(request)
+            status = 200
+        except RequestError, e:
+            status, body = e.status, dumps({'error': str(e)})
+        except LookupError, e:
+            status, body = 404, dumps({'error': str(e)})
+        except Exception, e:
+            status, body = 400, dumps({
+                'error': '%s: %s' % (e.__class__.__name__,
+                                     ' '.join(str(e).split()))})
+        if status != 200:
+            content_type, headers = 'application/json', {}
+        seconds = time.time() - start
+        self.server.stats.add(project, status, seconds)
+        headers['X-Templer-Seconds'] = '%.6f' % seconds
+        self.respond(status, body, content_type, headers)
+
+    def read_request(self):
+        import json
+        try:
+            length = int(self.headers.get('Content-Length', 0))
+        except ValueError:
+            raise RequestError('Invalid Content-Length')
+        if length > MAX_REQUEST_SIZE:
+            raise RequestError('Request too large', 413)
+        try:
+            request = json.loads(self.rfile.read(length) or '{}')
+        except ValueError, e:
+            raise RequestError('Invalid JSON: %s' % e)
+        if not isinstance(request, dict):
+            raise RequestError('The request must be a JSON object')
+        return request
+
+    def respond(self, status, body, content_type='application/json',
+                headers={}):
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_request(self, code='-', size='-'):
+        if not self.server.quiet:
+            BaseHTTPServer.BaseHTTPRequestHandler.log_request(
+                self, code, size)
+
+
+def dumps(data):
+    import json
+    return json.dumps(data, sort_keys=True) + '\n'
+
+
+parser = optparse.OptionParser(
+    usage='%prog serve [options]',
+    description='Serve generation requests over HTTP, keeping the '
+                'templates loaded between projects.')
+parser.add_option('--host', dest='host', default=DEFAULT_HOST,
+                  help="Listen on HOST (default %s)" % DEFAULT_HOST)
+parser.add_option('-p', '--port', dest='port', type='int',
+                  default=DEFAULT_PORT,
+                  help="Listen on PORT (default %d)" % DEFAULT_PORT)
+parser.add_option('--output-root', dest='output_root', metavar='DIR',
+                  default=os.curdir,
+                  help="Only write projects below DIR (default the "
+                       "current directory)")
+parser.add_option('-j', '--jobs', dest='jobs', metavar='N', type='int',
+                  default=1,
+                  help="Render the files of each project using N threads")
+parser.add_option('--template-cache', dest='template_cache', metavar='DIR',
+                  help="Keep compiled Cheetah templates in DIR")
+parser.add_option('-q', '--quiet', dest='quiet', action='store_true',
+                  help="Do not log the requests")
+
+
+def serve(args):
+    """Runs the generation server configured by the arguments ``args``."""
+    options, args = parser.parse_args(args)
+    if args:
+        raise BadCommand('Unexpected arguments: %s' % ' '.join(args))
+    template_cache = None
+    if options.template_cache:
+        from templer.core import cheetah_cache
+        template_cache = cheetah_cache.CompiledTemplateCache(
+            cache_dir=options.template_cache)
+    server = GenerationServer(
+        (options.host, options.port),
+        Generator(jobs=options.jobs, template_cache=template_cache),
+        output_root=options.output_root, quiet=options.quiet)
+    host, port = server.server_address[:2]
+    print 'Serving %d templates on http://%s:%d/ (output root %s)' % (
+        len(server.template_names), host, port, server.output_root)
+    try:
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+    finally:
+        server.server_close()
+    return 0
@@ -0,0 +1,347 @@
+"""
+Output sinks: where ``copy_dir`` and the templates write what they
+generate.
+
+A sink receives the destination paths computed by ``copy_dir`` and the
+content of every file, either a string or a ``copydir.SourceFile`` (a file
+copied as it is, read in chunks).  ``FileSystemSink``, the default, writes
+them to disk.  ``MemorySink`` keeps them in a dictionary, ``TarSink`` and
+``ZipSink`` stream them into an archive, so that a project can be
+generated without going through the disk at all.
+"""
+import binascii
+import os
+import stat
+import sys
+import time
+
+from cStringIO import StringIO
+
+from templer.core.manifest import content_hash
+
+DEFAULT_FILE_MODE = 0644
+DEFAULT_DIR_MODE = 0755
+
+# Rendered contents up to this size are kept by the archive sinks, so that
+# files like setup.cfg can be read back and updated:
+MAX_READABLE_SIZE = 64 * 1024
+
+# The archive formats of archive_sink:
+ARCHIVE_FORMATS = ('tar.gz', 'zip')
+
+
+def content_string(content):
+    """Returns ``content`` as a string, reading it if it is a file."""
+    if not isinstance(content, basestring):
+        return content.read()
+    return content
+
+
+class FileSystemSink(object):
+    """Writes the files to disk, at their destination paths."""
+
+    # files may be written from several threads at once
+    threadsafe = True
+
+    def exists(self, path):
+        return os.path.exists(path)
+
+    def makedirs(self, path):
+        os.makedirs(path)
+
+    def getsize(self, path):
+        """Returns the size of the file ``path``, None if it is missing."""
+        try:
+            return os.stat(path).st_size
+        except OSError:
+            return None
+
+    def read(self, path):
+        f = open(path, 'rb')
+        try:
+            return f.read()
+        finally:
+            f.close()
+
+    def same_content(self, path, content):
+        """Returns True if the existing file ``path`` has ``content``."""
+        if not isinstance(content, basestring):
+            return content.same_as(path)
+        return self.read(path) == content
+
+    def write(self, path, content, mode=None):
+        """
+        Writes ``content`` to ``path`` through a temporary file in the same
+        directory, renamed into place once complete: an interrupted run
+        never leaves a truncated file.  An existing file keeps its
+        permissions unless ``mode`` is given.
+
+        A symbolic link, or a file with other hard links, is written in
+        place instead: renaming would replace the link by a plain file,
+        leaving its target with the old content.
+        """
+        try:
+            st = os.lstat(path)
+        except OSError:
+            pass
+        else:
+            if stat.S_ISLNK(st.st_mode) or st.st_nlink > 1:
+                self._write_in_place(path, content, mode)
+                return
+        dirname, basename = os.path.split(path)
+        tmp_path = os.path.join(dirname, '.%s.%s.tmp' % (
+            basename, binascii.hexlify(os.urandom(4))))
+        fd = os.open(tmp_path,
+                     os.O_WRONLY | os.O_CREAT | os.O_EXCL
+                     | getattr(os, 'O_BINARY', 0),
+                     0666)
+        try:
+            f = os.fdopen(fd, 'wb')
+            try:
+                if isinstance(content, basestring):
+                    f.write(content)
+                else:
+                    content.write_to(f)
+            finally:
+                f.close()
+            try:
+                existing_mode = stat.S_IMODE(os.stat(path).st_mode)
+            except OSError:
+                existing_mode = None
+            else:
+                if sys.platform == 'win32':
+                    # rename does not replace existing files on Windows
+                    os.remove(path)
+            if mode is not None:
+                os.chmod(tmp_path, mode)
+            elif existing_mode is not None:
+                os.chmod(tmp_path, existing_mode)
+            os.rename(tmp_path, path)
+        except:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+    def _write_in_place(self, path, content, mode=None):
+        f = open(path, 'wb')
+        try:
+            if isinstance(content, basestring):
+                f.write(content)
+            else:
+                content.write_to(f)
+        finally:
+            f.close()
+        if mode is not None:
+            os.chmod(path, mode)
+
+    def close(self):
+        pass
+
+
+class ArchiveSink(object):
+    """
+    Base class of the sinks collecting the files below the directory
+    ``root`` under their relative, ``/`` separated names.  Files are
+    compared with what was written before by hash; only the rendered
+    contents smaller than ``MAX_READABLE_SIZE`` can be read back.  A file
+    written again is added again, later entries replace earlier ones when
+    the archive is extracted.
+    """
+
+    # files are added in the order copy_dir writes them
+    threadsafe = False
+
+    def __init__(self, root=None):
+        self.root = os.path.abspath(root or os.curdir)
+        self._dirs = set([''])
+        self._files = {}
+        self._contents = {}
+
+    def name(self, path):
+        """Returns the name of ``path`` in the sink."""
+        path = os.path.abspath(path)
+        if path == self.root:
+            return ''
+        if not path.startswith(self.root.rstrip(os.sep) + os.sep):
+            raise ValueError('%s is not below %s' % (path, self.root))
+        return path[len(self.root.rstrip(os.sep)) + 1:].replace(os.sep, '/')
+
+    def exists(self, path):
+        name = self.name(path)
+        return name in self._dirs or name in self._files
+
+    def makedirs(self, path):
+        self._makedirs(self.name(path))
+
+    def _makedirs(self, name):
+        if name in self._dirs:
+            return
+        if '/' in name:
+            self._makedirs(name.rsplit('/', 1)[0])
+        self._dirs.add(name)
+        self.add_dir(name)
+
+    def getsize(self, path):
+        record = self._files.get(self.name(path))
+        if record is None:
+            return None
+        return record[0]
+
+    def read(self, path):
+        try:
+            return self._contents[self.name(path)]
+        except KeyError:
+            raise IOError('%s cannot be read back from %s' % (
+                path, self.__class__.__name__))
+
+    def same_content(self, path, content):
+        record = self._files.get(self.name(path))
+        if record is None:
+            return False
+        if not isinstance(content, basestring):
+            content = content.sha1
+        else:
+            content = content_hash(content)
+        written = record[1]
+        if not isinstance(written, basestring):
+            written = written.sha1
+        return written == content
+
+    def write(self, path, content, mode=None):
+        name = self.name(path)
+        if '/' in name:
+            self._makedirs(name.rsplit('/', 1)[0])
+        if mode is None:
+            mode = DEFAULT_FILE_MODE
+        self.add_file(name, content, mode)
+        self._contents.pop(name, None)
+        if isinstance(content, basestring):
+            # a hash is enough to compare, do not keep large contents
+            self._files[name] = (len(content), content_hash(content))
+            if len(content) <= MAX_READABLE_SIZE:
+                self._contents[name] = content
+        else:
+            self._files[name] = (len(content), content)
+
+    def filenames(self):
+        """Returns the sorted names of the files written."""
+        return sorted(self._files)
+
+    def add_dir(self, name):
+        """Adds the directory ``name`` to the archive."""
+        raise NotImplementedError
+
+    def add_file(self, name, content, mode):
+        """Adds the file ``name`` with ``content`` and ``mode``."""
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+
+class MemorySink(ArchiveSink):
+    """
+    Keeps the files in the dictionary ``files``, by name, and their
+    permissions in ``modes``.
+    """
+
+    def __init__(self, root=None):
+        super(MemorySink, self).__init__(root)
+        self.files = {}
+        self.modes = {}
+
+    def add_dir(self, name):
+        pass
+
+    def add_file(self, name, content, mode):
+        self.files[name] = content_string(content)
+        self.modes[name] = mode
+
+    def read(self, path):
+        try:
+            return self.files[self.name(path)]
+        except KeyError:
+            raise IOError('No such file: %s' % path)
+
+
+class TarSink(ArchiveSink):
+    """
+    Streams the files into a tar archive written to ``fileobj``, which
+    does not need to be seekable.  ``compression`` is ``gz``, ``bz2`` or
+    an empty string.
+    """
+
+    def __init__(self, fileobj, root=None, compression='gz'):
+        import tarfile
+        super(TarSink, self).__init__(root)
+        self.tar = tarfile.open(fileobj=fileobj, mode='w|' + compression)
+        self.mtime = time.time()
+
+    def add_dir(self, name):
+        import tarfile
+        info = tarfile.TarInfo(name)
+        info.type = tarfile.DIRTYPE
+        info.mode = DEFAULT_DIR_MODE
+        info.mtime = self.mtime
+        self.tar.addfile(info)
+
+    def add_file(self, name, content, mode):
+        import tarfile
+        info = tarfile.TarInfo(name)
+        info.size = len(content)
+        info.mode = mode
+        info.mtime = self.mtime
+        if isinstance(content, basestring):
+            f = StringIO(content)
+        else:
+            f = content.open()
+        try:
+            self.tar.addfile(info, f)
+        finally:
+            f.close()
+
+    def close(self):
+        self.tar.close()
+
+
+class ZipSink(ArchiveSink):
+    """
+    Writes the files into a zip archive written to ``fileobj``, which must
+    be seekable.  Each file goes through memory on its own.
+    """
+
+    def __init__(self, fileobj, root=None):
+        import zipfile
+        super(ZipSink, self).__init__(root)
+        self.zip = zipfile.ZipFile(fileobj, 'w', zipfile.ZIP_DEFLATED)
+        self.date_time = time.localtime()[:6]
+
+    def add_dir(self, name):
+        import zipfile
+        info = zipfile.ZipInfo(name + '/', self.date_time)
+        # MS-DOS directory flag, and the unix mode in the high bits
+        info.external_attr = (stat.S_IFDIR | DEFAULT_DIR_MODE) << 16 | 0x10
+        self.zip.writestr(info, '')
+
+    def add_file(self, name, content, mode):
+        import zipfile
+        info = zipfile.ZipInfo(name, self.date_time)
+        info.external_attr = (stat.S_IFREG | mode) << 16
+        info.compress_type = zipfile.ZIP_DEFLATED
+        self.zip.writestr(info, content_string(content))
+
+    def close(self):
+        self.zip.close()
+
+
+def archive_sink(format, fileobj, root=None):
+    """
+    Returns the sink writing an archive of one of the ``ARCHIVE_FORMATS``
+    to ``fileobj``.
+    """
+    if format == 'tar.gz':
+        return TarSink(fileobj, root, compression='gz')
+    elif format == 'zip':
+        return ZipSink(fileobj, root)
+    raise ValueError('Unknown archive format %r (use one of %s)' % (
+        format, ', '.join(ARCHIVE_FORMATS)))
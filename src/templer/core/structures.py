@@ -2,6 +2,8 @@ import sys
 import os
 
 from templer.core import copydir
+from templer.core import events
+from templer.core.sinks import FileSystemSink
 
 
 class Structure(object):
@@ -27,11 +29,13 @@ class Structure(object):
 
     def write_files(self, command, output_dir, vars):
         structure_dirs = self.structure_dir()
+        sink = getattr(command, 'sink', None) or FileSystemSink()
         if len(structure_dirs) > 0:
-            if not os.path.exists(output_dir):
-                print "Creating directory %s" % output_dir
+            if not sink.exists(output_dir):
+                command.notify(events.DIR_CREATED, output_dir,
+                               "Creating directory %s" % output_dir, 0)
                 if not command.simulate:
-                    os.makedirs(output_dir)
+                    sink.makedirs(output_dir)
             for structure_dir in structure_dirs:
                 copydir.copy_dir(structure_dir, output_dir,
                                  vars,
@@ -41,7 +45,33 @@ class Structure(object):
                                  overwrite=command.options.overwrite,
                                  indent=1,
                                  use_cheetah=self.use_cheetah,
-                                 template_renderer=self.template_renderer)
+                                 template_renderer=self.template_renderer,
+                                 template_cache=getattr(
+                                     command, 'template_cache', None),
+                                 jobs=getattr(command.options, 'jobs', 1),
+                                 manifest=getattr(command, 'manifest', None),
+                                 sink=sink,
+                                 context=getattr(command, 'copy_context',
+                                                 None),
+                                 timings=getattr(command, 'timings', None),
+                                 observer=getattr(command, 'observer', None))
+
+    def plan_files(self, command, output_dir, vars):
+        """
+        Returns the ``copydir.PlannedFile`` list of what ``write_files``
+        would do.
+        """
+        plan = []
+        for structure_dir in self.structure_dir():
+            plan.extend(copydir.plan_copy(
+                structure_dir, output_dir, vars,
+                overwrite=command.options.overwrite,
+                use_cheetah=self.use_cheetah,
+                template_renderer=self.template_renderer,
+                template_cache=getattr(command, 'template_cache', None),
+                jobs=getattr(command.options, 'jobs', 1),
+                manifest=getattr(command, 'manifest', None)))
+        return plan
 
 
 class EggDocsStructure(Structure):
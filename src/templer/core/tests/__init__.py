@@ -1 +1,44 @@
 # package
+import os
+import shutil
+import tempfile
+
+from templer.core import index
+from templer.core import manifest
+
+_index_dir = None
+_old_index_path = None
+_old_manifest_dir = None
+
+
+def setup():
+    """Keep the template index and the manifests of the tests out of the
+    home directory.
+
+    Most tests go through ``index.get_index()`` one way or another (the
+    template listings, the create command), and every project they
+    generate saves a manifest: this package fixture points both to a
+    temporary directory for the whole run.
+    """
+    global _index_dir, _old_index_path, _old_manifest_dir
+    _index_dir = tempfile.mkdtemp()
+    _old_index_path = os.environ.get(index.INDEX_FILE_ENV)
+    os.environ[index.INDEX_FILE_ENV] = os.path.join(_index_dir,
+                                                    'entry_points.json')
+    index._default_index = None
+    _old_manifest_dir = os.environ.get(manifest.MANIFEST_DIR_ENV)
+    os.environ[manifest.MANIFEST_DIR_ENV] = os.path.join(_index_dir,
+                                                         'manifests')
+
+
+def teardown():
+    if _old_index_path is None:
+        os.environ.pop(index.INDEX_FILE_ENV, None)
+    else:
+        os.environ[index.INDEX_FILE_ENV] = _old_index_path
+    index._default_index = None
+    if _old_manifest_dir is None:
+        os.environ.pop(manifest.MANIFEST_DIR_ENV, None)
+    else:
+        os.environ[manifest.MANIFEST_DIR_ENV] = _old_manifest_dir
+    shutil.rmtree(_index_dir, ignore_errors=True)
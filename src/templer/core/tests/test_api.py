@@ -0,0 +1,87 @@
+# -*- coding: utf-8 -*-
+
+import unittest2 as unittest
+
+import os
+import shutil
+import tempfile
+
+from templer.core import api
+from templer.core import sinks
+from templer.core.tests.test_copydir import read_tree
+from templer.core.tests.test_script import capture_stdout
+from templer.core.vars import ValidationException
+
+
+VARS = {'expert_mode': 'all', 'author': 'Joe'}
+
+
+class TestGenerator(unittest.TestCase):
+    """ verify that projects can be generated without the command line
+    """
+
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir, ignore_errors=True)
+
+    def test_generate(self):
+        generate = capture_stdout(api.generate)
+        output = generate(['basic_namespace'], 'my.package', VARS,
+                          output=self.temp_dir)
+        self.assertEqual(output, '')
+
+        result = api.generate('basic_namespace', 'my.other', VARS,
+                              output=self.temp_dir)
+        project_dir = os.path.join(self.temp_dir, 'my.other')
+        self.assertEqual(result.output_dir, project_dir)
+        self.assertEqual(result.templates, ['templer.core#basic_namespace'])
+        self.assertEqual(result.vars['author'], 'Joe')
+        self.assertEqual(result.vars['namespace_package'], 'my')
+        self.assertTrue('my.other/setup.py' in result.files)
+        self.assertEqual(
+            sorted(['my.other/' + name.replace(os.sep, '/')
+                    for name in read_tree(project_dir)]),
+            sorted(result.files))
+
+    def test_reuse(self):
+        generator = api.Generator()
+        first = generator.generate(['nested_namespace'], 'a.b.c', VARS,
+                                   output=self.temp_dir)
+        classes = dict(generator._template_classes)
+        second = generator.generate(['nested_namespace'], 'd.e.f', VARS,
+                                    output=self.temp_dir)
+        self.assertEqual(generator._template_classes, classes)
+        self.assertEqual(second.vars['namespace_package2'], 'e')
+        self.assertEqual(len(first.files), len(second.files))
+
+        # a second run only writes what changed
+        again = generator.generate(['nested_namespace'], 'a.b.c', VARS,
+                                   output=self.temp_dir)
+        self.assertEqual(again.files, [])
+
+    def test_sink(self):
+        sink = sinks.MemorySink(self.temp_dir)
+        result = api.Generator(jobs=2).generate(
+            ['basic_namespace'], 'my.package', VARS, output=sink)
+        self.assertEqual(result.files, sorted(sink.files))
+        self.assertTrue('my.package/setup.py' in sink.files)
+        self.assertEqual(os.listdir(self.temp_dir), [])
+
+    def test_errors(self):
+        self.assertRaises(LookupError, api.generate, ['no_such_template'],
+                          'my.package', output=self.temp_dir)
+        self.assertRaises(ValidationException, api.generate,
+                          ['basic_namespace'], 'my.package',
+                          dict(VARS, license_name='nope'),
+                          output=self.temp_dir)
+
+
+def test_suite():
+    suite = unittest.TestSuite([
+        unittest.makeSuite(TestGenerator), ])
+    return suite
+
+if __name__ == '__main__':
+    unittest.main(defaultTest='test_suite')
@@ -2,6 +2,8 @@
 
 import unittest2 as unittest
 
+import os
+
 from templer.core.base import BaseTemplate, get_var
 from templer.core.create import CreateDistroCommand
 from templer.core.vars import var
@@ -156,6 +158,17 @@ class test_base_template(unittest.TestCase):
         self.assertFalse(b_template.should_print_subcommands(self.command))
         self.assertTrue(n_template.should_print_subcommands(self.command))
 
+    def test_plan_extra_files(self):
+        """ The setup.cfg updated by run is part of the plan
+        """
+        template = BasicNamespace('tom')
+        self.assertEqual(
+            template.plan_extra_files(self.command, '/tmp/project', {}), [])
+        template.use_local_commands = True
+        plan = template.plan_extra_files(self.command, '/tmp/project', {})
+        self.assertEqual([(p.dest, p.action) for p in plan],
+                         [(os.path.join('/tmp/project', 'setup.cfg'), 'update')])
+
 
 def test_suite():
     suite = unittest.TestSuite([
@@ -0,0 +1,138 @@
+# -*- coding: utf-8 -*-
+
+import unittest2 as unittest
+
+import os
+import shutil
+import tempfile
+
+from templer.core import bulk
+from templer.core.control_script import run
+from templer.core.create import CreateDistroCommand
+from templer.core.tests.test_script import capture_stdout
+
+
+JSON_PROJECTS = """
+{"templates": ["basic_namespace"],
+ "vars": {"expert_mode": "all", "author": "Joe"},
+ "projects": ["my.first",
+              {"name": "my.second", "vars": {"author": "Jane"}},
+              {"name": "a.b.c", "templates": ["nested_namespace"]},
+              {"name": "bad.license", "vars": {"license_name": "nope"}}]}
+"""
+
+INI_PROJECTS = """
+[DEFAULT]
+templates = basic_namespace
+author = Joe
+
+[my.first]
+
+[my.second]
+author = Jane
+"""
+
+
+class TestBulk(unittest.TestCase):
+    """ verify the creation of many projects from a projects file
+    """
+
+    def setUp(self):
+        self.orig_dir = os.getcwd()
+        self.temp_dir = tempfile.mkdtemp()
+        os.chdir(self.temp_dir)
+
+    def tearDown(self):
+        os.chdir(self.orig_dir)
+        shutil.rmtree(self.temp_dir, ignore_errors=True)
+
+    def write(self, filename, content):
+        f = open(filename, 'w')
+        f.write(content)
+        f.close()
+        return filename
+
+    def test_read_json_projects(self):
+        projects = bulk.read_projects(
+            self.write('projects.json', JSON_PROJECTS))
+        self.assertEqual([p.name for p in projects],
+                         ['my.first', 'my.second', 'a.b.c', 'bad.license'])
+        self.assertEqual(projects[0].templates, ['basic_namespace'])
+        self.assertEqual(projects[2].templates, ['nested_namespace'])
+        self.assertEqual(projects[0].vars['author'], 'Joe')
+        self.assertEqual(projects[1].vars['author'], 'Jane')
+        self.assertTrue(isinstance(projects[1].vars['author'], str))
+
+    def test_read_ini_projects(self):
+        projects = bulk.read_projects(
+            self.write('projects.ini', INI_PROJECTS))
+        self.assertEqual([p.name for p in projects],
+                         ['my.first', 'my.second'])
+        self.assertEqual(projects[1].templates, ['basic_namespace'])
+        self.assertEqual(projects[1].vars, {'author': 'Jane'})
+
+    def bulk_create(self, *args):
+        command = CreateDistroCommand()
+        run = capture_stdout(command.run)
+        return run(['-q', '--no-interactive'] + list(args))
+
+    def check_projects(self, output_dir):
+        for name in ['my.first', 'my.second', 'a.b.c']:
+            self.assertTrue(
+                os.path.exists(os.path.join(output_dir, name, 'setup.py')),
+                '%s was not created' % name)
+        self.assertFalse(os.path.exists(os.path.join(output_dir,
+                                                     'bad.license')))
+        setup = open(os.path.join(output_dir, 'my.second', 'setup.py'))
+        self.assertTrue("author='Jane'" in setup.read())
+        setup.close()
+
+    def test_bulk_create(self):
+        self.write('projects.json', JSON_PROJECTS)
+        output = self.bulk_create('--projects', 'projects.json')
+        self.check_projects('.')
+        self.assertTrue('a.b.c' in output)
+        self.assertTrue('3 projects created, 1 failed' in output)
+        self.assertTrue('ValidationException' in output)
+
+    def test_bulk_create_concurrency(self):
+        self.write('projects.json', JSON_PROJECTS)
+        output = self.bulk_create('--projects=projects.json',
+                                  '--concurrency', '3', '-o', 'out')
+        self.check_projects('out')
+        self.assertTrue('3 projects created, 1 failed' in output)
+        # the output of each project comes in the order of the file
+        self.assertTrue(output.index('out/my.first') <
+                        output.index('out/my.second') <
+                        output.index('out/a.b.c'))
+
+    def test_bulk_create_bad_template(self):
+        self.write('projects.json', JSON_PROJECTS.replace(
+            '"templates": ["nested_namespace"]',
+            '"templates": ["no_such_template"]'))
+        for concurrency in ['1', '3']:
+            output = self.bulk_create('--projects=projects.json',
+                                      '--concurrency', concurrency,
+                                      '-o', 'out' + concurrency)
+            self.assertTrue('2 projects created, 2 failed' in output)
+            self.assertTrue('error   ' in output)
+            self.assertTrue('LookupError' in output)
+            self.assertTrue(os.path.exists(os.path.join(
+                'out' + concurrency, 'my.second', 'setup.py')))
+
+    def test_script(self):
+        self.write('projects.json', JSON_PROJECTS)
+        for args in [('--projects=projects.json', '-o', 'equals'),
+                     ('--projects', 'projects.json', '-o', 'separate')]:
+            output = capture_stdout(run)(*args, **{'exit': False})
+            self.check_projects(args[-1])
+            self.assertTrue('3 projects created, 1 failed' in output)
+
+
+def test_suite():
+    suite = unittest.TestSuite([
+        unittest.makeSuite(TestBulk), ])
+    return suite
+
+if __name__ == '__main__':
+    unittest.main(defaultTest='test_suite')
@@ -0,0 +1,137 @@
+# -*- coding: utf-8 -*-
+
+import unittest2 as unittest
+
+import gc
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
+import weakref
+
+import Cheetah.Template
+
+from templer.core import copydir
+from templer.core.cheetah_cache import CompiledTemplateCache
+
+
+SOURCE = """\
+$project by $author
+#if $zip_safe
+zip safe
+#else
+not zip safe
+#end if
+"""
+
+
+class TestCompiledTemplateCache(unittest.TestCase):
+    """ verify that compiled templates are cached and render unchanged
+    """
+
+    def setUp(self):
+        self.cache_dir = tempfile.mkdtemp()
+        self.vars = {'project': 'my.package',
+                     'author': 'Frank Herbert',
+                     'zip_safe': False}
+
+    def tearDown(self):
+        shutil.rmtree(self.cache_dir, ignore_errors=True)
+
+    def render(self, klass):
+        return str(klass(searchList=[self.vars]))
+
+    def test_same_output_as_cheetah(self):
+        cache = CompiledTemplateCache()
+        expected = str(Cheetah.Template.Template(source=SOURCE,
+                                                 searchList=[self.vars]))
+        self.assertEqual(self.render(cache.get_class(SOURCE)), expected)
+
+    def test_memory_hit(self):
+        cache = CompiledTemplateCache()
+        klass = cache.get_class(SOURCE)
+        self.assertTrue(cache.get_class(SOURCE) is klass)
+        self.assertEqual((cache.hits, cache.misses), (1, 1))
+
+    def test_disk_persistence(self):
+        cache = CompiledTemplateCache(cache_dir=self.cache_dir)
+        expected = self.render(cache.get_class(SOURCE))
+        self.assertEqual(len(os.listdir(self.cache_dir)), 1)
+
+        other = CompiledTemplateCache(cache_dir=self.cache_dir)
+        self.assertEqual(self.render(other.get_class(SOURCE)), expected)
+        self.assertEqual((other.disk_hits, other.misses), (1, 0))
+
+    def test_memory_eviction(self):
+        cache = CompiledTemplateCache(max_entries=2)
+        first = weakref.ref(cache.get_class(SOURCE))
+        for i in range(50):
+            cache.get_class(SOURCE + '%d\n' % i)
+        self.assertEqual(len(cache._classes), 2)
+        # nothing else keeps the evicted classes and their modules alive
+        gc.collect()
+        self.assertEqual(first(), None)
+        self.assertEqual([name for name in sys.modules
+                          if name.startswith('templer_cheetah_')], [])
+
+    def test_concurrent_compilation(self):
+        cache = CompiledTemplateCache()
+        compile_code = cache._compile_code
+        compiling = []
+        overlaps = []
+
+        def slow_compile(source, key):
+            compiling.append(key)
+            if len(compiling) > 1:
+                overlaps.append(key)
+            time.sleep(0.1)
+            try:
+                return compile_code(source, key)
+            finally:
+                compiling.remove(key)
+        cache._compile_code = slow_compile
+
+        sources = [SOURCE, SOURCE, SOURCE + 'other\n']
+        classes = [None] * len(sources)
+
+        def get_class(index):
+            classes[index] = cache.get_class(sources[index])
+        threads = [threading.Thread(target=get_class, args=(index, ))
+                   for index in range(len(sources))]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        # different templates are compiled at the same time, the same one
+        # only once
+        self.assertTrue(overlaps)
+        self.assertEqual((cache.misses, cache.hits), (2, 1))
+        self.assertTrue(classes[0] is classes[1])
+        self.assertEqual(cache._key_locks, {})
+
+    def test_disk_eviction(self):
+        cache = CompiledTemplateCache(cache_dir=self.cache_dir,
+                                      max_disk_bytes=1)
+        cache.get_class(SOURCE)
+        cache.get_class(SOURCE + 'more\n')
+        self.assertTrue(len(os.listdir(self.cache_dir)) <= 1)
+
+    def test_substitute_content(self):
+        cache = CompiledTemplateCache()
+        content = copydir.substitute_content(SOURCE, self.vars,
+                                             use_cheetah=True,
+                                             template_cache=cache)
+        self.assertEqual(content, 'my.package by Frank Herbert\n'
+                                  'not zip safe\n')
+        self.assertEqual(cache.misses, 1)
+
+
+def test_suite():
+    suite = unittest.TestSuite([
+        unittest.makeSuite(TestCompiledTemplateCache), ])
+    return suite
+
+if __name__ == '__main__':
+    unittest.main(defaultTest='test_suite')
@@ -0,0 +1,433 @@
+# -*- coding: utf-8 -*-
+
+import unittest2 as unittest
+
+import __builtin__
+import os
+import shutil
+import tempfile
+
+from templer.core import copydir
+from templer.core.tests.test_script import capture_stdout
+
+
+def write(path, content):
+    dirname = os.path.dirname(path)
+    if not os.path.isdir(dirname):
+        os.makedirs(dirname)
+    f = open(path, 'wb')
+    f.write(content)
+    f.close()
+
+
+def read(path):
+    f = open(path, 'rb')
+    try:
+        return f.read()
+    finally:
+        f.close()
+
+
+def read_tree(top):
+    result = {}
+    for dirpath, dirnames, filenames in os.walk(top):
+        for name in filenames:
+            path = os.path.join(dirpath, name)
+            result[os.path.relpath(path, top)] = read(path)
+    return result
+
+
+class TestCopyDir(unittest.TestCase):
+    """ verify the behavior of copy_dir
+    """
+
+    def setUp(self):
+        self.tempdir = tempfile.mkdtemp()
+        self.source = os.path.join(self.tempdir, 'source')
+        for i in range(20):
+            write(os.path.join(self.source, 'file%02d.txt_tmpl' % i),
+                  '${project} file %d\n' % i)
+            write(os.path.join(self.source, '+package+', 'data%02d' % i),
+                  'data %d\n' % i)
+        write(os.path.join(self.source, '.hidden'), 'hidden')
+        self.vars = {'project': 'my.package', 'package': 'package'}
+
+    def tearDown(self):
+        shutil.rmtree(self.tempdir, ignore_errors=True)
+
+    def copy(self, dest, **kw):
+        copy = capture_stdout(copydir.copy_dir)
+        return copy(self.source, dest, self.vars, 2, False, **kw)
+
+    def test_copy(self):
+        dest = os.path.join(self.tempdir, 'dest')
+        self.copy(dest)
+        tree = read_tree(dest)
+        self.assertEqual(len(tree), 40)
+        self.assertEqual(tree['file03.txt'], 'my.package file 3\n')
+        self.assertEqual(tree[os.path.join('package', 'data03')],
+                         'data 3\n')
+
+    def test_parallel_same_result(self):
+        sequential = os.path.join(self.tempdir, 'sequential')
+        parallel = os.path.join(self.tempdir, 'parallel')
+        out = self.copy(sequential)
+        out_parallel = self.copy(parallel, jobs=4)
+        self.assertEqual(read_tree(sequential), read_tree(parallel))
+        self.assertEqual(out.replace(sequential, ''),
+                         out_parallel.replace(parallel, ''))
+
+        # a second run only reports unchanged files, in the same order
+        out = self.copy(sequential)
+        out_parallel = self.copy(parallel, jobs=4)
+        self.assertTrue('already exists (same content)' in out_parallel)
+        self.assertEqual(out.replace(sequential, ''),
+                         out_parallel.replace(parallel, ''))
+
+    def check_template_messages(self, jobs):
+        write(os.path.join(self.source, 'file05.txt_tmpl'),
+              '$skip_template(True, "not wanted")\n')
+        dest = os.path.join(self.tempdir, 'dest%d' % jobs)
+        output = self.copy(dest, use_cheetah=True, jobs=jobs)
+        # reported when the file's turn comes, with the other messages
+        self.assertTrue(output.index('file04.txt_tmpl') <
+                        output.index('Skipping file') <
+                        output.index('not wanted') <
+                        output.index('file06.txt_tmpl'))
+
+        write(os.path.join(self.source, 'file07.txt_tmpl'),
+              '#set x = 1 / 0\n')
+        dest = os.path.join(self.tempdir, 'error%d' % jobs)
+        outputs = []
+
+        def copy(*args, **kw):
+            try:
+                copydir.copy_dir(*args, **kw)
+            except ZeroDivisionError:
+                outputs.append('raised')
+        output = capture_stdout(copy)(self.source, dest, self.vars, 2,
+                                      False, use_cheetah=True, jobs=jobs)
+        self.assertEqual(outputs, ['raised'])
+        self.assertTrue(output.index('file06.txt_tmpl') <
+                        output.index('Error in file'))
+        self.assertTrue(output.rstrip().endswith('file07.txt_tmpl:'))
+
+    def test_template_messages(self):
+        self.check_template_messages(1)
+
+    def test_template_messages_parallel(self):
+        self.check_template_messages(4)
+
+    def test_no_overwrite(self):
+        dest = os.path.join(self.tempdir, 'dest')
+        self.copy(dest)
+        write(os.path.join(dest, 'file01.txt'), 'changed\n')
+        self.copy(dest, overwrite=False, jobs=4)
+        self.assertEqual(read(os.path.join(dest, 'file01.txt')), 'changed\n')
+        self.copy(dest, overwrite=True, jobs=4)
+        self.assertEqual(read(os.path.join(dest, 'file01.txt')),
+                         'my.package file 1\n')
+
+    def test_context(self):
+        dest = os.path.join(self.tempdir, 'dest')
+        self.copy(dest)
+        write(os.path.join(dest, 'file01.txt'), 'changed\n')
+        write(os.path.join(dest, 'file02.txt'), 'changed\n')
+        answers = []
+
+        def raw_input(prompt):
+            answers.append(prompt)
+            return 'all n'
+        original_raw_input = __builtin__.raw_input
+        __builtin__.raw_input = raw_input
+        try:
+            context = copydir.CopyContext(interactive=True)
+            self.copy(dest, context=context)
+            # the answer is remembered by the context, for all the copies
+            # of the run
+            self.assertEqual(len(answers), 1)
+            self.assertEqual(context.all_answer, 'n')
+            self.copy(dest, context=context)
+            self.assertEqual(len(answers), 1)
+            # but not by the next run
+            self.copy(dest, context=copydir.CopyContext(interactive=True))
+            self.assertEqual(len(answers), 2)
+        finally:
+            __builtin__.raw_input = original_raw_input
+        self.assertEqual(read(os.path.join(dest, 'file02.txt')), 'changed\n')
+
+        self.copy(dest, context=copydir.CopyContext(interactive=True,
+                                                    all_answer='y'))
+        self.assertEqual(read(os.path.join(dest, 'file02.txt')),
+                         'my.package file 2\n')
+
+    def test_module_all_answer(self):
+        dest = os.path.join(self.tempdir, 'dest')
+        self.copy(dest)
+        write(os.path.join(dest, 'file01.txt'), 'changed\n')
+        # the deprecated module attribute still answers for the copies
+        # run without a context
+        copydir.all_answer = 'n'
+        try:
+            self.copy(dest, interactive=True)
+            self.assertEqual(read(os.path.join(dest, 'file01.txt')),
+                             'changed\n')
+            self.copy(dest, context=copydir.CopyContext(all_answer='y'))
+            self.assertEqual(copydir.all_answer, 'n')
+        finally:
+            copydir.all_answer = None
+
+
+class TestPlanCopy(unittest.TestCase):
+    """ verify the plan of a copy_dir without writing anything
+    """
+
+    def setUp(self):
+        self.tempdir = tempfile.mkdtemp()
+        self.source = os.path.join(self.tempdir, 'source')
+        self.dest = os.path.join(self.tempdir, 'dest')
+        write(os.path.join(self.source, 'new.txt_tmpl'), '${project}\n')
+        write(os.path.join(self.source, 'same.txt_tmpl'), '${project}\n')
+        write(os.path.join(self.source, 'changed.txt_tmpl'), '${project}\n')
+        write(os.path.join(self.source, '+package+', 'data'), 'data\n')
+        write(os.path.join(self.dest, 'same.txt'), 'my.package\n')
+        write(os.path.join(self.dest, 'changed.txt'), 'changed\n')
+        self.vars = {'project': 'my.package', 'package': 'package'}
+
+    def tearDown(self):
+        shutil.rmtree(self.tempdir, ignore_errors=True)
+
+    def plan(self, **kw):
+        plan = copydir.plan_copy(self.source, self.dest, self.vars, **kw)
+        return dict([(os.path.relpath(planned.dest, self.dest), planned)
+                     for planned in plan])
+
+    def test_plan(self):
+        plan = self.plan()
+        self.assertEqual(
+            dict([(dest, planned.action) for dest, planned in plan.items()]),
+            {'new.txt': 'create',
+             'same.txt': 'unchanged',
+             'changed.txt': 'overwrite',
+             os.path.join('package', 'data'): 'create'})
+        self.assertEqual(plan['new.txt'].renderer, 'string.Template')
+        self.assertEqual(plan['new.txt'].size, len('my.package\n'))
+        self.assertEqual(plan['new.txt'].source,
+                         os.path.join(self.source, 'new.txt_tmpl'))
+        self.assertEqual(plan[os.path.join('package', 'data')].renderer,
+                         'copy')
+        # nothing was written
+        self.assertEqual(sorted(read_tree(self.dest)),
+                         ['changed.txt', 'same.txt'])
+
+    def test_no_overwrite(self):
+        plan = self.plan(overwrite=False, jobs=4)
+        self.assertEqual(plan['changed.txt'].action, 'skip')
+        self.assertEqual(plan['new.txt'].action, 'create')
+
+
+class TestStreamedCopy(unittest.TestCase):
+    """ verify that plain files are copied in chunks and written atomically
+    """
+
+    def setUp(self):
+        self.tempdir = tempfile.mkdtemp()
+        self.source = os.path.join(self.tempdir, 'source')
+        self.dest = os.path.join(self.tempdir, 'dest')
+        self.data = ''.join([chr(i % 256) for i in range(1000)])
+        write(os.path.join(self.source, 'data.bin'), self.data)
+        self.chunk_size = copydir.CHUNK_SIZE
+        copydir.CHUNK_SIZE = 64
+
+    def tearDown(self):
+        copydir.CHUNK_SIZE = self.chunk_size
+        shutil.rmtree(self.tempdir, ignore_errors=True)
+
+    def copy(self):
+        return capture_stdout(copydir.copy_dir)(self.source, self.dest, {},
+                                                1, False)
+
+    def test_copy(self):
+        reads = []
+        original_open = copydir.SourceFile.open
+
+        def open_source(source):
+            f = original_open(source)
+            original_read = f.read
+
+            class Reader(object):
+                def read(self, size=-1):
+                    reads.append(size)
+                    return original_read(size)
+
+                def close(self):
+                    f.close()
+            return Reader()
+        copydir.SourceFile.open = open_source
+        try:
+            self.copy()
+        finally:
+            copydir.SourceFile.open = original_open
+        self.assertEqual(read(os.path.join(self.dest, 'data.bin')),
+                         self.data)
+        self.assertTrue(reads)
+        self.assertEqual(set(reads), set([64]))
+        self.assertEqual(os.listdir(self.dest), ['data.bin'])
+
+    def test_same_content(self):
+        self.copy()
+        output = self.copy()
+        self.assertTrue('already exists (same content)' in output)
+
+    def test_keeps_mode(self):
+        filename = os.path.join(self.dest, 'data.bin')
+        write(filename, 'old content')
+        os.chmod(filename, 0751)
+        self.copy()
+        self.assertEqual(read(filename), self.data)
+        self.assertEqual(os.stat(filename).st_mode & 0777, 0751)
+
+    def test_clone(self):
+        cloned = []
+
+        def clone_file(filename, fileobj):
+            cloned.append(filename)
+            fileobj.write(read(filename))
+            return True
+        original_copy_to = copydir.SourceFile.copy_to
+        original_clone_file = copydir._clone_file
+        copydir.SourceFile.copy_to = None
+        copydir._clone_file = clone_file
+        try:
+            self.copy()
+        finally:
+            copydir.SourceFile.copy_to = original_copy_to
+            copydir._clone_file = original_clone_file
+        self.assertEqual(cloned, [os.path.join(self.source, 'data.bin')])
+        self.assertEqual(read(os.path.join(self.dest, 'data.bin')),
+                         self.data)
+
+    def test_same_as(self):
+        step = copydir.FileStep(self.source,
+                                os.path.join(self.source, 'data.bin'),
+                                os.path.join(self.dest, 'data.bin'),
+                                False, True, '')
+        write(step.dest, self.data)
+        self.assertTrue(copydir.SourceFile(step).same_as(step.dest))
+        write(step.dest, self.data[:-1] + 'x')
+        self.assertFalse(copydir.SourceFile(step).same_as(step.dest))
+        source = copydir.SourceFile(step)
+        source.copy_to(None)
+        self.assertFalse(source.same_as(step.dest))
+        write(step.dest, self.data)
+        self.assertTrue(source.same_as(step.dest))
+
+
+class TestTypeMapper(unittest.TestCase):
+    """ verify the evaluation of string.Template placeholders
+    """
+
+    def substitute(self, content, **vars):
+        return copydir.substitute_content(content, vars)
+
+    def test_names_and_expressions(self):
+        self.assertEqual(self.substitute('$a ${a.upper()} ${b}', a='x', b=None),
+                         'x X ')
+
+    def test_fallback(self):
+        self.assertEqual(self.substitute('${missing|other|a}', a='x'), 'x')
+        self.assertRaises(NameError, self.substitute, '${missing|other}')
+
+    def test_error_annotation(self):
+        try:
+            self.substitute('${1/0|a}', a='x')
+        except ZeroDivisionError, e:
+            self.assertTrue("in expression '1/0'" in str(e))
+            self.assertTrue('in file <string>' in str(e))
+        else:
+            self.fail('ZeroDivisionError not raised')
+
+    def test_compiled_once(self):
+        self.substitute('${a + "1"}', a='x')
+        code = copydir._compiled_expressions['a + "1"']
+        self.assertEqual(self.substitute('${a + "1"}', a='y'), 'y1')
+        self.assertTrue(copydir.compile_expression('a + "1"') is code)
+
+    def test_namespace_built_once(self):
+        mapper = copydir.TypeMapper({'a': 'x'})
+        self.assertEqual(mapper['a'], 'x')
+        namespace = mapper.namespace()
+        self.assertEqual(mapper['a * 2'], 'xx')
+        self.assertTrue(mapper.namespace() is namespace)
+
+
+class TestTemplateDependencies(unittest.TestCase):
+    """ verify the detection of the variables used by a template
+    """
+
+    def test_string_template(self):
+        self.assertEqual(
+            copydir.template_dependencies(
+                '$a ${b.upper()} ${missing|c} $$d'),
+            ['a', 'b', 'c', 'missing', 'upper'])
+
+    def test_cheetah(self):
+        self.assertEqual(
+            copydir.template_dependencies(
+                '$a ${b.upper()}\n#if $c\nyes\n#end if\n',
+                use_cheetah=True),
+            ['a', 'b', 'c'])
+
+    def test_unknown(self):
+        self.assertEqual(
+            copydir.template_dependencies(
+                '#from datetime import date\n$date.today()\n',
+                use_cheetah=True),
+            None)
+        self.assertEqual(
+            copydir.template_dependencies(
+                '$a', template_renderer=lambda *args, **kw: ''),
+            None)
+
+
+class TestFilenameSubstituter(unittest.TestCase):
+    """ verify the substitution of +var+ in file names
+    """
+
+    def setUp(self):
+        self.vars = {'package': 'example', 'namespace_package': 'my',
+                     'dot': '.', 'version': 1.0}
+        self.substituter = copydir.FilenameSubstituter(self.vars)
+
+    def test_substitute(self):
+        self.assertEqual(self.substituter('+namespace_package+'), 'my')
+        self.assertEqual(self.substituter('+dot+gitignore'), '.gitignore')
+        self.assertEqual(self.substituter('v+version+.txt'), 'v1.0.txt')
+        self.assertEqual(self.substituter('+unknown+'), '+unknown+')
+        self.assertEqual(self.substituter('a+b'), 'a+b')
+
+    def test_substitute_path(self):
+        path = os.path.join('src', '+namespace_package+', '+package+',
+                            '__init__.py_tmpl')
+        self.assertEqual(self.substituter.substitute_path(path),
+                         os.path.join('src', 'my', 'example',
+                                      '__init__.py_tmpl'))
+
+    def test_substitute_filename(self):
+        self.assertEqual(
+            copydir.substitute_filename('+package+.txt', self.vars),
+            'example.txt')
+
+
+def test_suite():
+    suite = unittest.TestSuite([
+        unittest.makeSuite(TestCopyDir),
+        unittest.makeSuite(TestPlanCopy),
+        unittest.makeSuite(TestStreamedCopy),
+        unittest.makeSuite(TestTypeMapper),
+        unittest.makeSuite(TestTemplateDependencies),
+        unittest.makeSuite(TestFilenameSubstituter), ])
+    return suite
+
+if __name__ == '__main__':
+    unittest.main(defaultTest='test_suite')
@@ -0,0 +1,171 @@
+# -*- coding: utf-8 -*-
+
+import unittest2 as unittest
+
+import json
+import os
+import shutil
+import sys
+import tempfile
+from cStringIO import StringIO
+
+from templer.core import copydir
+from templer.core import events
+from templer.core.control_script import run
+from templer.core.create import CreateDistroCommand
+from templer.core.tests.test_copydir import write
+from templer.core.tests.test_script import capture_stdout
+
+
+class EventList(events.Observer):
+
+    def __init__(self):
+        self.events = []
+        self.flushed = 0
+
+    def notify(self, event):
+        self.events.append(event)
+
+    def flush(self):
+        self.flushed += 1
+
+    def kinds(self):
+        return [(event.kind, os.path.basename(event.path or ''))
+                for event in self.events]
+
+
+class TestEvents(unittest.TestCase):
+    """ verify that copy_dir and the commands report events
+    """
+
+    def setUp(self):
+        self.orig_dir = os.getcwd()
+        self.temp_dir = tempfile.mkdtemp()
+        os.chdir(self.temp_dir)
+        self.source = os.path.join(self.temp_dir, 'source')
+        write(os.path.join(self.source, 'name.txt_tmpl'), '${name}\n')
+        write(os.path.join(self.source, 'sub', 'plain.txt'), 'plain\n')
+        self.dest = os.path.join(self.temp_dir, 'dest')
+
+    def tearDown(self):
+        os.chdir(self.orig_dir)
+        shutil.rmtree(self.temp_dir, ignore_errors=True)
+
+    def copy(self, name, observer=None, verbosity=1):
+        copy = capture_stdout(copydir.copy_dir)
+        return copy(self.source, self.dest, {'name': name}, verbosity,
+                    False, observer=observer)
+
+    def test_copy_dir(self):
+        observer = EventList()
+        self.assertEqual(self.copy('first', observer), '')
+        self.assertEqual(observer.kinds(),
+                         [('dir_created', 'dest'),
+                          ('file_created', 'name.txt'),
+                          ('message', ''),
+                          ('dir_created', 'sub'),
+                          ('file_created', 'plain.txt')])
+        self.assertTrue(observer.flushed)
+        self.assertTrue(observer.events[1].seconds >= 0)
+        self.assertEqual(observer.events[1].message,
+                         'Copying name.txt_tmpl to %s'
+                         % os.path.join(self.dest, 'name.txt'))
+
+        observer = EventList()
+        self.copy('second', observer, verbosity=0)
+        self.assertEqual(observer.kinds(),
+                         [('dir_exists', 'dest'),
+                          ('file_overwritten', 'name.txt'),
+                          ('message', ''),
+                          ('dir_exists', 'sub'),
+                          ('file_unchanged', 'plain.txt')])
+        # above the verbosity, events come without a message
+        self.assertEqual([event.message for event in observer.events],
+                         [None, None, None, None, None])
+
+    def test_human_renderer(self):
+        stream = StringIO()
+        renderer = events.HumanRenderer(1, stream, buffer_size=2)
+        renderer.notify(events.Event(events.FILE_CREATED, 'a', 'Created a'))
+        renderer.notify(events.Event(events.DIR_EXISTS, 'b', 'Exists b', 2))
+        renderer.notify(events.Event(events.FILE_SKIPPED, 'c'))
+        self.assertEqual(stream.getvalue(), '')
+        renderer.notify(events.Event(events.MESSAGE, message='Done', level=0))
+        self.assertEqual(stream.getvalue(), 'Created a\nDone\n')
+        renderer.notify(events.Event(events.MESSAGE, message='More'))
+        renderer.flush()
+        self.assertEqual(stream.getvalue(), 'Created a\nDone\nMore\n')
+
+        # by default, copy_dir prints as it always did
+        output = self.copy('first')
+        self.assertTrue('Copying name.txt_tmpl' in output)
+        self.assertTrue('Recursing into sub' in output)
+
+    def test_json_lines(self):
+        stream = StringIO()
+        renderer = events.JSONLinesRenderer(stream)
+        self.copy('first', renderer)
+        lines = [json.loads(line) for line in stream.getvalue().splitlines()]
+        self.assertEqual([line['event'] for line in lines],
+                         ['dir_created', 'file_created', 'message',
+                          'dir_created', 'file_created'])
+        self.assertEqual(lines[1]['path'],
+                         os.path.join(self.dest, 'name.txt'))
+
+    def test_command(self):
+        command = CreateDistroCommand()
+        run = capture_stdout(command.run)
+        output = run(['--no-interactive', '--events', 'json', '--timings',
+                      '-t', 'basic_namespace', 'my.package'])
+        lines = [json.loads(line) for line in output.splitlines()]
+        kinds = [line['event'] for line in lines]
+        self.assertEqual(kinds[0], 'template')
+        self.assertTrue('file_created' in kinds)
+        self.assertTrue([line for line in lines
+                         if line.get('path') == './my.package/setup.py'])
+        # the timings come last, as an event too
+        self.assertEqual(kinds[-1], 'timings')
+        self.assertTrue(lines[-1]['data']['phases'])
+
+    def test_script(self):
+        stderr = sys.stderr
+        sys.stderr = StringIO()
+        try:
+            output = capture_stdout(run)('basic_namespace', 'my.package',
+                                         '--no-interactive', '--events=json',
+                                         exit=False)
+            errors = sys.stderr.getvalue()
+        finally:
+            sys.stderr = stderr
+        # what the script says goes to the standard error
+        self.assertTrue('basic_namespace: A basic Python project' in errors)
+        kinds = [json.loads(line)['event'] for line in output.splitlines()]
+        self.assertTrue('file_created' in kinds)
+
+    def test_ensure_file(self):
+        command = CreateDistroCommand()
+        command.parse_args(['--overwrite'])
+        command.simulate = False
+        command.interactive = False
+        command.observer = observer = EventList()
+        filename = os.path.join(self.temp_dir, 'new', 'file.txt')
+        command.ensure_file(filename, 'content\n')
+        command.ensure_file(filename, 'content\n')
+        command.ensure_file(filename, 'other\n')
+        self.assertEqual(observer.kinds(),
+                         [('dir_exists', os.path.basename(self.temp_dir)),
+                          ('dir_created', 'new'),
+                          ('file_created', 'file.txt'),
+                          ('dir_exists', 'new'),
+                          ('file_unchanged', 'file.txt'),
+                          ('dir_exists', 'new'),
+                          ('file_overwritten', 'file.txt')])
+
+
+def test_suite():
+    suite = unittest.TestSuite([
+        unittest.makeSuite(TestEvents), ])
+    return suite
+
+if __name__ == '__main__':
+    unittest.main(defaultTest='test_suite')
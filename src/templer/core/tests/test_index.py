@@ -0,0 +1,112 @@
+# -*- coding: utf-8 -*-
+
+import unittest2 as unittest
+
+import os
+import shutil
+import tempfile
+
+import pkg_resources
+
+from templer.core import index
+from templer.core.base import BaseTemplate
+
+
+class TestEntryPointIndex(unittest.TestCase):
+    """ verify that template metadata is indexed and kept up to date
+    """
+
+    def setUp(self):
+        self.tempdir = tempfile.mkdtemp()
+        self.path = os.path.join(self.tempdir, 'index', 'entry_points.json')
+        self.entry = pkg_resources.get_entry_info(
+            'templer.core', 'paste.paster_create_template', 'basic_namespace')
+        self.loaded = []
+        original_load = self.entry.load
+
+        def load(*args, **kw):
+            self.loaded.append(self.entry.name)
+            return original_load(*args, **kw)
+        self.entry.load = load
+        # never read or write the index of the user
+        self.old_environ = dict([(name, os.environ.get(name)) for name in
+                                 (index.INDEX_FILE_ENV, 'XDG_CACHE_HOME')])
+        os.environ[index.INDEX_FILE_ENV] = self.path
+        index._default_index = None
+
+    def tearDown(self):
+        del self.entry.load
+        for name, value in self.old_environ.items():
+            if value is None:
+                os.environ.pop(name, None)
+            else:
+                os.environ[name] = value
+        index._default_index = None
+        shutil.rmtree(self.tempdir, ignore_errors=True)
+
+    def test_metadata(self):
+        klass = self.entry.load()
+        info = index.EntryPointIndex(self.path).template_info(self.entry)
+        self.assertEqual(info['name'], 'basic_namespace')
+        self.assertEqual(info['summary'], klass.summary)
+        self.assertEqual(info['ndots'], klass.ndots)
+        self.assertTrue(index.class_path(BaseTemplate) in info['mro'])
+        self.assertEqual([var['name'] for var in info['vars']],
+                         [var.name for var in klass.vars])
+        self.assertTrue(info['class'] is klass)
+
+    def test_persistence(self):
+        first = index.EntryPointIndex(self.path)
+        info = first.template_info(self.entry)
+        first.save()
+        self.assertEqual(self.loaded, ['basic_namespace'])
+
+        # another process describes the template without loading it
+        second = index.EntryPointIndex(self.path)
+        self.assertEqual(second.template_info(self.entry), info)
+        self.assertEqual(self.loaded, ['basic_namespace'])
+        self.assertTrue(isinstance(second.describe(self.entry)['summary'],
+                                   str))
+
+    def test_stale_entry(self):
+        first = index.EntryPointIndex(self.path)
+        first.describe(self.entry)
+        key = first.entry_key(self.entry)
+        for filename in first._entries[key]['files']:
+            first._entries[key]['files'][filename] -= 1
+        first.save()
+
+        second = index.EntryPointIndex(self.path)
+        second.describe(self.entry)
+        self.assertEqual(self.loaded, ['basic_namespace', 'basic_namespace'])
+
+    def test_default_index(self):
+        default = index.get_index()
+        self.assertEqual(default.path, self.path)
+        self.assertTrue(index.get_index() is default)
+        default.describe(self.entry)
+        default.save()
+        self.assertTrue(os.path.exists(self.path))
+
+        del os.environ[index.INDEX_FILE_ENV]
+        os.environ['XDG_CACHE_HOME'] = self.tempdir
+        self.assertEqual(index.default_index_path(),
+                         os.path.join(self.tempdir, 'templer',
+                                      'entry_points.json'))
+        os.environ[index.INDEX_FILE_ENV] = ''
+        self.assertEqual(index.default_index_path(), None)
+
+    def test_disabled(self):
+        disabled = index.EntryPointIndex(None)
+        disabled.describe(self.entry)
+        disabled.save()
+        self.assertFalse(os.path.exists(self.path))
+
+
+def test_suite():
+    suite = unittest.TestSuite([
+        unittest.makeSuite(TestEntryPointIndex), ])
+    return suite
+
+if __name__ == '__main__':
+    unittest.main(defaultTest='test_suite')
@@ -0,0 +1,196 @@
+# -*- coding: utf-8 -*-
+
+import unittest2 as unittest
+
+import os
+import shutil
+import tempfile
+
+from templer.core import copydir
+from templer.core.manifest import GeneratedFiles
+from templer.core.manifest import MANIFEST_DIR_ENV
+from templer.core.manifest import PRUNE_STAMP
+from templer.core.manifest import prune_manifests
+from templer.core.manifest import manifest_path
+from templer.core.tests.test_copydir import read
+from templer.core.tests.test_copydir import write
+from templer.core.tests.test_script import capture_stdout
+
+
+class TestGeneratedFiles(unittest.TestCase):
+    """ verify that generated files are known by their stat
+    """
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.path = os.path.join(self.root, 'src', 'file.txt')
+        write(self.path, 'content\n')
+
+    def tearDown(self):
+        shutil.rmtree(self.root, ignore_errors=True)
+
+    def test_record(self):
+        manifest = GeneratedFiles(self.root)
+        self.assertEqual(manifest.known_hash(self.path), None)
+        manifest.record(self.path, 'content\n')
+        self.assertTrue(manifest.matches(self.path, 'content\n'))
+        self.assertFalse(manifest.matches(self.path, 'other\n'))
+
+    def test_persistence(self):
+        manifest = GeneratedFiles(self.root)
+        manifest.record(self.path, 'content\n')
+        manifest.save()
+        self.assertTrue(GeneratedFiles(self.root).matches(self.path,
+                                                          'content\n'))
+        # the manifest is kept out of the project
+        self.assertEqual(os.listdir(self.root), ['src'])
+        self.assertTrue(os.path.isfile(manifest_path(self.root)))
+
+    def test_prune(self):
+        stamp = os.path.join(os.environ[MANIFEST_DIR_ENV], PRUNE_STAMP)
+        roots = [os.path.join(self.root, name)
+                 for name in ['kept', 'removed', 'later']]
+        for root in roots:
+            write(os.path.join(root, 'file.txt'), 'content\n')
+            # pruned recently, saving does not prune
+            open(stamp, 'wb').close()
+            manifest = GeneratedFiles(root)
+            manifest.record(os.path.join(root, 'file.txt'), 'content\n')
+            manifest.save()
+        kept, removed, later = [manifest_path(root) for root in roots]
+        shutil.rmtree(roots[1])
+        self.assertTrue(os.path.exists(removed))
+
+        prune_manifests()
+        self.assertFalse(os.path.exists(removed))
+        self.assertTrue(os.path.exists(kept))
+        self.assertTrue(os.path.exists(later))
+
+        # once a day, saving a manifest prunes the others
+        shutil.rmtree(roots[2])
+        os.utime(stamp, (0, 0))
+        manifest = GeneratedFiles(roots[0])
+        write(os.path.join(roots[0], 'file.txt'), 'changed\n')
+        manifest.record(os.path.join(roots[0], 'file.txt'), 'changed\n')
+        manifest.save()
+        self.assertFalse(os.path.exists(later))
+        self.assertTrue(os.path.exists(kept))
+
+    def test_disabled(self):
+        old_dir = os.environ[MANIFEST_DIR_ENV]
+        os.environ[MANIFEST_DIR_ENV] = ''
+        try:
+            self.assertEqual(manifest_path(self.root), None)
+            manifest = GeneratedFiles(self.root)
+            manifest.record(self.path, 'content\n')
+            self.assertTrue(manifest.matches(self.path, 'content\n'))
+            manifest.save()
+            self.assertFalse(GeneratedFiles(self.root).matches(self.path,
+                                                               'content\n'))
+        finally:
+            os.environ[MANIFEST_DIR_ENV] = old_dir
+
+    def test_changed_on_disk(self):
+        manifest = GeneratedFiles(self.root)
+        manifest.record(self.path, 'content\n')
+        write(self.path, 'changed content\n')
+        self.assertEqual(manifest.known_hash(self.path), None)
+
+        # same size and modification time, but written again
+        manifest.record(self.path, 'changed content\n')
+        st = os.stat(self.path)
+        write(self.path, 'changed CONTENT\n')
+        os.utime(self.path, (st.st_atime, st.st_mtime))
+        self.assertEqual(manifest.known_hash(self.path), None)
+
+    def test_outside_root(self):
+        manifest = GeneratedFiles(os.path.join(self.root, 'src', 'sub'))
+        manifest.record(self.path, 'content\n')
+        self.assertEqual(manifest.known_hash(self.path), None)
+
+    def test_copy_dir_trusts_stat(self):
+        source = os.path.join(self.root, 'source')
+        dest = os.path.join(self.root, 'dest')
+        write(os.path.join(source, 'file.txt_tmpl'), '${name}\n')
+        copy = capture_stdout(copydir.copy_dir)
+        manifest = GeneratedFiles(dest)
+        copy(source, dest, {'name': 'first'}, 1, False, manifest=manifest)
+        filename = os.path.join(dest, 'file.txt')
+
+        # a file recorded with a content it does not have is not read
+        write(filename, 'other\n')
+        manifest.record(filename, 'first\n')
+        output = copy(source, dest, {'name': 'first'}, 1, False,
+                      manifest=manifest)
+        self.assertTrue('already exists (same content)' in output)
+        self.assertEqual(read(filename), 'other\n')
+
+        # a new content is written and recorded
+        copy(source, dest, {'name': 'second'}, 1, False, manifest=manifest)
+        self.assertEqual(read(filename), 'second\n')
+        self.assertTrue(manifest.matches(filename, 'second\n'))
+
+
+class TestIncremental(unittest.TestCase):
+    """ verify that only the files whose inputs changed are rendered
+    """
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.source = os.path.join(self.root, 'source')
+        self.dest = os.path.join(self.root, 'dest')
+        write(os.path.join(self.source, 'name.txt_tmpl'), '${name}\n')
+        write(os.path.join(self.source, 'count.txt_tmpl'), '${count()}\n')
+        self.calls = []
+
+        def count():
+            self.calls.append(1)
+            return len(self.calls)
+        self.vars = {'name': 'first', 'count': count}
+        self.manifest = GeneratedFiles(self.dest)
+
+    def tearDown(self):
+        shutil.rmtree(self.root, ignore_errors=True)
+
+    def copy(self):
+        copy = capture_stdout(copydir.copy_dir)
+        return copy(self.source, self.dest, self.vars, 1, False,
+                    manifest=self.manifest)
+
+    def test_rerun(self):
+        self.copy()
+        self.assertEqual(len(self.calls), 1)
+        output = self.copy()
+        self.assertEqual(len(self.calls), 1)
+        self.assertEqual(output.count('already exists (same content)'), 2)
+
+    def test_changed_var(self):
+        self.copy()
+        self.vars['name'] = 'second'
+        self.copy()
+        self.assertEqual(len(self.calls), 1)
+        self.assertEqual(read(os.path.join(self.dest, 'name.txt')),
+                         'second\n')
+
+    def test_changed_source(self):
+        self.copy()
+        write(os.path.join(self.source, 'count.txt_tmpl'), '${count()}!\n')
+        self.copy()
+        self.assertEqual(len(self.calls), 2)
+        self.assertEqual(read(os.path.join(self.dest, 'count.txt')), '2!\n')
+
+    def test_changed_destination(self):
+        self.copy()
+        write(os.path.join(self.dest, 'count.txt'), 'edited, longer\n')
+        self.copy()
+        self.assertEqual(len(self.calls), 2)
+
+
+def test_suite():
+    suite = unittest.TestSuite([
+        unittest.makeSuite(TestGeneratedFiles),
+        unittest.makeSuite(TestIncremental), ])
+    return suite
+
+if __name__ == '__main__':
+    unittest.main(defaultTest='test_suite')
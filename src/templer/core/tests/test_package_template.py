@@ -1,15 +1,22 @@
+import json
 import os
+import sys
 import tempfile
 import unittest2 as unittest
 import pkg_resources
 import shutil
+import tarfile
+import threading
+from cStringIO import StringIO
 
 from templer.core.base import BaseTemplate
+from templer.core.control_script import run
 from templer.core.create import CreateDistroCommand
 from templer.core.vars import DottedVar
 from templer.core.vars import EXPERT
 
 from templer.core.package_template import PackageTemplate
+from templer.core.tests.test_script import capture_stdout
 
 
 def cd(*args):
@@ -73,3 +80,96 @@ class TestPackageTemplate(unittest.TestCase):
         new_template.pre(self.command, self.temp_dir, vars)
         expected = "\n      namespace_packages=['example', 'example.dotdot'],"
         self.failUnless(vars['namespace'] == expected, vars['namespace'])
+
+    def test_plan_project(self):
+        command = CreateDistroCommand()
+        command.parse_args(['-q', '-t', 'package', '--no-interactive'])
+        command.interactive = False
+        template = PackageTemplate('package')
+        plan = command.plan_project('example.project', [template],
+                                    {'expert_mode': 'all'})
+        dests = [planned.dest for planned in plan]
+        self.failUnless(os.path.abspath(os.path.join('example.project',
+                                                     'setup.py'))
+                        in dests, dests)
+        self.failUnless(os.path.abspath(os.path.join(
+            'example.project', 'src', 'example', 'project', '__init__.py'))
+                        in dests, dests)
+        self.failUnless(set([p.action for p in plan]) == set(['create']))
+        # with the namespace package written by post
+        hooks = [planned.dest for planned in plan
+                 if planned.renderer == 'hook']
+        self.assertEqual(hooks, [os.path.abspath(os.path.join(
+            'example.project', 'src', 'example', '__init__.py'))])
+        # nothing was written
+        self.failIf(os.listdir(self.temp_dir))
+
+    def test_plan_stdout(self):
+        stderr = sys.stderr
+        sys.stderr = StringIO()
+        try:
+            output = capture_stdout(run)('package', 'example.project',
+                                         '--no-interactive', '--plan', '-',
+                                         'expert_mode=all', exit=False)
+            errors = sys.stderr.getvalue()
+        finally:
+            sys.stderr = stderr
+        # the standard output only has the plan
+        plan = json.loads(output)
+        self.failUnless('hook' in [planned['renderer'] for planned in plan])
+        self.failUnless('package: A Python package template' in errors)
+        self.failIf(os.listdir(self.temp_dir))
+
+    def test_concurrent_generation(self):
+        # the templates only use absolute paths and never change the
+        # working directory, packages can be generated from many threads
+        errors = []
+
+        def create(index):
+            try:
+                command = CreateDistroCommand()
+                command.run(['-q', '-t', 'package', '--no-interactive',
+                             '-o', 'out%s' % index, 'example.project',
+                             'description=Project %s' % index])
+            except Exception, e:
+                errors.append(e)
+        threads = [threading.Thread(target=create, args=(index, ))
+                   for index in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(errors, [])
+        self.assertEqual(sorted(os.listdir(self.temp_dir)),
+                         ['out0', 'out1', 'out2', 'out3'])
+        for index in range(4):
+            project = os.path.join(self.temp_dir, 'out%s' % index,
+                                   'example.project')
+            self.failUnless(os.path.exists(os.path.join(
+                project, 'src', 'example', '__init__.py')))
+            self.failUnless(os.path.exists(os.path.join(
+                project, 'src', 'example', 'project', '__init__.py')))
+            setup = open(os.path.join(project, 'setup.py')).read()
+            self.failUnless('Project %s' % index in setup)
+
+    def test_archive(self):
+        command = CreateDistroCommand()
+        command.parse_args(['-q', '-t', 'package', '--no-interactive',
+                            '--archive', 'tar.gz'])
+        command.interactive = False
+        command.verbose = 0
+        command.simulate = False
+        template = PackageTemplate('package')
+        command.create_project('example.project', [template],
+                               {'expert_mode': 'all'})
+        self.assertEqual(os.listdir(self.temp_dir),
+                         ['example.project.tar.gz'])
+        tar = tarfile.open('example.project.tar.gz')
+        names = tar.getnames()
+        self.failUnless('example.project/setup.py' in names, names)
+        self.failUnless('example.project/src/example/project/__init__.py'
+                        in names, names)
+        init = tar.extractfile('example.project/src/example/__init__.py')
+        self.assertEqual(
+            init.read(),
+            "__import__('pkg_resources').declare_namespace(__name__)")
@@ -0,0 +1,104 @@
+# -*- coding: utf-8 -*-
+
+import unittest2 as unittest
+
+import os
+import shutil
+import tempfile
+from ConfigParser import InterpolationError
+
+from templer.core import api
+from templer.core.base import get_zopeskel_prefs
+from templer.core.prefs import Preferences
+from templer.core.prefs import get_preferences
+
+PREFS = """\
+[DEFAULT]
+author = Joe
+license_name = GPL
+keywords = %(master_keywords)s
+master_keywords = common
+broken = %(nothing)s
+
+[basic_namespace]
+license_name = BSD
+master_keywords = namespace
+
+[nested_namespace]
+author = Jane
+"""
+
+
+class TestPreferences(unittest.TestCase):
+    """ verify that the .zopeskel preferences are read once and resolved
+    """
+
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.old_home = os.environ.get('HOME')
+        os.environ['HOME'] = self.temp_dir
+        self.path = os.path.join(self.temp_dir, '.zopeskel')
+        self.write(PREFS)
+
+    def tearDown(self):
+        if self.old_home is None:
+            del os.environ['HOME']
+        else:
+            os.environ['HOME'] = self.old_home
+        shutil.rmtree(self.temp_dir, ignore_errors=True)
+
+    def write(self, content):
+        f = open(self.path, 'w')
+        f.write(content)
+        f.close()
+
+    def test_default(self):
+        prefs = Preferences(self.path)
+        self.assertEqual(prefs.default(['basic_namespace'], 'license_name'),
+                         'BSD')
+        # DEFAULT values are interpolated in the section of the template
+        self.assertEqual(prefs.default(['basic_namespace'], 'keywords'),
+                         'namespace')
+        self.assertEqual(prefs.default([], 'keywords'), 'common')
+        # the first template having a section wins
+        self.assertEqual(prefs.default(['unknown', 'nested_namespace',
+                                        'basic_namespace'], 'author'),
+                         'Jane')
+        self.assertEqual(prefs.default(['basic_namespace',
+                                        'nested_namespace'], 'author'),
+                         'Joe')
+        self.assertEqual(prefs.default(['unknown'], 'Author'), 'Joe')
+        self.assertEqual(prefs.default(['unknown'], 'missing', 'x'), 'x')
+        # values that cannot be interpolated only fail when used
+        self.assertRaises(InterpolationError, prefs.default, [], 'broken')
+
+        self.assertEqual(Preferences(self.path + '.none').default(
+            ['basic_namespace'], 'author', 'nobody'), 'nobody')
+
+    def test_reload(self):
+        prefs = get_preferences()
+        self.assertTrue(prefs is get_preferences(self.path))
+        self.assertTrue(get_zopeskel_prefs() is prefs.get_config())
+        layer = prefs.layer(['basic_namespace'])
+        self.assertTrue(prefs.layer(['basic_namespace']) is layer)
+
+        self.write('[DEFAULT]\nauthor = Somebody else\n')
+        self.assertEqual(prefs.default(['basic_namespace'], 'author'),
+                         'Somebody else')
+        os.remove(self.path)
+        self.assertEqual(prefs.default(['basic_namespace'], 'author'), None)
+
+    def test_generate(self):
+        result = api.generate(['nested_namespace'], 'my.nested.package',
+                              {'expert_mode': 'all'}, output=self.temp_dir)
+        self.assertEqual(result.vars['author'], 'Jane')
+        self.assertEqual(result.vars['license_name'].upper(), 'GPL')
+
+
+def test_suite():
+    suite = unittest.TestSuite([
+        unittest.makeSuite(TestPreferences), ])
+    return suite
+
+if __name__ == '__main__':
+    unittest.main(defaultTest='test_suite')
@@ -0,0 +1,86 @@
+# -*- coding: utf-8 -*-
+
+import unittest2 as unittest
+
+import os
+import shutil
+import tempfile
+
+import pkg_resources
+
+from templer.core import copydir
+from templer.core.resources import ResourceTree
+from templer.core.tests.test_copydir import read_tree
+from templer.core.tests.test_script import capture_stdout
+
+
+class TestResourceTree(unittest.TestCase):
+    """ verify that package resource trees are enumerated once
+    """
+
+    def setUp(self):
+        self.calls = []
+        self.originals = {}
+        for name in ('resource_listdir', 'resource_isdir',
+                     'resource_string'):
+            self.originals[name] = original = getattr(pkg_resources, name)
+            setattr(pkg_resources, name, self.counting(name, original))
+        self.tempdir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        for name, original in self.originals.items():
+            setattr(pkg_resources, name, original)
+        shutil.rmtree(self.tempdir, ignore_errors=True)
+
+    def counting(self, name, original):
+        def call(*args):
+            self.calls.append(name)
+            return original(*args)
+        return call
+
+    def test_snapshot(self):
+        tree = ResourceTree('templer.core')
+        self.assertEqual(tree.listdir('templates'),
+                         ['basic_namespace', 'inner', 'nested_namespace',
+                          'outer'])
+        calls = len(self.calls)
+        self.assertTrue(tree.isdir('templates/inner'))
+        self.assertEqual(tree.listdir('templates/inner'),
+                         sorted(pkg_resources.resource_listdir(
+                             'templer.core', 'templates/inner')))
+        del self.calls[calls:]
+        self.assertFalse(tree.isdir('templates/basic_namespace/setup.py_tmpl'))
+        self.assertEqual(len(self.calls), calls)
+
+        content = tree.read('templates/basic_namespace/setup.py_tmpl')
+        self.assertEqual(tree.read('templates/basic_namespace/setup.py_tmpl'),
+                         content)
+        self.assertEqual(tree.open(
+            'templates/basic_namespace/setup.py_tmpl').read(), content)
+        self.assertEqual(self.calls.count('resource_string'), 1)
+
+    def test_copy_dir(self):
+        source = ('templer.core', 'templates/basic_namespace')
+        copy = capture_stdout(copydir.copy_dir)
+        vars = {'project': 'my.package', 'namespace_package': 'my',
+                'package': 'package', 'version': '1.0',
+                'description': '', 'author': '', 'author_email': '',
+                'url': '', 'license_name': '', 'keywords': '',
+                'long_description': '', 'zip_safe': False}
+        copy(source, os.path.join(self.tempdir, 'first'), dict(vars),
+             0, False, use_cheetah=True)
+        calls = len(self.calls)
+        copy(source, os.path.join(self.tempdir, 'second'), dict(vars),
+             0, False, use_cheetah=True)
+        self.assertEqual(len(self.calls), calls)
+        self.assertEqual(read_tree(os.path.join(self.tempdir, 'first')),
+                         read_tree(os.path.join(self.tempdir, 'second')))
+
+
+def test_suite():
+    suite = unittest.TestSuite([
+        unittest.makeSuite(TestResourceTree), ])
+    return suite
+
+if __name__ == '__main__':
+    unittest.main(defaultTest='test_suite')
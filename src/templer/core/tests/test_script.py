@@ -2,13 +2,18 @@
 
 import unittest2 as unittest
 
+import os
+import shutil
 import sys
+import tempfile
 import StringIO
 
 # from templer.core.control_script import checkdots
 # from templer.core.control_script import process_args
 from templer.core.control_script import run
 from templer.core.control_script import Runner
+from templer.core.manifest import GeneratedFiles
+from templer.core.manifest import manifest_path
 from templer.core.ui import list_sorted_templates
 
 
@@ -147,10 +152,139 @@ class test_control(unittest.TestCase):
         output = run('--version')
         self.assertFalse('unable' in output)
 
+    def test_lazy_runner(self):
+        calls = []
+
+        class CountingRunner(Runner):
+            def _get_templer_packages(self):
+                calls.append('packages')
+                return ['templer.core']
+
+            def _context_awareness(self):
+                calls.append('context')
+                return 'global'
+
+        # creating a runner looks nothing up
+        runner = CountingRunner()
+        self.assertEqual(calls, [])
+        run('templer', '--help', runner=runner)
+        self.assertEqual(calls, [])
+
+        # the context is found out once, when the templates are listed
+        run(runner=runner)
+        run(runner=runner)
+        self.assertEqual(calls, ['context'])
+        self.assertEqual(runner.allowed_packages, 'global')
+
+        # and the installed packages when their versions are shown
+        self.assertTrue('templer.core' in run('--version', runner=runner))
+        self.assertEqual(calls, ['context', 'packages'])
+
+        # --force and context_aware=False skip the context
+        runner = CountingRunner(context_aware=False)
+        self.assertEqual(runner.allowed_packages, 'all')
+        runner = CountingRunner(versions='templer.core')
+        run('--force', '--list', runner=runner)
+        self.assertEqual(runner.versions, ['templer.core'])
+        self.assertEqual(calls, ['context', 'packages'])
+
+
+class test_context(unittest.TestCase):
+    """Tests for the detection of the distribution we are in.
+    """
+
+    def setUp(self):
+        import templer.core.control_script
+        self.module = templer.core.control_script
+        self.orig_dir = os.getcwd()
+        self.old_has_local = self.module.HAS_LOCAL_COMMANDS
+        self.temp_dir = tempfile.mkdtemp()
+        self.project = os.path.join(self.temp_dir, 'my.package')
+        os.makedirs(os.path.join(self.project, 'src', 'my'))
+        os.chdir(os.path.join(self.project, 'src', 'my'))
+
+    def tearDown(self):
+        os.chdir(self.orig_dir)
+        self.module.HAS_LOCAL_COMMANDS = self.old_has_local
+        shutil.rmtree(self.temp_dir, ignore_errors=True)
+
+    def write(self, name, content):
+        f = open(os.path.join(self.project, name), 'wb')
+        f.write(content)
+        f.close()
+
+    def context(self):
+        return Runner()._context_awareness()
+
+    def test_context_awareness(self):
+        self.assertEqual(self.context(), 'global')
+
+        # the marker templer wrote at the bottom of a long changelog
+        entries = '- Fixed something\n  [joe]\n\n' * 2000
+        self.write('CHANGES.txt', 'Changelog\n=========\n\n%s'
+                   '- Package created using templer\n  [joe]\n' % entries)
+        self.assertEqual(self.context(), 'none')
+
+        # the changelog is read again when it changes
+        self.write('CHANGES.txt', 'Changelog\n=========\n\n')
+        self.assertEqual(self.context(), 'global')
+
+        # a manifest of the generated files is enough
+        self.write('setup.py', 'setup()\n')
+        manifest = GeneratedFiles(self.project)
+        manifest.record(os.path.join(self.project, 'setup.py'), 'setup()\n')
+        manifest.save()
+        self.addCleanup(os.remove, manifest_path(self.project))
+        self.assertEqual(self.context(), 'none')
+
+        # as long as its files are still those templer wrote: another
+        # directory created at the same path is not templer's
+        os.remove(os.path.join(self.project, 'setup.py'))
+        self.write('setup.py', 'setup()\n')
+        self.module._directory_contexts.clear()
+        self.assertEqual(self.context(), 'global')
+        manifest.record(os.path.join(self.project, 'setup.py'), 'setup()\n')
+        manifest.save()
+        self.assertEqual(self.context(), 'none')
+
+        self.write('setup.cfg',
+                   '[templer.local]\ntemplate = basic_namespace\n')
+        self.module.HAS_LOCAL_COMMANDS = True
+        self.assertEqual(self.context(), 'local')
+        self.assertEqual(
+            self.module._directory_context(self.project),
+            ('basic_namespace', True))
+        self.module.HAS_LOCAL_COMMANDS = False
+        self.assertEqual(self.context(), 'none')
+
+    def test_directory_cache(self):
+        self.write('setup.cfg', '[egg_info]\ntag_build = dev\n')
+        self.assertEqual(self.module._directory_context(self.project),
+                         (None, False))
+        # nothing is read again while the files are unchanged
+        import __builtin__
+        old_open = __builtin__.open
+        opened = []
+
+        def counting_open(*args):
+            opened.append(args[0])
+            return old_open(*args)
+        self.module.open = counting_open
+        try:
+            self.module._directory_context(self.project)
+            self.assertEqual(opened, [])
+            self.write('CHANGES.txt', '- Package created using templer\n')
+            self.assertEqual(self.module._directory_context(self.project),
+                             (None, True))
+            self.assertEqual(len(opened), 2)
+        finally:
+            del self.module.open
+
 
 def test_suite():
     suite = unittest.TestSuite([
-        unittest.makeSuite(test_control)])
+        unittest.makeSuite(test_control),
+        unittest.makeSuite(test_context)])
     return suite
 
 if __name__ == '__main__':
@@ -0,0 +1,148 @@
+# -*- coding: utf-8 -*-
+
+import unittest2 as unittest
+
+import json
+import os
+import shutil
+import tarfile
+import tempfile
+import threading
+import urllib2
+import zipfile
+from cStringIO import StringIO
+
+from templer.core.server import GenerationServer
+
+
+VARS = {'expert_mode': 'all', 'author': 'Joe'}
+
+
+class TestGenerationServer(unittest.TestCase):
+    """ verify that the server creates projects on request
+    """
+
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.server = GenerationServer(('127.0.0.1', 0),
+                                       output_root=self.temp_dir,
+                                       quiet=True)
+        self.thread = threading.Thread(target=self.server.serve_forever)
+        self.thread.start()
+        self.url = 'http://127.0.0.1:%d' % self.server.server_address[1]
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.thread.join()
+        self.server.server_close()
+        shutil.rmtree(self.temp_dir, ignore_errors=True)
+
+    def request(self, path, data=None):
+        if data is not None:
+            data = json.dumps(data)
+        try:
+            response = urllib2.urlopen(self.url + path, data)
+        except urllib2.HTTPError, e:
+            response = e
+        return response.code, response.info(), response.read()
+
+    def test_templates(self):
+        status, headers, body = self.request('/templates')
+        self.assertEqual(status, 200)
+        self.assertTrue('basic_namespace' in json.loads(body))
+
+    def test_archive(self):
+        status, headers, body = self.request('/generate', {
+            'templates': ['basic_namespace'], 'project': 'my.package',
+            'vars': VARS})
+        self.assertEqual(status, 200)
+        self.assertEqual(headers['Content-Type'], 'application/x-gzip')
+        self.assertTrue(float(headers['X-Templer-Seconds']) > 0)
+        tar = tarfile.open(fileobj=StringIO(body), mode='r:gz')
+        self.assertTrue('my.package/setup.py' in tar.getnames())
+        self.assertEqual(os.listdir(self.temp_dir), [])
+
+        status, headers, body = self.request('/generate', {
+            'templates': 'nested_namespace', 'project': 'a.b.c',
+            'archive': 'zip'})
+        self.assertEqual(status, 200)
+        archive = zipfile.ZipFile(StringIO(body))
+        self.assertTrue('a.b.c/src/a/b/c/__init__.py' in archive.namelist())
+
+    def test_output_dir(self):
+        status, headers, body = self.request('/generate', {
+            'templates': ['basic_namespace'], 'project': 'my.package',
+            'vars': VARS, 'output_dir': 'projects'})
+        self.assertEqual(status, 200)
+        result = json.loads(body)
+        project_dir = os.path.join(self.temp_dir, 'projects', 'my.package')
+        self.assertEqual(result['output_dir'], project_dir)
+        self.assertTrue('my.package/setup.py' in result['files'])
+        self.assertTrue(os.path.isfile(os.path.join(project_dir,
+                                                    'setup.py')))
+
+        status, headers, body = self.request('/generate', {
+            'project': 'my.package', 'output_dir': os.pardir})
+        self.assertEqual(status, 403)
+
+    def test_traversal(self):
+        vars = dict(VARS, namespace_package='escaped', package='package')
+        outside = os.path.join(os.path.dirname(self.temp_dir), 'escaped')
+        for project in ['../escaped', '..', '.', 'a/../../escaped',
+                        '/tmp/escaped']:
+            for where in [{'output_dir': 'projects'}, {'archive': 'zip'}]:
+                request = dict(where, templates=['basic_namespace'],
+                               project=project, vars=vars)
+                status, headers, body = self.request('/generate', request)
+                self.assertEqual(status, 400, project)
+        self.assertFalse(os.path.exists(outside))
+        self.assertFalse(os.path.exists('/tmp/escaped'))
+        self.assertEqual(os.listdir(self.temp_dir), [])
+
+    def test_errors(self):
+        status, headers, body = self.request('/generate', {
+            'templates': ['no_such_template'], 'project': 'my.package'})
+        self.assertEqual(status, 404)
+        status, headers, body = self.request('/generate', {
+            'templates': ['basic_namespace'], 'project': 'my.package',
+            'vars': dict(VARS, license_name='nope')})
+        self.assertEqual(status, 400)
+        self.assertTrue('nope' in json.loads(body)['error'])
+        status, headers, body = self.request('/generate', {})
+        self.assertEqual(status, 400)
+
+        status, headers, body = self.request('/stats')
+        stats = json.loads(body)
+        self.assertEqual(stats['requests'], 3)
+        self.assertEqual(stats['errors'], 3)
+
+    def test_concurrent_requests(self):
+        results = {}
+
+        def generate(name):
+            results[name] = self.request('/generate', {
+                'templates': ['basic_namespace'], 'project': name,
+                'vars': VARS})
+        threads = [threading.Thread(target=generate, args=('my.p%d' % i,))
+                   for i in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        for name, (status, headers, body) in results.items():
+            self.assertEqual(status, 200)
+            tar = tarfile.open(fileobj=StringIO(body), mode='r:gz')
+            setup_py = tar.extractfile('%s/setup.py' % name).read()
+            self.assertTrue("name='%s'" % name in setup_py)
+        stats = json.loads(self.request('/stats')[2])
+        self.assertEqual(stats['requests'], 4)
+        self.assertEqual(len(stats['recent']), 4)
+
+
+def test_suite():
+    suite = unittest.TestSuite([
+        unittest.makeSuite(TestGenerationServer), ])
+    return suite
+
+if __name__ == '__main__':
+    unittest.main(defaultTest='test_suite')
@@ -0,0 +1,148 @@
+# -*- coding: utf-8 -*-
+
+import unittest2 as unittest
+
+import os
+import shutil
+import tarfile
+import tempfile
+import zipfile
+from cStringIO import StringIO
+
+from templer.core import copydir
+from templer.core import sinks
+from templer.core.create import CreateDistroCommand
+from templer.core.manifest import GeneratedFiles
+from templer.core.tests.test_copydir import read
+from templer.core.tests.test_copydir import read_tree
+from templer.core.tests.test_copydir import write
+from templer.core.tests.test_script import capture_stdout
+
+
+class TestSinks(unittest.TestCase):
+    """ verify that copy_dir writes the same files to every sink
+    """
+
+    def setUp(self):
+        self.tempdir = tempfile.mkdtemp()
+        self.source = os.path.join(self.tempdir, 'source')
+        write(os.path.join(self.source, 'README.txt_tmpl'), '${project}\n')
+        write(os.path.join(self.source, '+package+', 'data.bin'),
+              '\0\1\2' * 1000)
+        self.vars = {'project': 'my.package', 'package': 'package'}
+        self.dest = os.path.join(self.tempdir, 'dest')
+        self.project = os.path.join(self.dest, 'my.package')
+        self.expected = {'README.txt': 'my.package\n',
+                         os.path.join('package', 'data.bin'): '\0\1\2' * 1000}
+
+    def tearDown(self):
+        shutil.rmtree(self.tempdir, ignore_errors=True)
+
+    def copy(self, sink, jobs=1):
+        copy = capture_stdout(copydir.copy_dir)
+        return copy(self.source, self.project, dict(self.vars), 1, False,
+                    jobs=jobs, sink=sink)
+
+    def expected_names(self):
+        return dict([('my.package/' + name.replace(os.sep, '/'), content)
+                     for name, content in self.expected.items()])
+
+    def test_file_system(self):
+        self.copy(sinks.FileSystemSink())
+        self.assertEqual(read_tree(self.project), self.expected)
+
+    def test_memory(self):
+        sink = sinks.MemorySink(self.dest)
+        self.copy(sink, jobs=4)
+        self.assertEqual(sink.files, self.expected_names())
+        self.assertEqual(sink.modes['my.package/README.txt'], 0644)
+        self.assertFalse(os.path.exists(self.dest))
+
+        output = self.copy(sink)
+        self.assertEqual(output.count('already exists (same content)'), 2)
+
+    def test_tar(self):
+        fileobj = StringIO()
+        sink = sinks.TarSink(fileobj, self.dest)
+        self.copy(sink)
+        sink.close()
+        tar = tarfile.open(fileobj=StringIO(fileobj.getvalue()),
+                           mode='r:gz')
+        self.assertEqual(tar.getnames(),
+                         ['my.package', 'my.package/package',
+                          'my.package/package/data.bin',
+                          'my.package/README.txt'])
+        self.assertTrue(tar.getmember('my.package/package').isdir())
+        self.assertEqual(tar.getmember('my.package/README.txt').mode, 0644)
+        self.assertEqual(
+            dict([(name, tar.extractfile(name).read())
+                  for name in tar.getnames()
+                  if tar.getmember(name).isfile()]),
+            self.expected_names())
+
+    def test_zip(self):
+        fileobj = StringIO()
+        sink = sinks.ZipSink(fileobj, self.dest)
+        self.copy(sink)
+        sink.close()
+        archive = zipfile.ZipFile(StringIO(fileobj.getvalue()))
+        self.assertEqual(
+            dict([(name, archive.read(name))
+                  for name in archive.namelist()
+                  if not name.endswith('/')]),
+            self.expected_names())
+        info = archive.getinfo('my.package/README.txt')
+        self.assertEqual(info.external_attr >> 16 & 0777, 0644)
+
+    def test_command_files(self):
+        command = CreateDistroCommand()
+        command.parse_args([])
+        command.simulate = False
+        command.interactive = False
+        command.verbose = 0
+        command.sink = sink = sinks.MemorySink(self.dest)
+        filename = os.path.join(self.project, 'setup.py')
+        command.ensure_file(filename, '# -*- Extra requirements: -*-\n')
+        command.insert_into_file(filename, 'Extra requirements', 'foo\n')
+        self.assertEqual(sink.files, {
+            'my.package/setup.py': '# -*- Extra requirements: -*-\nfoo\n'})
+        self.assertFalse(os.path.exists(self.dest))
+
+        # both are recorded in the manifest when written to disk
+        command.sink = None
+        command.manifest = GeneratedFiles(self.project)
+        command.ensure_file(filename, '# -*- Extra requirements: -*-\n')
+        command.insert_into_file(filename, 'Extra requirements', 'foo\n')
+        self.assertTrue(command.manifest.matches(
+            filename, '# -*- Extra requirements: -*-\nfoo\n'))
+
+    def test_links(self):
+        if not hasattr(os, 'symlink'):
+            return
+        sink = sinks.FileSystemSink()
+        target = os.path.join(self.tempdir, 'target.txt')
+        write(target, 'old\n')
+        link = os.path.join(self.tempdir, 'link.txt')
+        os.symlink(target, link)
+        sink.write(link, 'new\n')
+        self.assertTrue(os.path.islink(link))
+        self.assertEqual(read(target), 'new\n')
+
+        hardlink = os.path.join(self.tempdir, 'hardlink.txt')
+        os.link(target, hardlink)
+        sink.write(hardlink, 'newer\n', 0600)
+        self.assertEqual(read(target), 'newer\n')
+        self.assertEqual(os.stat(target).st_mode & 0777, 0600)
+
+    def test_outside_root(self):
+        sink = sinks.MemorySink(self.source)
+        self.assertRaises(ValueError, sink.write, self.project, '')
+
+
+def test_suite():
+    suite = unittest.TestSuite([
+        unittest.makeSuite(TestSinks), ])
+    return suite
+
+if __name__ == '__main__':
+    unittest.main(defaultTest='test_suite')
@@ -0,0 +1,83 @@
+# -*- coding: utf-8 -*-
+
+import unittest2 as unittest
+
+import os
+import pstats
+import shutil
+import tempfile
+
+from templer.core import api
+from templer.core import timing
+from templer.core.create import CreateDistroCommand
+from templer.core.tests.test_script import capture_stdout
+
+
+class TestTimings(unittest.TestCase):
+    """ verify that the phases of a generation are timed
+    """
+
+    def setUp(self):
+        self.orig_dir = os.getcwd()
+        self.temp_dir = tempfile.mkdtemp()
+        os.chdir(self.temp_dir)
+
+    def tearDown(self):
+        os.chdir(self.orig_dir)
+        shutil.rmtree(self.temp_dir, ignore_errors=True)
+
+    def test_timings(self):
+        timings = timing.Timings()
+        self.assertEqual(timings.call('phase', 'first', max, 1, 2), 2)
+        self.assertRaises(ValueError, timing.timed, timings, 'phase',
+                          'second', int, 'nope')
+        timing.timed(None, 'other', 'not timed', int, '1')
+        timings.add('other', 'third', 1.0, 0.5)
+        self.assertEqual([phase for phase, count, wall, cpu
+                          in timings.totals()], ['phase', 'other'])
+        self.assertEqual(timings.totals()[0][1], 2)
+        self.assertEqual(timings.slowest(1), [('other', 'third', 1.0, 0.5)])
+        self.assertEqual(len(timings.as_dict()['records']), 3)
+        self.assertTrue('other third' in timings.summary())
+
+    def test_generate(self):
+        result = api.generate(['package'], 'my.package',
+                              {'expert_mode': 'all'}, output=self.temp_dir,
+                              timings=True)
+        phases = [phase for phase, count, wall, cpu
+                  in result.timings.totals()]
+        for phase in ['load_templates', 'check_vars', 'pre', 'structure',
+                      'copy_dir', 'render', 'write', 'post', 'template']:
+            self.assertTrue(phase in phases, phase)
+        names = [name for phase, name, wall, cpu in result.timings.records
+                 if phase == 'render']
+        self.assertTrue(os.path.join(result.output_dir, 'setup.py')
+                        in names)
+        self.assertEqual(api.generate(['package'], 'my.other',
+                                      output=self.temp_dir).timings, None)
+
+    def test_command(self):
+        command = CreateDistroCommand()
+        run = capture_stdout(command.run)
+        output = run(['-q', '--no-interactive', '-t', 'basic_namespace',
+                      'my.package', '--timings'])
+        self.assertTrue('Slowest steps:' in output)
+        self.assertTrue('check_vars' in output)
+
+    def test_profile(self):
+        command = CreateDistroCommand()
+        run = capture_stdout(command.run)
+        run(['-q', '--no-interactive', '-t', 'basic_namespace',
+             'my.package', '--profile', 'profile.out'])
+        stats = pstats.Stats('profile.out')
+        self.assertTrue([key for key in stats.stats
+                         if key[2] == 'create_project'])
+
+
+def test_suite():
+    suite = unittest.TestSuite([
+        unittest.makeSuite(TestTimings), ])
+    return suite
+
+if __name__ == '__main__':
+    unittest.main(defaultTest='test_suite')
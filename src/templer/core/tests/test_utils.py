@@ -0,0 +1,60 @@
+# -*- coding: utf-8 -*-
+
+import unittest2 as unittest
+
+import os
+import shutil
+import tempfile
+
+from templer.core.utils import atomic_write
+from templer.core.utils import cache_dir
+from templer.core.utils import to_str
+
+
+class TestUtils(unittest.TestCase):
+    """ verify the helpers shared by the modules of templer.core
+    """
+
+    def test_to_str(self):
+        value = to_str({u'name': [u'caf\xe9', 1], 'other': None})
+        self.assertEqual(value, {'name': ['caf\xc3\xa9', 1], 'other': None})
+        self.assertTrue(isinstance(value.keys()[0], str))
+
+    def test_cache_dir(self):
+        old_cache_home = os.environ.get('XDG_CACHE_HOME')
+        try:
+            os.environ['XDG_CACHE_HOME'] = '/var/cache/joe'
+            self.assertEqual(cache_dir(),
+                             os.path.join('/var/cache/joe', 'templer'))
+            del os.environ['XDG_CACHE_HOME']
+            self.assertEqual(cache_dir(), os.path.join(
+                os.path.expanduser('~'), '.cache', 'templer'))
+        finally:
+            if old_cache_home is not None:
+                os.environ['XDG_CACHE_HOME'] = old_cache_home
+
+
+    def test_atomic_write(self):
+        temp_dir = tempfile.mkdtemp()
+        try:
+            path = os.path.join(temp_dir, 'sub', 'file.json')
+            self.assertTrue(atomic_write(path, 'first'))
+            self.assertTrue(atomic_write(path, 'second'))
+            self.assertEqual(open(path, 'rb').read(), 'second')
+            self.assertEqual(os.listdir(os.path.dirname(path)),
+                             ['file.json'])
+            # a file that cannot be written is not an error
+            self.assertFalse(atomic_write(os.path.join(path, 'below'), ''))
+            self.assertEqual(os.listdir(os.path.dirname(path)),
+                             ['file.json'])
+        finally:
+            shutil.rmtree(temp_dir, ignore_errors=True)
+
+
+def test_suite():
+    suite = unittest.TestSuite([
+        unittest.makeSuite(TestUtils), ])
+    return suite
+
+if __name__ == '__main__':
+    unittest.main(defaultTest='test_suite')
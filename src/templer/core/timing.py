@@ -0,0 +1,134 @@
+"""
+Where the time of a generation goes.
+
+A ``Timings`` set as the ``timings`` attribute of a command collects the
+wall clock and CPU time of each phase of the creation of a project:
+loading the templates, checking their variables, their ``pre`` and
+``post`` hooks, the structures and template directories copied, and each
+file rendered and written.  Phases are nested: the time of a ``template``
+includes the time of its ``copy_dir``, which includes its files.
+
+The CPU time is the one of the whole process: with several threads
+(``--jobs``) it includes the work done by the other threads meanwhile.
+"""
+import os
+import threading
+import time
+from cStringIO import StringIO
+
+
+def cpu_time():
+    """Returns the user and system CPU time of the process."""
+    times = os.times()
+    return times[0] + times[1]
+
+
+class Timings(object):
+    """The timed phases, in the order they completed."""
+
+    def __init__(self):
+        self.records = []
+        self._lock = threading.Lock()
+
+    def add(self, phase, name, wall, cpu):
+        self._lock.acquire()
+        try:
+            self.records.append((phase, name, wall, cpu))
+        finally:
+            self._lock.release()
+
+    def start(self):
+        """Returns the start of a phase, to be passed to ``stop``."""
+        return time.time(), cpu_time()
+
+    def stop(self, phase, name, started):
+        """Records the time of ``phase`` since ``started``."""
+        self.add(phase, name, time.time() - started[0],
+                 cpu_time() - started[1])
+
+    def call(self, phase, name, function, *args, **kw):
+        """Calls ``function`` and records its time as ``phase``."""
+        started = self.start()
+        try:
+            return function(*args, **kw)
+        finally:
+            self.stop(phase, name, started)
+
+    def totals(self):
+        """
+        Returns the ``(phase, count, wall, cpu)`` totals of each phase, in
+        the order the phases were first seen.
+        """
+        totals = {}
+        order = []
+        for phase, name, wall, cpu in list(self.records):
+            if phase not in totals:
+                totals[phase] = [0, 0.0, 0.0]
+                order.append(phase)
+            total = totals[phase]
+            total[0] += 1
+            total[1] += wall
+            total[2] += cpu
+        return [tuple([phase] + totals[phase]) for phase in order]
+
+    def slowest(self, limit=10):
+        """Returns the ``limit`` slowest records, slowest first."""
+        records = list(self.records)
+        records.sort(key=lambda record: -record[2])
+        return records[:limit]
+
+    def as_dict(self):
+        return {'phases': [{'phase': phase, 'count': count,
+                            'wall': wall, 'cpu': cpu}
+                           for phase, count, wall, cpu in self.totals()],
+                'records': [{'phase': phase, 'name': name,
+                             'wall': wall, 'cpu': cpu}
+                            for phase, name, wall, cpu in self.records]}
+
+    def summary(self, limit=10):
+        """Returns a printable summary of the phases and slowest steps."""
+        s = StringIO()
+        totals = self.totals()
+        if not totals:
+            return 'Nothing was timed\n'
+        width = max([len(phase) for phase, count, wall, cpu in totals]
+                    + [len('Phase')])
+        print >>s, '%-*s  %5s  %9s  %9s' % (width, 'Phase', 'Count',
+                                            'Wall', 'CPU')
+        for phase, count, wall, cpu in totals:
+            print >>s, '%-*s  %5d  %8.3fs  %8.3fs' % (width, phase, count,
+                                                      wall, cpu)
+        print >>s
+        print >>s, 'Slowest steps:'
+        for phase, name, wall, cpu in self.slowest(limit):
+            print >>s, '  %8.3fs  %s %s' % (wall, phase, name)
+        return s.getvalue()
+
+
+def timed(timings, phase, name, function, *args, **kw):
+    """
+    Calls ``function``, recording its time in ``timings`` unless it is
+    None.
+    """
+    if timings is None:
+        return function(*args, **kw)
+    return timings.call(phase, name, function, *args, **kw)
+
+
+def profile(filename, function, *args, **kw):
+    """
+    Calls ``function`` under cProfile and writes the statistics to
+    ``filename`` (to be read with ``pstats``), or prints the most
+    expensive calls if ``filename`` is ``-``.
+    """
+    import cProfile
+    profiler = cProfile.Profile()
+    try:
+        return profiler.runcall(function, *args, **kw)
+    finally:
+        if filename == '-':
+            import pstats
+            stats = pstats.Stats(profiler)
+            stats.sort_stats('cumulative').print_stats(30)
+        else:
+            profiler.dump_stats(filename)
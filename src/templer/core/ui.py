@@ -2,9 +2,10 @@
 Module containing some common UI components that are useful for all user
 interfaces, ie the console and the web interfaces.
 """
-import pkg_resources
 
 from templer.core.base import BaseTemplate
+from templer.core.index import class_path
+from templer.core.index import get_index
 
 # These are the "common" templates; they will be listed in a separate
 # list for new users. Please be conservative about adding new
@@ -29,6 +30,7 @@ def list_sorted_templates(filter_group=False, scope='global'):
     "scope" determines whether to find top-level (global) templates, or
     templates that apply to local commands, or both.
     """
+    import pkg_resources
     cats = {}
     templates = []
     # grab a list of all paster create template entry points
@@ -60,25 +62,22 @@ def list_sorted_templates(filter_group=False, scope='global'):
 
 def _get_templates(template_entry_points, klass):
     """
-    Returns a list of dicts built from a list of entry points passed in.
+    Returns a list of dicts built from a list of entry points passed in,
+    see ``templer.core.index.TemplateInfo``.
     """
     templates = []
+    index = get_index()
+    klass_path = class_path(klass)
     for entry in template_entry_points:
         try:
-            # We only want our templates in this list
-            template = entry.load()
-            if issubclass(template, klass):
-                templates.append(
-                        {'name': entry.name,
-                         'summary': template.summary,
-                         'class': template,
-                         'category': getattr(template, 'category',
-                                             'Local Commands'),
-                         'help': getattr(template, 'help', "").strip(),
-                         'entry': entry})
+            # We only want our templates in this list; the index describes
+            # them without importing their package if it can
+            template = index.template_info(entry)
+            if klass_path in template['mro']:
+                templates.append(template)
         except Exception, e:
             # We will not be stopped!
             print 'Warning: could not load entry point %s (%s: %s)' % (
                 entry.name, e.__class__.__name__, e)
+    index.save()
     return templates
-    
\ No newline at end of file
@@ -0,0 +1,62 @@
+"""
+Helpers shared by the modules of ``templer.core``.
+"""
+import os
+import tempfile
+
+try:
+    from hashlib import sha1
+except ImportError: # pragma: no cover
+    from sha import new as sha1
+
+
+def cache_dir():
+    """
+    Returns the directory of the files templer keeps between runs,
+    ``templer`` in ``$XDG_CACHE_HOME`` (``~/.cache`` by default).
+    """
+    cache_home = (os.environ.get('XDG_CACHE_HOME')
+                  or os.path.join(os.path.expanduser('~'), '.cache'))
+    return os.path.join(cache_home, 'templer')
+
+
+def atomic_write(path, content):
+    """
+    Writes ``content`` to ``path`` through a temporary file renamed into
+    place, creating its directory if needed, so that other processes
+    never read a partial file.  Returns False instead of raising if it
+    cannot be written: the files templer keeps between runs only save
+    time, a run never fails because of them.
+    """
+    dirname = os.path.dirname(path) or os.curdir
+    tmp_path = None
+    try:
+        if not os.path.isdir(dirname):
+            os.makedirs(dirname)
+        fd, tmp_path = tempfile.mkstemp(dir=dirname, suffix='.tmp')
+        f = os.fdopen(fd, 'wb')
+        try:
+            f.write(content)
+        finally:
+            f.close()
+        os.rename(tmp_path, path)
+    except (IOError, OSError):
+        if tmp_path is not None and os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        return False
+    return True
+
+
+def to_str(value):
+    """
+    Returns ``value`` with its unicode strings encoded in utf-8, in lists
+    and dictionaries too: json returns unicode strings, the rest of
+    templer expects str.
+    """
+    if isinstance(value, unicode):
+        return value.encode('utf-8')
+    if isinstance(value, list):
+        return [to_str(item) for item in value]
+    if isinstance(value, dict):
+        return dict([(to_str(k), to_str(v)) for k, v in value.items()])
+    return value